@@ -29,10 +29,29 @@ CREATE TABLE mercury_common_mapping_rule (
     common_field_name VARCHAR(50) NOT NULL,
     mapping_type ENUM('direct', 'transform', 'extract') DEFAULT 'direct',
     transform_rule JSON,
+    confidence DECIMAL(5,3) DEFAULT NULL,
     priority INT DEFAULT 1,
+    rule_version INT NOT NULL DEFAULT 1,
     active TINYINT(4) NOT NULL DEFAULT 1,
     created_at DATETIME DEFAULT NULL,
     updated_at DATETIME DEFAULT NULL,
+    UNIQUE KEY uq_mapping_rule (category2_id, company_a_id, company_b_id, company_a_field, company_b_field),
+    FOREIGN KEY (category2_id) REFERENCES mercury_category2(id),
+    FOREIGN KEY (company_a_id) REFERENCES mercury_company(id),
+    FOREIGN KEY (company_b_id) REFERENCES mercury_company(id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- マッピングルールセットのバージョン（カテゴリ×会社ペアごと）
+CREATE TABLE mercury_mapping_rule_set (
+    category2_id INT UNSIGNED NOT NULL,
+    company_a_id INT NOT NULL,
+    company_b_id INT NOT NULL,
+    version INT NOT NULL DEFAULT 1,
+    rule_count INT NOT NULL DEFAULT 0,
+    source_job_uuid VARCHAR(36) NULL,
+    created_at DATETIME DEFAULT NULL,
+    updated_at DATETIME DEFAULT NULL,
+    PRIMARY KEY (category2_id, company_a_id, company_b_id),
     FOREIGN KEY (category2_id) REFERENCES mercury_category2(id),
     FOREIGN KEY (company_a_id) REFERENCES mercury_company(id),
     FOREIGN KEY (company_b_id) REFERENCES mercury_company(id)
@@ -74,6 +93,7 @@ CREATE TABLE mercury_mapping_job (
     log_message TEXT,
     error_message TEXT,
     created_by VARCHAR(100),
+    worker_id VARCHAR(100) NULL,
     started_at DATETIME NULL,
     completed_at DATETIME NULL,
     active TINYINT(4) NOT NULL DEFAULT 1,
@@ -84,6 +104,19 @@ CREATE TABLE mercury_mapping_job (
     FOREIGN KEY (company_b_id) REFERENCES mercury_company(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- マッチング結果（ジョブ単位、行番号はパース済みデータ上の0始まり）
+CREATE TABLE mercury_match_result (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    job_id INT NOT NULL,
+    row_a_index INT NOT NULL,
+    row_b_index INT NOT NULL,
+    score DECIMAL(6,4) NOT NULL,
+    method VARCHAR(50) DEFAULT NULL,
+    created_at DATETIME DEFAULT NULL,
+    KEY idx_match_result_job_score (job_id, score),
+    FOREIGN KEY (job_id) REFERENCES mercury_mapping_job(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- 初期データ投入
 INSERT INTO mercury_category2 (id, name, order_display, active, created_at) VALUES
 (254, '名探偵コナンカードゲーム', 1, 1, NOW()),
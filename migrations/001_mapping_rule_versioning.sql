@@ -0,0 +1,31 @@
+-- マッピングルールの一括 upsert・バージョン管理（既存DB向け。新規構築時は init.sql に反映済み）
+
+-- 同じ (カテゴリ, 会社ペア, フィールド対応) の重複行は最新のみ残す
+DELETE r1 FROM mercury_common_mapping_rule r1
+JOIN mercury_common_mapping_rule r2
+  ON r1.category2_id = r2.category2_id
+ AND r1.company_a_id = r2.company_a_id
+ AND r1.company_b_id = r2.company_b_id
+ AND r1.company_a_field = r2.company_a_field
+ AND r1.company_b_field = r2.company_b_field
+ AND r1.id < r2.id;
+
+ALTER TABLE mercury_common_mapping_rule
+    ADD COLUMN confidence DECIMAL(5,3) DEFAULT NULL AFTER transform_rule,
+    ADD COLUMN rule_version INT NOT NULL DEFAULT 1 AFTER priority,
+    ADD UNIQUE KEY uq_mapping_rule (category2_id, company_a_id, company_b_id, company_a_field, company_b_field);
+
+CREATE TABLE mercury_mapping_rule_set (
+    category2_id INT UNSIGNED NOT NULL,
+    company_a_id INT NOT NULL,
+    company_b_id INT NOT NULL,
+    version INT NOT NULL DEFAULT 1,
+    rule_count INT NOT NULL DEFAULT 0,
+    source_job_uuid VARCHAR(36) NULL,
+    created_at DATETIME DEFAULT NULL,
+    updated_at DATETIME DEFAULT NULL,
+    PRIMARY KEY (category2_id, company_a_id, company_b_id),
+    FOREIGN KEY (category2_id) REFERENCES mercury_category2(id),
+    FOREIGN KEY (company_a_id) REFERENCES mercury_company(id),
+    FOREIGN KEY (company_b_id) REFERENCES mercury_company(id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,13 @@
+-- マッチング結果テーブル（既存DB向け。新規構築時は init.sql に反映済み）
+
+CREATE TABLE mercury_match_result (
+    id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    job_id INT NOT NULL,
+    row_a_index INT NOT NULL,
+    row_b_index INT NOT NULL,
+    score DECIMAL(6,4) NOT NULL,
+    method VARCHAR(50) DEFAULT NULL,
+    created_at DATETIME DEFAULT NULL,
+    KEY idx_match_result_job_score (job_id, score),
+    FOREIGN KEY (job_id) REFERENCES mercury_mapping_job(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,5 @@
+-- ジョブを受け付けたWebワーカー（ホスト名:PID）。終了したワーカーのジョブを failed にするために使う
+-- （既存DB向け。新規構築時は init.sql に反映済み）
+
+ALTER TABLE mercury_mapping_job
+    ADD COLUMN worker_id VARCHAR(100) NULL AFTER created_by;
@@ -2,9 +2,11 @@
 Mercury Mapping Engine - AI Package
 Claude AI機能の統合パッケージ
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 import os
 from .claude_client import ClaudeClient
+from .json_stream import IncrementalJSONParser
+from .api_stats import ClaudeAPIStats, get_api_stats
 from .model_manager import ModelManager
 from .prompt_builder import PromptBuilder
 from utils.logger import analysis_logger
@@ -29,8 +31,13 @@ class AIManager:
         analysis_logger.logger.info("AI Manager initialized successfully")
     
     def analyze_field_mapping(self, headers_a, headers_b, sample_data_a, sample_data_b,
-                            model: Optional[str] = None, context: Optional[Dict] = None) -> Dict[str, Any]:
-        """フィールドマッピング分析を実行"""
+                            model: Optional[str] = None, context: Optional[Dict] = None,
+                            stream: bool = False,
+                            on_mapping: Optional[Callable[[Optional[str], Any], None]] = None) -> Dict[str, Any]:
+        """フィールドマッピング分析を実行
+
+        stream=True の場合はSSEで受信し、完成したJSON要素ごとに on_mapping を呼ぶ
+        """
         try:
             # 推奨モデルの取得
             if not model:
@@ -42,7 +49,10 @@ class AIManager:
             )
             
             # API呼び出し
-            result = self.claude_client.call_api(prompt, model)
+            if stream:
+                result = self.claude_client.call_api_stream(prompt, model, on_item=on_mapping)
+            else:
+                result = self.claude_client.call_api(prompt, model)
             
             if result['success']:
                 return {
@@ -66,6 +76,71 @@ class AIManager:
                 'error': str(e)
             }
     
+    def bulk_analyze_field_mappings(self, tasks: Dict[str, Dict[str, Any]], model: Optional[str] = None,
+                                    poll_interval: Optional[float] = None,
+                                    timeout: Optional[float] = None) -> Dict[str, Any]:
+        """複数のフィールドマッピング分析を Message Batches API で一括実行（非対話ジョブ向け）
+
+        tasks: {custom_id: {'headers_a', 'headers_b', 'sample_data_a', 'sample_data_b', 'context'(任意)}}
+        戻り値の results は custom_id ごとに analyze_field_mapping と同じ形式
+        """
+        try:
+            if not model:
+                model = self.model_manager.get_recommended_model('field_mapping', 'balanced')
+            
+            prompts = {
+                custom_id: self.prompt_builder.build_field_mapping_prompt(
+                    task['headers_a'], task['headers_b'],
+                    task['sample_data_a'], task['sample_data_b'],
+                    task.get('context')
+                )
+                for custom_id, task in tasks.items()
+            }
+            
+            batch_result = self.claude_client.run_message_batch(
+                prompts, model, poll_interval=poll_interval, timeout=timeout
+            )
+            if not batch_result['success']:
+                return {
+                    'success': False,
+                    'error': batch_result['error'],
+                    'batch_id': batch_result.get('batch_id'),
+                    'model_used': model
+                }
+            
+            results = {}
+            for custom_id, result in batch_result['results'].items():
+                if result['success']:
+                    results[custom_id] = {
+                        'success': True,
+                        'analysis': result['content'],
+                        'model_used': model,
+                        'usage': result['usage'],
+                        'cost': result['cost']
+                    }
+                else:
+                    results[custom_id] = {
+                        'success': False,
+                        'error': result['error'],
+                        'model_used': model
+                    }
+            
+            return {
+                'success': True,
+                'batch_id': batch_result['batch_id'],
+                'model_used': model,
+                'results': results,
+                'missing_custom_ids': batch_result['missing_custom_ids'],
+                'total_cost_usd': batch_result['total_cost_usd']
+            }
+            
+        except Exception as e:
+            analysis_logger.log_error('ai_bulk_field_mapping', str(e))
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
     def analyze_csv_structure(self, headers, sample_data, total_rows, 
                             model: Optional[str] = None, file_info: Optional[Dict] = None) -> Dict[str, Any]:
         """CSV構造分析を実行"""
@@ -191,6 +266,7 @@ class AIManager:
         """AI使用統計を取得"""
         return {
             'claude_api_stats': self.claude_client.get_stats(),
+            'process_api_stats': get_api_stats().snapshot(),
             'model_summary': self.model_manager.get_model_stats_summary(),
             'prompt_config': {
                 'max_sample_rows': self.prompt_builder.max_sample_rows,
@@ -224,8 +300,11 @@ __description__ = "Claude AI integration for Mercury Mapping Engine"
 __all__ = [
     'AIManager',
     'ClaudeClient', 
+    'ClaudeAPIStats',
+    'IncrementalJSONParser',
     'ModelManager',
     'PromptBuilder',
     'create_ai_manager',
+    'get_api_stats',
     'get_available_models'
 ]
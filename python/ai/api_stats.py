@@ -0,0 +1,184 @@
+"""
+Mercury Mapping Engine - Claude API Statistics
+Claude API 呼び出し統計（スレッドセーフ・モデル別レイテンシ分布）
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+
+# レイテンシ分布のバケット境界（ミリ秒）
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000, 120000)
+
+
+class _ModelStats:
+    """モデル単位の集計（ClaudeAPIStats のロック下でのみ更新）"""
+
+    def __init__(self, window_size: int):
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.latency_sum_ms = 0.0
+        self.latency_count = 0
+        self.timed_output_tokens = 0  # レイテンシを計測できたリクエストの出力トークン
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # 最後は +Inf
+        self.recent_latencies_ms = deque(maxlen=window_size)
+        self.errors_by_status: Dict[str, int] = {}
+
+    def observe_latency(self, latency_ms: float, output_tokens: int):
+        self.latency_sum_ms += latency_ms
+        self.latency_count += 1
+        self.timed_output_tokens += output_tokens
+        self.recent_latencies_ms.append(latency_ms)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                self.bucket_counts[i] += 1
+                return
+        self.bucket_counts[-1] += 1
+
+
+class ClaudeAPIStats:
+    """Claude API 統計（ロックで保護されたカウンタ + モデル別レイテンシ）
+
+    パーセンタイルは直近 window_size 件の成功リクエストから算出し、
+    バケット分布は起動以降の累積値を保持する。
+    """
+
+    def __init__(self, window_size: int = 1000):
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        self._models: Dict[str, _ModelStats] = {}
+        self._started_at = time.time()
+
+    def record_request(self, model: str, success: bool, latency_ms: Optional[float] = None,
+                       input_tokens: int = 0, output_tokens: int = 0, cost_usd: float = 0.0,
+                       status_code: Optional[Any] = None, retries: int = 0):
+        """1リクエスト（リトライ込み）の結果を記録"""
+        with self._lock:
+            stats = self._models.get(model)
+            if stats is None:
+                stats = self._models[model] = _ModelStats(self.window_size)
+
+            stats.requests += 1
+            stats.retries += retries
+            if success:
+                stats.successes += 1
+                stats.input_tokens += input_tokens
+                stats.output_tokens += output_tokens
+                stats.cost_usd += cost_usd
+                if latency_ms is not None:
+                    stats.observe_latency(latency_ms, output_tokens)
+            else:
+                stats.failures += 1
+                key = str(status_code) if status_code is not None else 'unknown'
+                stats.errors_by_status[key] = stats.errors_by_status.get(key, 0) + 1
+
+    def record_requests(self, model: str, succeeded: int, failed: int,
+                        input_tokens: int = 0, output_tokens: int = 0, cost_usd: float = 0.0):
+        """バッチ結果など、レイテンシを伴わない件数をまとめて記録"""
+        with self._lock:
+            stats = self._models.get(model)
+            if stats is None:
+                stats = self._models[model] = _ModelStats(self.window_size)
+            stats.requests += succeeded + failed
+            stats.successes += succeeded
+            stats.failures += failed
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost_usd += cost_usd
+            if failed:
+                stats.errors_by_status['batch_errored'] = stats.errors_by_status.get('batch_errored', 0) + failed
+
+    def record_retry(self, model: str, status_code: Optional[Any] = None):
+        """リトライ対象となったエラー応答を記録"""
+        with self._lock:
+            stats = self._models.get(model)
+            if stats is None:
+                stats = self._models[model] = _ModelStats(self.window_size)
+            key = f"{status_code if status_code is not None else 'unknown'}_retried"
+            stats.errors_by_status[key] = stats.errors_by_status.get(key, 0) + 1
+
+    def totals(self) -> Dict[str, Any]:
+        """全モデル合計（ClaudeClient.stats 互換の形式）"""
+        with self._lock:
+            models = list(self._models.values())
+            return {
+                'total_requests': sum(m.requests for m in models),
+                'successful_requests': sum(m.successes for m in models),
+                'failed_requests': sum(m.failures for m in models),
+                'total_input_tokens': sum(m.input_tokens for m in models),
+                'total_output_tokens': sum(m.output_tokens for m in models),
+                'total_cost_usd': round(sum(m.cost_usd for m in models), 6),
+                'total_retries': sum(m.retries for m in models)
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """モデル別の統計スナップショットを取得"""
+        with self._lock:
+            by_model = {model: self._summarize(stats) for model, stats in self._models.items()}
+
+        return {
+            'since': self._started_at,
+            'uptime_seconds': round(time.time() - self._started_at, 1),
+            'latency_buckets_ms': list(LATENCY_BUCKETS_MS),
+            'totals': self.totals(),
+            'by_model': by_model
+        }
+
+    def reset(self):
+        """統計をリセット"""
+        with self._lock:
+            self._models = {}
+            self._started_at = time.time()
+
+    @staticmethod
+    def _summarize(stats: _ModelStats) -> Dict[str, Any]:
+        """ロック下で呼ぶこと"""
+        latencies = sorted(stats.recent_latencies_ms)
+        latency_seconds = stats.latency_sum_ms / 1000
+
+        return {
+            'requests': stats.requests,
+            'successes': stats.successes,
+            'failures': stats.failures,
+            'retries': stats.retries,
+            'success_rate': round(stats.successes / stats.requests, 3) if stats.requests else 0,
+            'input_tokens': stats.input_tokens,
+            'output_tokens': stats.output_tokens,
+            'cost_usd': round(stats.cost_usd, 6),
+            'latency_ms': {
+                'samples': len(latencies),
+                'avg': round(stats.latency_sum_ms / stats.latency_count, 2) if stats.latency_count else 0,
+                'p50': _percentile(latencies, 0.50),
+                'p95': _percentile(latencies, 0.95),
+                'p99': _percentile(latencies, 0.99),
+                'max': round(latencies[-1], 2) if latencies else 0
+            },
+            'latency_histogram': list(stats.bucket_counts),
+            'latency_sum_ms': round(stats.latency_sum_ms, 3),
+            'output_tokens_per_second': round(stats.timed_output_tokens / latency_seconds, 2) if latency_seconds else 0,
+            'errors_by_status': dict(stats.errors_by_status)
+        }
+
+
+def _percentile(sorted_values, q: float) -> float:
+    """ソート済みリストの最近傍順位パーセンタイル"""
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return round(sorted_values[index], 2)
+
+
+# プロセス全体で共有する統計
+_global_api_stats = ClaudeAPIStats()
+
+
+def get_api_stats() -> ClaudeAPIStats:
+    """プロセス共通の Claude API 統計を取得"""
+    return _global_api_stats
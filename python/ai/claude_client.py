@@ -5,9 +5,22 @@ Claude API専用クライアント
 import requests
 import json
 import time
-import re
-from typing import Dict, List, Optional, Any, Tuple
-from utils.logger import analysis_logger
+from typing import Dict, List, Optional, Any, Tuple, Callable, Iterator
+from utils.logger import analysis_logger, performance_logger
+from .json_stream import IncrementalJSONParser
+from .api_stats import ClaudeAPIStats, get_api_stats
+from .token_counter import get_token_counter
+
+# リトライ対象のHTTPステータス（レート制限・過負荷・一時的なサーバーエラー）
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504, 529)
+
+
+class ClaudeStreamError(Exception):
+    """ストリーム中にAPIから返されたエラーイベント"""
+    
+    def __init__(self, error_type: str, message: str):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
 
 
 class ClaudeClient:
@@ -20,16 +33,19 @@ class ClaudeClient:
         self.api_version = self.config.get('api_version', '2023-06-01')
         self.timeout = self.config.get('timeout', 60)
         self.default_model = self.config.get('default_model', 'claude-3-haiku-20240307')
+        # Message Batches API は通常料金の50%
+        self.batch_discount = self.config.get('batch_discount', 0.5)
+        self.batch_poll_interval = self.config.get('batch_poll_interval', 30)
+        self.batch_timeout = self.config.get('batch_timeout', 24 * 60 * 60)
         
-        # API統計
-        self.stats = {
-            'total_requests': 0,
-            'successful_requests': 0,
-            'failed_requests': 0,
-            'total_input_tokens': 0,
-            'total_output_tokens': 0,
-            'total_cost_usd': 0.0
-        }
+        # リトライ設定
+        self.max_retries = self.config.get('max_retries', 2)
+        self.retry_backoff = self.config.get('retry_backoff', 2.0)
+        self.retry_max_wait = self.config.get('retry_max_wait', 30.0)
+        
+        # API統計（クライアント単位 + プロセス共通）
+        self.api_stats = ClaudeAPIStats()
+        self.global_stats = get_api_stats()
         
         # モデル別トークン数制限
         self.token_limits = {
@@ -39,6 +55,11 @@ class ClaudeClient:
             'claude-3-5-sonnet-20240620': 200000
         }
     
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """API統計（合計値）"""
+        return self.api_stats.totals()
+    
     def call_api(self, prompt: str, model: Optional[str] = None, 
                  max_tokens: Optional[int] = None, **kwargs) -> Dict[str, Any]:
         """Claude APIを呼び出し"""
@@ -60,29 +81,27 @@ class ClaudeClient:
         }
         
         start_time = time.time()
-        self.stats['total_requests'] += 1
+        retries = 0
         
         try:
             analysis_logger.logger.debug(f"Claude API call: model={model}, max_tokens={max_tokens}")
             
-            response = requests.post(url, headers=headers, json=data, timeout=self.timeout)
+            response, retries = self._post_with_retry(url, headers, data, model)
             response.raise_for_status()
             
             result = response.json()
             response_time = time.time() - start_time
             
-            # 統計更新
-            self.stats['successful_requests'] += 1
             usage = result.get('usage', {})
             input_tokens = usage.get('input_tokens', 0)
             output_tokens = usage.get('output_tokens', 0)
             
-            self.stats['total_input_tokens'] += input_tokens
-            self.stats['total_output_tokens'] += output_tokens
-            
             # コスト計算
             cost = self.calculate_cost(model, input_tokens, output_tokens)
-            self.stats['total_cost_usd'] += cost['total_cost_usd']
+            
+            # 統計更新
+            self._record_request(model, True, response_time * 1000, input_tokens, output_tokens,
+                                 cost['total_cost_usd'], retries=retries)
             
             analysis_logger.log_claude_api_call(model, input_tokens, cost['total_cost_usd'])
             
@@ -93,56 +112,484 @@ class ClaudeClient:
                 'usage': usage,
                 'cost': cost,
                 'response_time_ms': round(response_time * 1000, 2),
+                'retries': retries,
                 'model': model
             }
             
         except requests.exceptions.RequestException as e:
-            self.stats['failed_requests'] += 1
+            status_code = self._status_code_of(e)
+            self._record_request(model, False, status_code=status_code, retries=retries)
             analysis_logger.log_error('claude_api_call', str(e))
             
             return {
                 'success': False,
                 'error': str(e),
                 'error_type': 'request_error',
+                'status_code': status_code,
+                'retries': retries,
                 'model': model
             }
         
         except Exception as e:
-            self.stats['failed_requests'] += 1
+            self._record_request(model, False, status_code='exception', retries=retries)
             analysis_logger.log_error('claude_api_call', str(e))
             
             return {
                 'success': False,
                 'error': str(e),
                 'error_type': 'unknown_error',
+                'retries': retries,
                 'model': model
             }
     
-    def count_tokens(self, prompt: str, model: Optional[str] = None) -> Dict[str, Any]:
-        """プロンプトのトークン数を推定"""
+    def call_api_stream(self, prompt: str, model: Optional[str] = None,
+                        max_tokens: Optional[int] = None,
+                        on_text: Optional[Callable[[str], None]] = None,
+                        on_item: Optional[Callable[[Optional[str], Any], None]] = None,
+                        **kwargs) -> Dict[str, Any]:
+        """Claude APIをストリーミング(SSE)で呼び出し
+
+        テキスト差分を受信するたびに on_text を呼び、応答中のJSON要素
+        （field_mappings の各要素や類似度アイテム）が完成した時点で on_item を呼ぶ。
+        戻り値は call_api と同じ形式。
+        """
         model = model or self.default_model
+        max_tokens = max_tokens or self._get_default_max_tokens(model)
+        
+        url = f"{self.base_url}/messages"
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "x-api-key": self.api_key,
+            "anthropic-version": self.api_version
+        }
+        
+        data = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            **kwargs
+        }
+        
+        parser = IncrementalJSONParser(on_item) if on_item else None
+        text_parts = []
+        usage = {'input_tokens': 0, 'output_tokens': 0}
+        stop_reason = None
+        first_token_time = None
+        
+        start_time = time.time()
+        retries = 0
+        
+        try:
+            analysis_logger.logger.debug(f"Claude API stream call: model={model}, max_tokens={max_tokens}")
+            
+            # リトライは応答ヘッダー受信前（ストリーム開始前）のエラーのみ
+            response, retries = self._post_with_retry(url, headers, data, model, stream=True)
+            with response:
+                response.raise_for_status()
+                response.encoding = 'utf-8'
+                
+                for event_type, payload in self._iter_sse_events(response):
+                    if event_type == 'message_start':
+                        message_usage = payload.get('message', {}).get('usage', {})
+                        usage['input_tokens'] = message_usage.get('input_tokens', 0)
+                        usage['output_tokens'] = message_usage.get('output_tokens', 0)
+                    
+                    elif event_type == 'content_block_delta':
+                        delta = payload.get('delta', {})
+                        if delta.get('type') != 'text_delta':
+                            continue
+                        text = delta.get('text', '')
+                        if first_token_time is None:
+                            first_token_time = time.time()
+                        text_parts.append(text)
+                        if on_text:
+                            on_text(text)
+                        if parser:
+                            parser.feed(text)
+                    
+                    elif event_type == 'message_delta':
+                        stop_reason = payload.get('delta', {}).get('stop_reason', stop_reason)
+                        usage['output_tokens'] = payload.get('usage', {}).get('output_tokens', usage['output_tokens'])
+                    
+                    elif event_type == 'error':
+                        error = payload.get('error', {})
+                        raise ClaudeStreamError(error.get('type', 'stream_error'), error.get('message', ''))
+                    
+                    elif event_type == 'message_stop':
+                        break
+            
+            response_time = time.time() - start_time
+            content = ''.join(text_parts)
+            
+            cost = self.calculate_cost(model, usage['input_tokens'], usage['output_tokens'])
+            
+            # 統計更新
+            self._record_request(model, True, response_time * 1000, usage['input_tokens'],
+                                 usage['output_tokens'], cost['total_cost_usd'], retries=retries)
+            
+            analysis_logger.log_claude_api_call(model, usage['input_tokens'], cost['total_cost_usd'])
+            
+            return {
+                'success': True,
+                'response': {'content': [{'type': 'text', 'text': content}], 'usage': usage,
+                             'stop_reason': stop_reason, 'model': model},
+                'content': content,
+                'usage': usage,
+                'cost': cost,
+                'response_time_ms': round(response_time * 1000, 2),
+                'first_token_ms': round((first_token_time - start_time) * 1000, 2) if first_token_time else None,
+                'items_emitted': parser.items_emitted if parser else 0,
+                'stop_reason': stop_reason,
+                'streamed': True,
+                'retries': retries,
+                'model': model
+            }
+            
+        except requests.exceptions.RequestException as e:
+            status_code = self._status_code_of(e)
+            self._record_request(model, False, status_code=status_code, retries=retries)
+            analysis_logger.log_error('claude_api_stream', str(e))
+            
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': 'request_error',
+                'status_code': status_code,
+                'partial_content': ''.join(text_parts),
+                'retries': retries,
+                'model': model
+            }
+        
+        except ClaudeStreamError as e:
+            # overloaded_error はHTTP 529相当として扱う
+            status_code = 529 if e.error_type == 'overloaded_error' else e.error_type
+            self._record_request(model, False, status_code=status_code, retries=retries)
+            analysis_logger.log_error('claude_api_stream', str(e))
+            
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': e.error_type,
+                'status_code': status_code if isinstance(status_code, int) else None,
+                'partial_content': ''.join(text_parts),
+                'retries': retries,
+                'model': model
+            }
+        
+        except Exception as e:
+            self._record_request(model, False, status_code='exception', retries=retries)
+            analysis_logger.log_error('claude_api_stream', str(e))
+            
+            return {
+                'success': False,
+                'error': str(e),
+                'error_type': 'unknown_error',
+                'partial_content': ''.join(text_parts),
+                'retries': retries,
+                'model': model
+            }
+    
+    def _post_with_retry(self, url: str, headers: Dict[str, str], data: Dict[str, Any],
+                         model: str, stream: bool = False):
+        """429/529/5xx・タイムアウト時に指数バックオフでリトライ
+
+        戻り値: (response, リトライ回数)。最終的な失敗は呼び出し側の raise_for_status で扱う。
+        """
+        retries = 0
+        while True:
+            try:
+                response = requests.post(url, headers=headers, json=data, timeout=self.timeout, stream=stream)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if retries >= self.max_retries:
+                    raise
+                status_code = 'timeout' if isinstance(e, requests.exceptions.Timeout) else 'connection_error'
+                wait = self._retry_wait(retries, None)
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or retries >= self.max_retries:
+                    return response, retries
+                status_code = response.status_code
+                wait = self._retry_wait(retries, response.headers.get('retry-after'))
+                response.close()
+            
+            self.api_stats.record_retry(model, status_code)
+            self.global_stats.record_retry(model, status_code)
+            retries += 1
+            analysis_logger.logger.warning(
+                f"⏳ Claude API {status_code}: {wait:.1f}秒後にリトライ ({retries}/{self.max_retries})"
+            )
+            time.sleep(wait)
+    
+    def _retry_wait(self, attempt: int, retry_after: Optional[str]) -> float:
+        """リトライ待機秒数（retry-after ヘッダー優先）"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.retry_max_wait)
+            except ValueError:
+                pass
+        return min(self.retry_backoff * (2 ** attempt), self.retry_max_wait)
+    
+    def _record_request(self, model: str, success: bool, latency_ms: Optional[float] = None,
+                        input_tokens: int = 0, output_tokens: int = 0, cost_usd: float = 0.0,
+                        status_code: Optional[Any] = None, retries: int = 0):
+        """クライアント統計とプロセス共通統計の両方に記録"""
+        for stats in (self.api_stats, self.global_stats):
+            stats.record_request(model, success, latency_ms, input_tokens, output_tokens,
+                                 cost_usd, status_code, retries)
+        if success:
+            # 呼び出し元の計測区間にもトークン数を記録（統計ごとではなく1回だけ）
+            performance_logger.increment(api_calls=1, tokens=input_tokens + output_tokens)
+    
+    @staticmethod
+    def _status_code_of(error: Exception) -> Any:
+        """例外からHTTPステータス（なければ種別）を取得"""
+        response = getattr(error, 'response', None)
+        if response is not None:
+            return response.status_code
+        if isinstance(error, requests.exceptions.Timeout):
+            return 'timeout'
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return 'connection_error'
+        return 'request_error'
+    
+    def _iter_sse_events(self, response) -> Iterator[Tuple[str, Dict]]:
+        """SSEストリームを (event, data) の組に分解"""
+        event_type = None
+        data_lines = []
+        
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            
+            if line == '':
+                # 空行でイベント確定
+                if data_lines:
+                    try:
+                        payload = json.loads('\n'.join(data_lines))
+                    except json.JSONDecodeError:
+                        payload = {}
+                    yield event_type or payload.get('type', 'message'), payload
+                event_type = None
+                data_lines = []
+                continue
+            
+            if line.startswith(':'):
+                continue  # コメント行 (ping等)
+            if line.startswith('event:'):
+                event_type = line[6:].strip()
+            elif line.startswith('data:'):
+                data_lines.append(line[5:].lstrip())
+        
+        if data_lines:
+            try:
+                payload = json.loads('\n'.join(data_lines))
+            except json.JSONDecodeError:
+                payload = {}
+            yield event_type or payload.get('type', 'message'), payload
+    
+    def create_message_batch(self, batch_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Message Batches API にまとめて投入
+
+        batch_requests: [{'custom_id': str, 'prompt': str, 'model': str(任意), 'max_tokens': int(任意)}, ...]
+        """
+        url = f"{self.base_url}/messages/batches"
+        payload = {
+            'requests': [
+                {
+                    'custom_id': req['custom_id'],
+                    'params': {
+                        'model': req.get('model') or self.default_model,
+                        'max_tokens': req.get('max_tokens') or self._get_default_max_tokens(req.get('model') or self.default_model),
+                        'messages': [{'role': 'user', 'content': req['prompt']}]
+                    }
+                }
+                for req in batch_requests
+            ]
+        }
         
         try:
-            # 簡易的なトークン数推定（4文字 = 1トークン）
-            estimated_tokens = len(prompt) // 4
+            response = requests.post(url, headers=self._batch_headers(), json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            batch = response.json()
             
-            # より精密な推定のためのヒューリスティック
-            # 日本語は文字数 / 2, 英語は単語数 * 1.3
-            japanese_chars = len(re.findall(r'[あ-ん|ア-ン|一-龯]', prompt))
-            english_words = len(re.findall(r'[a-zA-Z]+', prompt))
+            analysis_logger.logger.info(f"📦 Message batch created: {batch.get('id')} ({len(batch_requests)} requests)")
+            return {'success': True, 'batch': batch, 'batch_id': batch.get('id')}
             
-            heuristic_tokens = int(japanese_chars / 2 + english_words * 1.3)
+        except requests.exceptions.RequestException as e:
+            analysis_logger.log_error('claude_batch_create', str(e))
+            return {'success': False, 'error': str(e), 'error_type': 'request_error'}
+    
+    def get_message_batch(self, batch_id: str) -> Dict[str, Any]:
+        """バッチの処理状況を取得"""
+        url = f"{self.base_url}/messages/batches/{batch_id}"
+        
+        try:
+            response = requests.get(url, headers=self._batch_headers(), timeout=self.timeout)
+            response.raise_for_status()
+            return {'success': True, 'batch': response.json()}
+            
+        except requests.exceptions.RequestException as e:
+            analysis_logger.log_error('claude_batch_status', str(e))
+            return {'success': False, 'error': str(e), 'error_type': 'request_error'}
+    
+    def get_message_batch_results(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        """終了したバッチの結果(JSONL)を取得し custom_id ごとに整理"""
+        results_url = batch.get('results_url') or f"{self.base_url}/messages/batches/{batch.get('id')}/results"
+        
+        try:
+            response = requests.get(results_url, headers=self._batch_headers(), timeout=self.timeout, stream=True)
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            
+            results = {}
+            total_cost = 0.0
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                entry = json.loads(line)
+                result = self._parse_batch_result(entry.get('result', {}))
+                results[entry.get('custom_id')] = result
+                total_cost += result.get('cost', {}).get('total_cost_usd', 0.0)
+            
+            return {'success': True, 'results': results, 'total_cost_usd': round(total_cost, 6)}
+            
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            analysis_logger.log_error('claude_batch_results', str(e))
+            return {'success': False, 'error': str(e), 'error_type': 'request_error'}
+    
+    def wait_for_message_batch(self, batch_id: str, poll_interval: Optional[float] = None,
+                               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """バッチ終了(processing_status == 'ended')までポーリング"""
+        poll_interval = poll_interval if poll_interval is not None else self.batch_poll_interval
+        timeout = timeout if timeout is not None else self.batch_timeout
+        deadline = time.time() + timeout
+        
+        while True:
+            status = self.get_message_batch(batch_id)
+            if not status['success']:
+                return status
             
-            # より保守的な推定値を採用
-            estimated_tokens = max(estimated_tokens, heuristic_tokens)
+            batch = status['batch']
+            if batch.get('processing_status') == 'ended':
+                return status
+            
+            if time.time() + poll_interval > deadline:
+                return {
+                    'success': False,
+                    'error': f"Batch {batch_id} did not finish within {timeout}s",
+                    'error_type': 'timeout',
+                    'batch': batch
+                }
+            
+            analysis_logger.logger.debug(f"Message batch {batch_id}: {batch.get('request_counts')}")
+            time.sleep(poll_interval)
+    
+    def run_message_batch(self, prompts: Dict[str, str], model: Optional[str] = None,
+                          max_tokens: Optional[int] = None, poll_interval: Optional[float] = None,
+                          timeout: Optional[float] = None) -> Dict[str, Any]:
+        """プロンプト群をバッチ投入し、終了後に custom_id ごとの結果を返す"""
+        batch_requests = [
+            {'custom_id': custom_id, 'prompt': prompt, 'model': model, 'max_tokens': max_tokens}
+            for custom_id, prompt in prompts.items()
+        ]
+        
+        created = self.create_message_batch(batch_requests)
+        if not created['success']:
+            return created
+        
+        batch_id = created['batch_id']
+        finished = self.wait_for_message_batch(batch_id, poll_interval, timeout)
+        if not finished['success']:
+            finished['batch_id'] = batch_id
+            return finished
+        
+        fetched = self.get_message_batch_results(finished['batch'])
+        if not fetched['success']:
+            fetched['batch_id'] = batch_id
+            return fetched
+        
+        results = fetched['results']
+        succeeded = sum(1 for r in results.values() if r['success'])
+        
+        # 統計更新（バッチはレイテンシ分布には含めない）
+        batch_model = model or self.default_model
+        input_tokens = sum(r.get('usage', {}).get('input_tokens', 0) for r in results.values())
+        output_tokens = sum(r.get('usage', {}).get('output_tokens', 0) for r in results.values())
+        for stats in (self.api_stats, self.global_stats):
+            stats.record_requests(batch_model, succeeded, len(results) - succeeded,
+                                  input_tokens, output_tokens, fetched['total_cost_usd'])
+        performance_logger.increment(api_calls=len(results), tokens=input_tokens + output_tokens)
+        
+        analysis_logger.logger.info(
+            f"✅ Message batch {batch_id} finished: {succeeded}/{len(prompts)} succeeded "
+            f"(${fetched['total_cost_usd']:.4f})"
+        )
+        
+        return {
+            'success': True,
+            'batch_id': batch_id,
+            'request_counts': finished['batch'].get('request_counts', {}),
+            'results': results,
+            'missing_custom_ids': [custom_id for custom_id in prompts if custom_id not in results],
+            'total_cost_usd': fetched['total_cost_usd']
+        }
+    
+    def _batch_headers(self) -> Dict[str, str]:
+        """Message Batches API 用のリクエストヘッダー"""
+        return {
+            "Content-Type": "application/json",
+            "x-api-key": self.api_key,
+            "anthropic-version": self.api_version
+        }
+    
+    def _parse_batch_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """バッチ結果1件を call_api と同じ形式に変換"""
+        result_type = result.get('type')
+        
+        if result_type != 'succeeded':
+            error = result.get('error', {})
+            if isinstance(error, dict) and 'error' in error:
+                error = error['error']
+            return {
+                'success': False,
+                'error': error.get('message', result_type) if isinstance(error, dict) else str(error),
+                'error_type': result_type or 'unknown_error'
+            }
+        
+        message = result.get('message', {})
+        model = message.get('model', self.default_model)
+        usage = message.get('usage', {})
+        cost = self.calculate_cost(model, usage.get('input_tokens', 0), usage.get('output_tokens', 0))
+        for key in ('input_cost_usd', 'output_cost_usd', 'total_cost_usd'):
+            cost[key] = round(cost[key] * self.batch_discount, 6)
+        
+        return {
+            'success': True,
+            'response': message,
+            'content': self._extract_content(message),
+            'usage': usage,
+            'cost': cost,
+            'model': model
+        }
+    
+    def count_tokens(self, prompt: str, model: Optional[str] = None, remote: bool = False) -> Dict[str, Any]:
+        """プロンプトのトークン数を推定（共有 TokenCounter を使用、remote=True で count_tokens API）"""
+        model = model or self.default_model
+        
+        try:
+            token_info = get_token_counter().count(prompt, model, remote=remote)
+            estimated_tokens = token_info['tokens']
             
             return {
                 'success': True,
                 'estimated_tokens': estimated_tokens,
                 'model': model,
-                'character_count': len(prompt),
-                'japanese_chars': japanese_chars,
-                'english_words': english_words,
+                'method': token_info['method'],
+                'cached': token_info['cached'],
+                'character_count': token_info['character_count'],
+                'japanese_chars': token_info['japanese_chars'],
+                'english_words': token_info['english_words'],
                 'token_limit': self.token_limits.get(model, 200000),
                 'within_limit': estimated_tokens <= self.token_limits.get(model, 200000)
             }
@@ -228,28 +675,23 @@ class ClaudeClient:
     
     def get_stats(self) -> Dict[str, Any]:
         """API使用統計を取得"""
+        totals = self.api_stats.totals()
         success_rate = 0
-        if self.stats['total_requests'] > 0:
-            success_rate = self.stats['successful_requests'] / self.stats['total_requests']
+        if totals['total_requests'] > 0:
+            success_rate = totals['successful_requests'] / totals['total_requests']
         
         return {
-            **self.stats,
+            **totals,
             'success_rate': round(success_rate, 3),
             'avg_cost_per_request': (
-                round(self.stats['total_cost_usd'] / max(self.stats['successful_requests'], 1), 6)
-            )
+                round(totals['total_cost_usd'] / max(totals['successful_requests'], 1), 6)
+            ),
+            'by_model': self.api_stats.snapshot()['by_model']
         }
     
     def reset_stats(self):
-        """統計をリセット"""
-        self.stats = {
-            'total_requests': 0,
-            'successful_requests': 0,
-            'failed_requests': 0,
-            'total_input_tokens': 0,
-            'total_output_tokens': 0,
-            'total_cost_usd': 0.0
-        }
+        """統計をリセット（プロセス共通統計は対象外）"""
+        self.api_stats.reset()
     
     def _get_default_max_tokens(self, model: str) -> int:
         """モデル別のデフォルト最大トークン数"""
@@ -0,0 +1,135 @@
+"""
+Mercury Mapping Engine - Incremental JSON Parser
+ストリーミング応答用インクリメンタルJSONパーサー
+"""
+import json
+from typing import Any, Callable, List, Optional
+from utils.logger import analysis_logger
+
+
+class IncrementalJSONParser:
+    """テキスト断片を受け取り、完成したJSON要素を逐次コールバックする
+
+    対象となる要素:
+      - ルートオブジェクト直下の配列の要素 (例: "field_mappings": [{...}, {...}])
+      - ルートオブジェクト直下のオブジェクト値 (例: "0": {...}, "1": {...})
+      - ルート配列の要素 (例: [{...}, {...}])
+
+    コールバックは on_item(key, item) 形式で、key はルートオブジェクトのキー
+    （ルート配列の場合は None）。最初の '{' / '[' より前の文章やコードフェンスは無視する。
+    """
+
+    def __init__(self, on_item: Callable[[Optional[str], Any], None]):
+        self.on_item = on_item
+        self.items_emitted = 0
+        self.parse_errors = 0
+        self._reset()
+
+    def _reset(self):
+        """ルート要素単位の状態を初期化"""
+        self._stack: List[str] = []      # '{' または '['
+        self._in_string = False
+        self._escape = False
+        self._item_chars: Optional[List[str]] = None
+        self._item_depth = 0
+        self._key_chars: Optional[List[str]] = None
+        self._last_string: Optional[str] = None
+        self._current_key: Optional[str] = None
+
+    def feed(self, text: str):
+        """テキスト断片を投入"""
+        for char in text:
+            self._feed_char(char)
+
+    def _feed_char(self, char: str):
+        """1文字ずつ状態遷移"""
+        if self._item_chars is not None:
+            self._item_chars.append(char)
+
+        depth = len(self._stack)
+
+        # 文字列リテラル内
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._key_chars is not None:
+                    self._last_string = self._decode_string(''.join(self._key_chars))
+                    self._key_chars = None
+                return
+            if self._key_chars is not None:
+                self._key_chars.append(char)
+            return
+
+        # ルート要素の開始前は文章を読み飛ばす
+        if depth == 0 and char not in '{[':
+            return
+
+        if char == '"':
+            self._in_string = True
+            # ルートオブジェクト直下の文字列はキー候補として保持
+            if depth == 1 and self._stack[0] == '{':
+                self._key_chars = []
+            return
+
+        if char == ':' and depth == 1:
+            self._current_key = self._last_string
+            return
+
+        if char in '{[':
+            if self._item_chars is None and self._is_item_start(char):
+                self._item_chars = [char]
+                self._item_depth = depth + 1
+            self._stack.append(char)
+            return
+
+        if char in '}]':
+            if not self._stack:
+                return
+            self._stack.pop()
+
+            if self._item_chars is not None and len(self._stack) == self._item_depth - 1:
+                self._emit(''.join(self._item_chars))
+                self._item_chars = None
+
+            if not self._stack:
+                # ルート要素終了: 次のルート要素に備える
+                self._reset()
+
+    def _is_item_start(self, char: str) -> bool:
+        """現在位置で始まる要素がコールバック対象か判定"""
+        depth = len(self._stack)
+        if depth == 1:
+            # ルート配列の要素 / ルートオブジェクトのオブジェクト値
+            return self._stack[0] == '[' or char == '{'
+        if depth == 2:
+            # ルートオブジェクト直下の配列の要素
+            return self._stack[0] == '{' and self._stack[1] == '['
+        return False
+
+    def _emit(self, raw: str):
+        """完成した要素をパースしてコールバック"""
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.parse_errors += 1
+            analysis_logger.logger.warning(f"Incremental JSON item parse failed: {e}")
+            return
+
+        key = self._current_key if self._stack and self._stack[0] == '{' else None
+        self.items_emitted += 1
+        try:
+            self.on_item(key, item)
+        except Exception as e:
+            analysis_logger.log_error('json_stream_callback', str(e))
+
+    @staticmethod
+    def _decode_string(raw: str) -> str:
+        """エスケープを含む文字列リテラルをデコード"""
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return raw
@@ -0,0 +1,191 @@
+"""
+Mercury Mapping Engine - Local Message Batches Server
+Message Batches API のローカル代替サーバー（テスト・オフライン検証用）
+"""
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+from utils.logger import analysis_logger
+
+
+def _default_responder(params: Dict[str, Any]) -> str:
+    """既定の応答: 空のフィールドマッピングJSON"""
+    return json.dumps({'field_mappings': []}, ensure_ascii=False)
+
+
+class LocalBatchServer:
+    """Message Batches API 互換のローカルサーバー
+
+    ClaudeClient の base_url を `server.base_url` に向けると、
+    /messages/batches の作成・状態取得・結果取得をローカルで再現できる。
+    responder(params) が各リクエストの応答テキストを返す（例外時は errored 扱い）。
+    """
+
+    def __init__(self, responder: Optional[Callable[[Dict[str, Any]], str]] = None,
+                 host: str = '127.0.0.1', port: int = 0, processing_delay: float = 0.0):
+        self.responder = responder or _default_responder
+        self.processing_delay = processing_delay
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.rstrip('/') != '/v1/messages/batches':
+                    return self._send_json(404, _error('not_found_error', 'Not found'))
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    return self._send_json(400, _error('invalid_request_error', 'Invalid JSON'))
+                requests_ = body.get('requests')
+                if not isinstance(requests_, list) or not requests_:
+                    return self._send_json(400, _error('invalid_request_error', 'requests must be a non-empty list'))
+                self._send_json(200, server.create_batch(requests_, self._base()))
+
+            def do_GET(self):
+                parts = [p for p in self.path.split('?')[0].split('/') if p]
+                # /v1/messages/batches/{id}[/results]
+                if len(parts) < 4 or parts[:3] != ['v1', 'messages', 'batches']:
+                    return self._send_json(404, _error('not_found_error', 'Not found'))
+                batch = server.get_batch(parts[3])
+                if batch is None:
+                    return self._send_json(404, _error('not_found_error', f'Batch {parts[3]} not found'))
+                if len(parts) == 5 and parts[4] == 'results':
+                    if batch['processing_status'] != 'ended':
+                        return self._send_json(400, _error('invalid_request_error', 'Batch has not ended'))
+                    lines = '\n'.join(json.dumps(r, ensure_ascii=False) for r in server.results[parts[3]])
+                    return self._send(200, lines.encode('utf-8'), 'application/x-jsonl')
+                self._send_json(200, batch)
+
+            def _base(self) -> str:
+                return f"http://{self.headers.get('Host', server.address)}/v1"
+
+            def _send_json(self, status: int, payload: Dict[str, Any]):
+                self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                analysis_logger.logger.debug(f"LocalBatchServer: {format % args}")
+
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+
+    @property
+    def address(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """ClaudeClient の base_url に設定する値"""
+        return f"http://{self.address}/v1"
+
+    def start(self) -> 'LocalBatchServer':
+        """バックグラウンドスレッドで起動"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        analysis_logger.logger.info(f"🧪 LocalBatchServer started: {self.base_url}")
+        return self
+
+    def stop(self):
+        """停止"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def create_batch(self, batch_requests: list, base_url: str) -> Dict[str, Any]:
+        """バッチを登録し、別スレッドで処理を開始"""
+        batch_id = f"msgbatch_local_{uuid.uuid4().hex[:24]}"
+        batch = {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'in_progress',
+            'request_counts': {'processing': len(batch_requests), 'succeeded': 0,
+                               'errored': 0, 'canceled': 0, 'expired': 0},
+            'created_at': _now(),
+            'ended_at': None,
+            'results_url': None
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+            self.results[batch_id] = []
+
+        threading.Thread(
+            target=self._process_batch, args=(batch_id, batch_requests, base_url), daemon=True
+        ).start()
+        return dict(batch)
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """バッチ状態のスナップショットを取得"""
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            return json.loads(json.dumps(batch)) if batch else None
+
+    def _process_batch(self, batch_id: str, batch_requests: list, base_url: str):
+        """各リクエストに responder で応答を生成"""
+        if self.processing_delay:
+            time.sleep(self.processing_delay)
+
+        for req in batch_requests:
+            params = req.get('params', {})
+            try:
+                text = self.responder(params)
+                prompt_chars = sum(len(str(m.get('content', ''))) for m in params.get('messages', []))
+                result = {
+                    'type': 'succeeded',
+                    'message': {
+                        'id': f"msg_local_{uuid.uuid4().hex[:24]}",
+                        'type': 'message',
+                        'role': 'assistant',
+                        'model': params.get('model'),
+                        'content': [{'type': 'text', 'text': text}],
+                        'stop_reason': 'end_turn',
+                        'usage': {'input_tokens': max(prompt_chars // 4, 1),
+                                  'output_tokens': max(len(text) // 4, 1)}
+                    }
+                }
+                counter = 'succeeded'
+            except Exception as e:
+                result = {'type': 'errored', 'error': _error('api_error', str(e))}
+                counter = 'errored'
+
+            with self._lock:
+                self.results[batch_id].append({'custom_id': req.get('custom_id'), 'result': result})
+                counts = self.batches[batch_id]['request_counts']
+                counts['processing'] -= 1
+                counts[counter] += 1
+
+        with self._lock:
+            batch = self.batches[batch_id]
+            batch['processing_status'] = 'ended'
+            batch['ended_at'] = _now()
+            batch['results_url'] = f"{base_url}/messages/batches/{batch_id}/results"
+
+
+def _error(error_type: str, message: str) -> Dict[str, Any]:
+    """Anthropic API 形式のエラーボディ"""
+    return {'type': 'error', 'error': {'type': error_type, 'message': message}}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -6,6 +6,7 @@ import json
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
 from utils.logger import analysis_logger
+from .token_counter import get_token_counter
 
 
 class PromptBuilder:
@@ -164,25 +165,15 @@ class PromptBuilder:
             raise ValueError(f"Missing required parameter: {e}")
     
     def estimate_prompt_tokens(self, prompt: str) -> Dict[str, Any]:
-        """プロンプトのトークン数を推定"""
-        # 簡易的な推定（4文字 = 1トークン）
-        char_count = len(prompt)
-        estimated_tokens = char_count // 4
-        
-        # 日本語と英語を考慮した推定
-        import re
-        japanese_chars = len(re.findall(r'[あ-ん|ア-ン|一-龯]', prompt))
-        english_words = len(re.findall(r'[a-zA-Z]+', prompt))
-        
-        heuristic_tokens = int(japanese_chars / 2 + english_words * 1.3)
-        final_estimate = max(estimated_tokens, heuristic_tokens)
+        """プロンプトのトークン数を推定（共有 TokenCounter のローカル推定）"""
+        token_info = get_token_counter().count(prompt)
         
         return {
-            'character_count': char_count,
-            'estimated_tokens': final_estimate,
-            'japanese_characters': japanese_chars,
-            'english_words': english_words,
-            'estimation_method': 'heuristic'
+            'character_count': token_info['character_count'],
+            'estimated_tokens': token_info['tokens'],
+            'japanese_characters': token_info['japanese_chars'],
+            'english_words': token_info['english_words'],
+            'estimation_method': 'calibrated_local'
         }
     
     def optimize_prompt_size(self, prompt: str, max_tokens: int = 150000) -> str:
@@ -0,0 +1,251 @@
+"""
+Mercury Mapping Engine - Token Counter
+トークン数推定サービス（校正付きローカル推定 + LRUキャッシュ + 任意のリモート計数）
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import requests
+from utils.logger import analysis_logger
+
+
+# 文字種別の正規表現（Unicodeブロックで判定）
+_CHAR_CLASSES = (
+    ('kana', re.compile(r'[\u3040-\u309F\u30A0-\u30FF\u31F0-\u31FF\uFF66-\uFF9F]')),  # ひらがな・カタカナ・半角カナ
+    ('kanji', re.compile(r'[\u3400-\u4DBF\u4E00-\u9FFF\uF900-\uFAFF]')),  # CJK統合漢字・拡張A・互換漢字
+    ('latin', re.compile(r'[A-Za-z]')),
+    ('digit', re.compile(r'[0-9]')),
+    ('whitespace', re.compile(r'\s')),
+)
+_ENGLISH_WORD = re.compile(r'[A-Za-z]+')
+
+# 文字種別ごとの1文字あたりトークン数（Claude トークナイザでの実測に基づく初期値）
+DEFAULT_TOKENS_PER_CHAR = {
+    'kana': 0.8,
+    'kanji': 1.1,
+    'latin': 0.25,
+    'digit': 0.4,
+    'whitespace': 0.1,
+    'other': 0.6,   # 記号・全角英数など
+}
+
+# リモート計数の結果で更新する補正係数の範囲
+_CALIBRATION_BOUNDS = (0.5, 2.0)
+
+
+class TokenCounter:
+    """トークン数推定サービス
+
+    - estimate(): 文字種別の係数 × 補正係数によるローカル推定（ネットワーク不要）
+    - count(remote=True): /messages/count_tokens による正確な計数（結果はキャッシュ）
+    リモート計数の結果はローカル推定の補正係数にも反映される。
+    """
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = config or {}
+        self.api_key = self.config.get('api_key') or os.getenv('CLAUDE_API_KEY')
+        self.base_url = self.config.get('base_url', 'https://api.anthropic.com/v1')
+        self.api_version = self.config.get('api_version', '2023-06-01')
+        self.timeout = self.config.get('timeout', 30)
+        self.cache_size = self.config.get('cache_size', 4096)
+        self.max_remote_workers = self.config.get('max_remote_workers', 4)
+        self.tokens_per_char = {**DEFAULT_TOKENS_PER_CHAR, **self.config.get('tokens_per_char', {})}
+        self.calibration_factor = self.config.get('calibration_factor', 1.0)
+        self.calibration_weight = self.config.get('calibration_weight', 0.2)
+
+        self._cache: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'remote_calls': 0,
+            'remote_failures': 0,
+            'calibration_samples': 0
+        }
+
+    @property
+    def remote_available(self) -> bool:
+        return bool(self.api_key) and self.api_key != 'your-api-key-here'
+
+    def estimate(self, text: str) -> int:
+        """ローカル推定トークン数（キャッシュ付き）"""
+        return self.count(text)['tokens']
+
+    def count(self, text: str, model: Optional[str] = None, remote: bool = False) -> Dict[str, Any]:
+        """トークン数を取得
+
+        remote=True かつAPIキーがある場合は count_tokens API の値を使い、
+        失敗時はローカル推定にフォールバックする。
+        """
+        text_hash = _hash_text(text)
+
+        if remote and self.remote_available and model:
+            cached = self._cache_get(('remote', model, text_hash))
+            if cached:
+                return {**cached, 'cached': True}
+            remote_tokens = self._count_remote(text, model)
+            if remote_tokens is not None:
+                result = self._build_result(text, text_hash, remote_tokens, 'claude_api')
+                self._cache_put(('remote', model, text_hash), result)
+                return {**result, 'cached': False}
+
+        cached = self._cache_get(('local', text_hash))
+        if cached:
+            return {**cached, 'tokens': self._apply_calibration(cached['raw_tokens']), 'cached': True}
+
+        breakdown = self._classify(text)
+        raw_tokens = sum(breakdown[cls] * rate for cls, rate in self.tokens_per_char.items())
+        result = self._build_result(text, text_hash, None, 'local_estimate', breakdown, raw_tokens)
+        self._cache_put(('local', text_hash), result)
+        return {**result, 'cached': False}
+
+    def count_many(self, texts: List[str], model: Optional[str] = None, remote: bool = False) -> List[Dict[str, Any]]:
+        """複数テキストをまとめて計数（重複除去・キャッシュ済みを除いてリモートは並列実行）"""
+        if not (remote and self.remote_available and model):
+            return [self.count(text) for text in texts]
+
+        unique_texts = {}
+        for text in texts:
+            unique_texts.setdefault(_hash_text(text), text)
+
+        pending = [text for text_hash, text in unique_texts.items()
+                   if not self._cache_peek(('remote', model, text_hash))]
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.max_remote_workers, len(pending))) as executor:
+                list(executor.map(lambda text: self.count(text, model, remote=True), pending))
+
+        return [self.count(text, model, remote=True) for text in texts]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """キャッシュ・校正の統計"""
+        with self._lock:
+            lookups = self._stats['cache_hits'] + self._stats['cache_misses']
+            return {
+                **self._stats,
+                'cache_entries': len(self._cache),
+                'cache_size': self.cache_size,
+                'hit_rate': round(self._stats['cache_hits'] / lookups, 3) if lookups else 0,
+                'calibration_factor': round(self.calibration_factor, 4)
+            }
+
+    def clear_cache(self):
+        """キャッシュをクリア（補正係数は保持）"""
+        with self._lock:
+            self._cache.clear()
+
+    def _build_result(self, text: str, text_hash: str, remote_tokens: Optional[int], method: str,
+                      breakdown: Optional[Dict[str, int]] = None, raw_tokens: Optional[float] = None) -> Dict[str, Any]:
+        """結果辞書を作成（リモート値がある場合は補正係数を更新）"""
+        if breakdown is None:
+            breakdown = self._classify(text)
+        if raw_tokens is None:
+            raw_tokens = sum(breakdown[cls] * rate for cls, rate in self.tokens_per_char.items())
+
+        if remote_tokens is not None:
+            self._calibrate(raw_tokens, remote_tokens)
+            tokens = remote_tokens
+        else:
+            tokens = self._apply_calibration(raw_tokens)
+
+        return {
+            'tokens': tokens,
+            'raw_tokens': raw_tokens,
+            'method': method,
+            'text_hash': text_hash,
+            'character_count': len(text),
+            'japanese_chars': breakdown['kana'] + breakdown['kanji'],
+            'english_words': len(_ENGLISH_WORD.findall(text)),
+            'breakdown': breakdown
+        }
+
+    def _classify(self, text: str) -> Dict[str, int]:
+        """文字種別ごとの文字数を集計"""
+        breakdown = {}
+        classified = 0
+        for name, pattern in _CHAR_CLASSES:
+            count = len(pattern.findall(text))
+            breakdown[name] = count
+            classified += count
+        breakdown['other'] = len(text) - classified
+        return breakdown
+
+    def _apply_calibration(self, raw_tokens: float) -> int:
+        return max(1, int(round(raw_tokens * self.calibration_factor))) if raw_tokens else 0
+
+    def _calibrate(self, raw_tokens: float, remote_tokens: int):
+        """リモート計数値との比で補正係数を指数移動平均更新"""
+        if raw_tokens <= 0 or remote_tokens <= 0:
+            return
+        ratio = min(max(remote_tokens / raw_tokens, _CALIBRATION_BOUNDS[0]), _CALIBRATION_BOUNDS[1])
+        with self._lock:
+            self.calibration_factor += self.calibration_weight * (ratio - self.calibration_factor)
+            self._stats['calibration_samples'] += 1
+
+    def _count_remote(self, text: str, model: str) -> Optional[int]:
+        """count_tokens API で正確なトークン数を取得"""
+        with self._lock:
+            self._stats['remote_calls'] += 1
+        try:
+            response = requests.post(
+                f"{self.base_url}/messages/count_tokens",
+                headers={
+                    "Content-Type": "application/json",
+                    "x-api-key": self.api_key,
+                    "anthropic-version": self.api_version
+                },
+                json={"model": model, "messages": [{"role": "user", "content": text}]},
+                timeout=self.timeout
+            )
+            if response.status_code == 200:
+                return response.json().get('input_tokens', 0)
+            analysis_logger.logger.warning(f"Token count API failed: {response.status_code}")
+        except Exception as e:
+            analysis_logger.log_error('token_count_api', str(e))
+
+        with self._lock:
+            self._stats['remote_failures'] += 1
+        return None
+
+    def _cache_get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self._stats['cache_misses'] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats['cache_hits'] += 1
+            return value
+
+    def _cache_peek(self, key: tuple) -> bool:
+        with self._lock:
+            return key in self._cache
+
+    def _cache_put(self, key: tuple, value: Dict[str, Any]):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# プロセス全体で共有するインスタンス
+_token_counter: Optional[TokenCounter] = None
+_token_counter_lock = threading.Lock()
+
+
+def get_token_counter(config: Optional[Dict] = None) -> TokenCounter:
+    """共有 TokenCounter を取得（初回呼び出し時に作成）"""
+    global _token_counter
+    if _token_counter is None:
+        with _token_counter_lock:
+            if _token_counter is None:
+                _token_counter = TokenCounter(config)
+    return _token_counter
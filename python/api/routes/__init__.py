@@ -43,6 +43,60 @@ def register_api_routes(app):
     except ImportError as e:
         print(f"⚠️ Analysis API import failed: {e}")
     
+    try:
+        # AI Stats API
+        from .ai_stats import ai_stats_bp
+        app.register_blueprint(ai_stats_bp, url_prefix='/api')
+        print("✅ AI Stats API registered")
+        
+    except ImportError as e:
+        print(f"⚠️ AI Stats API import failed: {e}")
+    
+    try:
+        # Jobs API
+        from .jobs import jobs_bp
+        app.register_blueprint(jobs_bp, url_prefix='/api')
+        print("✅ Jobs API registered")
+        
+    except ImportError as e:
+        print(f"⚠️ Jobs API import failed: {e}")
+    
+    try:
+        # Uploads API
+        from .uploads import uploads_bp
+        app.register_blueprint(uploads_bp, url_prefix='/api')
+        print("✅ Uploads API registered")
+        
+    except ImportError as e:
+        print(f"⚠️ Uploads API import failed: {e}")
+    
+    try:
+        # Engines API
+        from .engines import engines_bp
+        app.register_blueprint(engines_bp, url_prefix='/api')
+        print("✅ Engines API registered")
+        
+    except ImportError as e:
+        print(f"⚠️ Engines API import failed: {e}")
+    
+    try:
+        # Mapping Rules API
+        from .mapping_rules import mapping_rules_bp
+        app.register_blueprint(mapping_rules_bp, url_prefix='/api')
+        print("✅ Mapping Rules API registered")
+        
+    except ImportError as e:
+        print(f"⚠️ Mapping Rules API import failed: {e}")
+    
+    try:
+        # Metrics API
+        from .metrics import metrics_bp
+        app.register_blueprint(metrics_bp, url_prefix='/api')
+        print("✅ Metrics API registered")
+        
+    except ImportError as e:
+        print(f"⚠️ Metrics API import failed: {e}")
+    
     # フォールバック: 基本的なヘルスチェック
     if not any(rule.endpoint and 'health' in rule.endpoint for rule in app.url_map.iter_rules()):
         health_bp = Blueprint('fallback_health', __name__)
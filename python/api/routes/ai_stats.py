@@ -0,0 +1,41 @@
+"""
+Mercury Mapping Engine - AI Stats API Routes
+Claude API 統計APIルート
+"""
+from flask import Blueprint, request, current_app
+from ai.api_stats import get_api_stats
+from .helpers import create_success_response, create_error_response
+
+# ブループリント作成
+ai_stats_bp = Blueprint('ai_stats', __name__)
+
+
+@ai_stats_bp.route('/ai/stats')
+def get_ai_stats():
+    """Claude API のモデル別レイテンシ・トークン・エラー統計を取得"""
+    try:
+        snapshot = get_api_stats().snapshot()
+        
+        model = request.args.get('model')
+        if model:
+            if model not in snapshot['by_model']:
+                return create_error_response(f'No statistics for model: {model}', 404)
+            snapshot['by_model'] = {model: snapshot['by_model'][model]}
+        
+        return create_success_response(snapshot)
+        
+    except Exception as e:
+        current_app.logger.error(f"AI stats API error: {e}")
+        return create_error_response(f"Failed to get AI stats: {str(e)}", 500)
+
+
+@ai_stats_bp.route('/ai/stats/reset', methods=['POST'])
+def reset_ai_stats():
+    """Claude API 統計をリセット"""
+    try:
+        get_api_stats().reset()
+        return create_success_response(message='AI stats reset')
+        
+    except Exception as e:
+        current_app.logger.error(f"AI stats reset error: {e}")
+        return create_error_response(f"Failed to reset AI stats: {str(e)}", 500)
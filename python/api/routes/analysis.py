@@ -5,10 +5,19 @@ Mercury Mapping Engine - Analysis API Routes
 from flask import Blueprint, request, current_app
 import os
 import json
-from core import create_mapping_engine
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from core import get_mapping_engine
+from core.result_store import ResultStore, get_result_store_path
 from config.settings import Config
+from jobs import get_job_executor, get_job_dir, load_job_result, with_result_urls, JobQueueFull
+from jobs.pipeline import normalize_field_mappings, parse_cascade_thresholds, PipelineError
+from repositories.job_repository import JobRepository
 from utils.logger import analysis_logger, performance_logger
-from .helpers import create_success_response, create_error_response
+from utils.profiling import get_profile_dir
+from .helpers import create_success_response, create_error_response, get_profile_mode
+from .jobs import submit_analysis_job, job_accepted_response, queue_full_response
+from .uploads import resolve_file_ref
 
 # ブループリント作成
 analysis_bp = Blueprint('analysis', __name__)
@@ -36,7 +45,7 @@ def analyze_basic():
         
         # エンジン初期化
         config = Config.get_analysis_config()
-        engine = create_mapping_engine(config)
+        engine = get_mapping_engine(config)
         
         analysis_logger.logger.info(f"Basic analysis started: {file_a_path}, {file_b_path}")
         
@@ -91,10 +100,9 @@ def analyze_basic():
 
 
 @analysis_bp.route('/analyze/enhanced', methods=['POST'])
+@performance_logger.timed('enhanced_analysis_api')
 def analyze_enhanced():
     """高精度カードベース分析API"""
-    performance_logger.start_timer('enhanced_analysis_api')
-    
     try:
         data = request.get_json()
         
@@ -102,96 +110,78 @@ def analyze_enhanced():
         if not data:
             return create_error_response("Request body is required", 400)
         
-        file_a_path = data.get('file_a_path', '/app/uploads/a.csv')
-        file_b_path = data.get('file_b_path', '/app/uploads/b.csv')
+        # ファイルはパスまたはアップロード済みの sha256 で指定
+        file_a_ref, file_a_path = resolve_file_ref(data, 'a', '/app/uploads/a.csv')
+        file_b_ref, file_b_path = resolve_file_ref(data, 'b', '/app/uploads/b.csv')
         confidence_threshold = data.get('confidence_threshold', 0.8)
         max_rows = data.get('max_rows', 1000)
+        similarity_mode = data.get('similarity_mode', 'library')
+        ai_model = data.get('ai_model', 'claude-3-haiku-20240307')
+        
+        if similarity_mode not in ('library', 'ai', 'cascade'):
+            return create_error_response(f"Invalid similarity_mode: {similarity_mode}", 400)
         
         # ファイル存在確認
         if not os.path.exists(file_a_path):
-            return create_error_response(f"File A not found: {file_a_path}", 404)
+            return create_error_response(f"File A not found: {file_a_ref}", 404)
         
         if not os.path.exists(file_b_path):
-            return create_error_response(f"File B not found: {file_b_path}", 404)
+            return create_error_response(f"File B not found: {file_b_ref}", 404)
         
-        # エンジン初期化
-        config = Config.get_analysis_config()
-        config['csv_max_rows'] = max_rows
-        engine = create_mapping_engine(config)
+        options = {
+            'confidence_threshold': confidence_threshold,
+            'max_rows': max_rows,
+            'similarity_mode': similarity_mode,
+            'ai_model': ai_model
+        }
+        try:
+            options.update(parse_cascade_thresholds(data))
+        except PipelineError as e:
+            return create_error_response(str(e), 400)
+        
+        # プロファイル取得（X-Mercury-Profile ヘッダーまたは profile パラメータで指定）
+        try:
+            profile_mode = get_profile_mode(data)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        if profile_mode:
+            options['profile'] = profile_mode
+        
+        # 非同期実行: job_uuid を即座に返す
+        if data.get('async'):
+            job_uuid = submit_analysis_job('enhanced', file_a_ref, file_b_ref, options, data)
+            performance_logger.set_attributes(mode=similarity_mode, job_uuid=job_uuid)
+            return job_accepted_response(job_uuid)
         
         analysis_logger.logger.info(f"Enhanced analysis started: {file_a_path}, {file_b_path}")
         
-        # CSV分析実行
-        csv_result = engine.analyze_csv_files(file_a_path, file_b_path, full_analysis=True)
-        
-        if 'error' in csv_result:
-            return create_error_response(f"CSV analysis failed: {csv_result['error']}", 400)
-        
-        analysis_a = csv_result['analysis_a']
-        analysis_b = csv_result['analysis_b']
-        
-        # カードベース分析実行
-        enhanced_mappings, card_matches = engine.analyze_card_based_mapping(
-            analysis_a['headers'], 
-            analysis_b['headers'],
-            analysis_a['sample_data'],
-            analysis_b['sample_data'],
-            analysis_a.get('full_data'),
-            analysis_b.get('full_data')
+        # 分析はワーカープロセスで実行（Webスレッドは待機のみ）
+        # 全件のマッチは結果ストアに保存し、/api/jobs/<result_id>/matches 等でページ取得する
+        result_id = str(uuid.uuid4())
+        try:
+            response_data = get_job_executor().run('enhanced', file_a_path, file_b_path, {
+                **options,
+                'result_store_path': get_result_store_path(get_job_dir(result_id)),
+                'profile_dir': get_profile_dir(get_job_dir(result_id))
+            })
+        except PipelineError as e:
+            return create_error_response(str(e), 400)
+        except FutureTimeoutError:
+            return create_error_response("Enhanced analysis timed out, submit it with async=true", 504)
+        
+        response_data = with_result_urls(result_id, response_data)
+        response_data['result_id'] = result_id
+        # 件数はジョブ保存用のため同期レスポンスからは除外
+        response_data.pop('counts', None)
+        performance_logger.set_attributes(
+            mode=similarity_mode, matches=response_data.get('card_matching', {}).get('total_matches')
         )
         
-        # マッピングサマリー作成
-        mapping_summary = engine.create_mapping_summary(enhanced_mappings, card_matches, analysis_a, analysis_b)
-        
-        # 結果検証
-        validation_result = engine.validate_mapping_results(enhanced_mappings, card_matches)
-        
-        # マッピングルール生成
-        mapping_rules = engine.export_mapping_rules(enhanced_mappings, confidence_threshold)
-        
-        # レスポンス構築
-        response_data = {
-            'analysis_type': 'enhanced',
-            'parameters': {
-                'confidence_threshold': confidence_threshold,
-                'max_rows': max_rows
-            },
-            'file_analysis': {
-                'file_a': {
-                    'path': file_a_path,
-                    'headers': analysis_a['headers'],
-                    'total_rows': analysis_a['total_rows'],
-                    'processed_rows': len(analysis_a.get('full_data', [])),
-                    'truncated': analysis_a.get('truncated', False)
-                },
-                'file_b': {
-                    'path': file_b_path,
-                    'headers': analysis_b['headers'],
-                    'total_rows': analysis_b['total_rows'],
-                    'processed_rows': len(analysis_b.get('full_data', [])),
-                    'truncated': analysis_b.get('truncated', False)
-                }
-            },
-            'card_matching': {
-                'total_matches': len(card_matches),
-                'match_quality': engine.card_matcher.analyze_match_quality(card_matches),
-                'sample_matches': card_matches[:5]  # 上位5件のみ
-            },
-            'field_mappings': {
-                'total_mappings': len(enhanced_mappings),
-                'high_confidence_mappings': [m for m in enhanced_mappings if m['confidence'] >= confidence_threshold],
-                'all_mappings': enhanced_mappings
-            },
-            'mapping_summary': mapping_summary,
-            'validation': validation_result,
-            'generated_rules': mapping_rules
-        }
-        
-        analysis_logger.logger.info(f"Enhanced analysis completed: {len(card_matches)} matches, {len(enhanced_mappings)} mappings")
-        performance_logger.end_timer('enhanced_analysis_api')
-        
         return create_success_response(response_data)
         
+    except JobQueueFull as e:
+        return queue_full_response(e)
+        
     except Exception as e:
         current_app.logger.error(f"Enhanced analysis error: {e}")
         return create_error_response(f"Enhanced analysis failed: {str(e)}", 500)
@@ -219,7 +209,7 @@ def analyze_compare():
         
         # エンジン初期化
         config = Config.get_analysis_config()
-        engine = create_mapping_engine(config)
+        engine = get_mapping_engine(config)
         
         analysis_logger.logger.info("Comparison analysis started")
         
@@ -280,20 +270,55 @@ def analyze_compare():
 
 @analysis_bp.route('/analyze/validate/<job_id>', methods=['GET'])
 def validate_analysis(job_id):
-    """分析結果の検証API"""
+    """分析結果の検証API（完了済みジョブの結果を再検証）"""
     try:
-        # 実装予定: データベースから結果を取得して検証
-        # 現在はサンプルレスポンス
+        job = JobRepository().get_job(job_id)
+        if not job:
+            return create_error_response(f"Job not found: {job_id}", 404)
+        
+        if job['status'] != 'completed':
+            return create_error_response(f"Job is not completed: {job['status']}", 409, {
+                'status': job['status'],
+                'progress': job['progress']
+            })
+        
+        result = load_job_result(job_id)
+        if result is None:
+            return create_error_response(f"Result file missing for job: {job_id}", 410)
+        
+        # ジョブ種別ごとにマッピングとマッチを取り出す
+        if result.get('analysis_type') == 'flexible':
+            mappings = normalize_field_mappings(
+                (result.get('enhanced_mappings') or {}).get('flexible_field_mappings', [])
+            )
+            matches = result.get('matches', [])
+        else:
+            mappings = result.get('field_mappings', {}).get('all_mappings', [])
+            matches = result.get('card_matches', [])
+        
+        # マッチは結果ストアにあれば上位1ページ分のみ読み込む（件数はジョブテーブルを使用）
+        store = ResultStore(get_result_store_path(get_job_dir(job_id)))
+        if store.exists():
+            matches = store.page('matches')['items']
+        
+        engine = get_mapping_engine(Config.get_analysis_config())
+        validation = engine.validate_mapping_results(mappings, matches)
         
         validation_result = {
             'job_id': job_id,
             'validation_status': 'completed',
-            'quality_score': 0.85,
-            'issues_found': [],
-            'recommendations': [
-                "高信頼度のマッピングが85%を占めており、品質は良好です",
-                "カードマッチング精度が高く、信頼性の高い結果です"
-            ]
+            'is_valid': validation['is_valid'],
+            'quality_score': _calculate_quality_score(validation),
+            'issues_found': validation['issues'] + validation['warnings'],
+            'statistics': validation['statistics'],
+            'counts': {
+                'total_records_a': job['total_records_a'],
+                'total_records_b': job['total_records_b'],
+                'matched_records': job['matched_records'],
+                'unmatched_records_a': job['unmatched_records_a'],
+                'unmatched_records_b': job['unmatched_records_b']
+            },
+            'recommendations': _generate_validation_recommendations(validation, job)
         }
         
         return create_success_response(validation_result)
@@ -303,6 +328,44 @@ def validate_analysis(job_id):
         return create_error_response(f"Validation failed: {str(e)}", 500)
 
 
+def _calculate_quality_score(validation):
+    """検証結果から品質スコア（0-1）を算出"""
+    if not validation['is_valid']:
+        return 0.0
+    
+    average_confidence = validation['statistics'].get('average_confidence', 0.0)
+    # 警告1件につき10%減点
+    penalty = 0.1 * len(validation['warnings'])
+    return round(max(0.0, average_confidence * (1 - penalty)), 3)
+
+
+def _generate_validation_recommendations(validation, job):
+    """検証結果に基づく推奨事項"""
+    recommendations = []
+    statistics = validation['statistics']
+    
+    if not validation['is_valid']:
+        recommendations.append("マッピングが得られていません。入力ファイルと分析モードを確認してください")
+        return recommendations
+    
+    total_mappings = statistics.get('total_mappings', 0)
+    low_confidence_count = statistics.get('low_confidence_count', 0)
+    if total_mappings:
+        high_ratio = (total_mappings - low_confidence_count) / total_mappings
+        if high_ratio >= 0.8:
+            recommendations.append(f"高信頼度のマッピングが{high_ratio:.0%}を占めており、品質は良好です")
+        else:
+            recommendations.append(f"低信頼度のマッピングが{low_confidence_count}件あります。手動確認を推奨します")
+    
+    total_a = job.get('total_records_a') or 0
+    if total_a:
+        match_ratio = (job.get('matched_records') or 0) / total_a
+        if match_ratio < 0.5:
+            recommendations.append(f"A社レコードのマッチ率が{match_ratio:.0%}です。類似度閾値の調整を検討してください")
+    
+    return recommendations
+
+
 def _compare_analysis_methods(traditional_mappings, enhanced_mappings):
     """従来手法と新手法の比較分析"""
     
@@ -0,0 +1,37 @@
+"""
+Mercury Mapping Engine - Engines API Routes
+共有マッピングエンジンの状態確認・リセットAPIルート
+"""
+from flask import Blueprint, request, current_app
+from core import get_engine_registry
+from .helpers import create_success_response, create_error_response
+
+# ブループリント作成
+engines_bp = Blueprint('engines', __name__)
+
+
+@engines_bp.route('/engines', methods=['GET'])
+def get_engines():
+    """このプロセスで保持しているエンジンとキャッシュの統計"""
+    try:
+        return create_success_response(get_engine_registry().get_stats())
+
+    except Exception as e:
+        current_app.logger.error(f"Engine stats error: {e}")
+        return create_error_response(f"Failed to get engine stats: {str(e)}", 500)
+
+
+@engines_bp.route('/engines/reset', methods=['POST'])
+def reset_engines():
+    """エンジンを破棄（fingerprint 指定時はその設定のみ）
+
+    Webプロセスのエンジンが対象。ワーカープロセスのエンジンはワーカーの再起動まで保持される。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        removed = get_engine_registry().reset(data.get('fingerprint'))
+        return create_success_response({'removed': removed}, 'Engine registry reset')
+
+    except Exception as e:
+        current_app.logger.error(f"Engine reset error: {e}")
+        return create_error_response(f"Failed to reset engines: {str(e)}", 500)
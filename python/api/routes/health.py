@@ -6,7 +6,8 @@ from flask import Blueprint, current_app
 import os
 from datetime import datetime
 from config.database import get_db_manager
-from core import create_mapping_engine
+from core import get_mapping_engine
+from utils.reference_cache import get_reference_cache
 from .helpers import create_success_response, create_error_response
 
 # ブループリント作成
@@ -76,7 +77,7 @@ def health_check():
         
         # Core Engine初期化チェック
         try:
-            engine = create_mapping_engine()
+            engine = get_mapping_engine()
             health_status['components']['core_engine'] = {
                 'status': 'healthy',
                 'components_loaded': True
@@ -119,7 +120,7 @@ def database_health():
         
         # カテゴリテーブルのカウント
         try:
-            categories = db_manager.get_categories()
+            categories = db_manager.get_categories(use_cache=False)
             category_count = len(categories)
         except Exception as e:
             category_count = None
@@ -129,6 +130,8 @@ def database_health():
             'connection': 'healthy' if connection_ok else 'unhealthy',
             'response_time_ms': response_time,
             'categories_count': category_count,
+            'pool': db_manager.get_pool_stats(),
+            'reference_cache': get_reference_cache().get_stats(),
             'test_timestamp': datetime.utcnow().isoformat()
         }
         
@@ -150,7 +153,7 @@ def engine_health():
     """Core Engine専用ヘルスチェック"""
     try:
         # Core Engineの初期化テスト
-        engine = create_mapping_engine()
+        engine = get_mapping_engine()
         
         engine_status = {
             'status': 'healthy',
@@ -2,10 +2,53 @@
 Mercury Mapping Engine - API Helpers
 API routes共通のヘルパー関数
 """
-from flask import jsonify, Response
-from typing import Dict, Any, Optional, Union
+from flask import Response, request
+from typing import Dict, Any, Iterable, Optional, Union
 import traceback
 from datetime import datetime
+from utils.compression import COMPRESSION_MIN_SIZE, compress, compress_stream, negotiate_encoding
+from utils.json_codec import dumps, iter_ndjson
+from utils.profiling import PROFILE_HEADER, parse_profile_mode
+
+
+def create_json_response(payload: Any, status_code: int = 200) -> Response:
+    """JSONレスポンスを作成（高速エンコーダー使用、大きい場合は Accept-Encoding に応じて圧縮）"""
+    body = dumps(payload)
+    response = Response(body, status=status_code, mimetype='application/json')
+
+    if len(body) >= COMPRESSION_MIN_SIZE:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if encoding:
+            response.set_data(compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def create_ndjson_response(items: Iterable[Any], filename: Optional[str] = None) -> Response:
+    """リストを NDJSON（1件1行）でストリーミング配信（全件を1つのJSONにしない）"""
+    chunks = iter_ndjson(items)
+    headers = {}
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding:
+        chunks = compress_stream(chunks, encoding)
+        headers['Content-Encoding'] = encoding
+        headers['Vary'] = 'Accept-Encoding'
+    if filename:
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return Response(chunks, mimetype='application/x-ndjson', headers=headers)
+
+
+def create_stream_response(chunks: Iterable[bytes], mimetype: str,
+                           headers: Optional[Dict[str, str]] = None) -> Response:
+    """バイト列チャンクのストリーミング配信（Accept-Encoding に応じて逐次圧縮）"""
+    headers = dict(headers or {})
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding:
+        chunks = compress_stream(chunks, encoding)
+        headers['Content-Encoding'] = encoding
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(chunks, mimetype=mimetype, headers=headers)
 
 
 def create_success_response(data: Any = None, message: str = "Success", 
@@ -17,9 +60,7 @@ def create_success_response(data: Any = None, message: str = "Success",
         "timestamp": datetime.now().isoformat(),
         "data": data
     }
-    response = jsonify(response_data)
-    response.status_code = status_code
-    return response
+    return create_json_response(response_data, status_code)
 
 
 def create_error_response(error: str, status_code: int = 400, 
@@ -34,8 +75,14 @@ def create_error_response(error: str, status_code: int = 400,
     if details:
         response_data["details"] = details
     
-    response = jsonify(response_data)
-    response.status_code = status_code
+    return create_json_response(response_data, status_code)
+
+
+def create_busy_response(error: str, retry_after: int, details: Optional[Dict] = None,
+                         status_code: int = 429) -> Response:
+    """混雑時のレスポンスを作成（Retry-After ヘッダー付き）"""
+    response = create_error_response(error, status_code, details)
+    response.headers['Retry-After'] = str(retry_after)
     return response
 
 
@@ -78,20 +125,38 @@ def validate_required_fields(data: Dict, required_fields: list) -> Optional[Dict
     return errors if errors else None
 
 
-def paginate_response(data: list, page: int = 1, per_page: int = 20) -> Dict[str, Any]:
-    """ページネーション付きレスポンスを作成"""
-    total = len(data)
-    start = (page - 1) * per_page
-    end = start + per_page
-    
+def parse_page_args(args) -> Dict[str, Any]:
+    """カーソル方式ページングのクエリパラメータを解析（不正値は ValueError）"""
+    page_args = {
+        'cursor': args.get('cursor') or None,
+        'limit': int(args.get('limit', 100)),
+        'sort': args.get('sort', 'desc').lower()
+    }
+    for key in ('min_score', 'max_score'):
+        if args.get(key) not in (None, ''):
+            page_args[key] = float(args[key])
+    return page_args
+
+
+def get_profile_mode(*sources: Optional[Dict[str, Any]]) -> Optional[str]:
+    """プロファイル指定（X-Mercury-Profile ヘッダー、なければ sources の 'profile'）。不正値は ValueError"""
+    value = request.headers.get(PROFILE_HEADER)
+    if value is None:
+        value = next((source['profile'] for source in sources if source and 'profile' in source), None)
+    return parse_profile_mode(value)
+
+
+def paginate_response(page: Dict[str, Any], total: Optional[int] = None,
+                      next_url: Optional[str] = None) -> Dict[str, Any]:
+    """カーソル方式のページングレスポンスを作成（page は ResultStore.page() の戻り値）"""
     return {
-        "items": data[start:end],
+        "items": page['items'],
         "pagination": {
-            "page": page,
-            "per_page": per_page,
+            "limit": page['limit'],
+            "sort": page['sort'],
             "total": total,
-            "pages": (total + per_page - 1) // per_page,
-            "has_prev": page > 1,
-            "has_next": end < total
+            "has_next": page['has_more'],
+            "next_cursor": page['next_cursor'],
+            "next_url": next_url if page['has_more'] else None
         }
     }
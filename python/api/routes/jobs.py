@@ -0,0 +1,379 @@
+"""
+Mercury Mapping Engine - Jobs API Routes
+非同期分析ジョブAPIルート
+"""
+from flask import Blueprint, Response, request, current_app
+import os
+import uuid
+from urllib.parse import urlencode
+from config.settings import Config
+from core.result_export import get_export_path, iter_file_chunks
+from core.result_store import ResultStore, get_result_store_path
+from jobs import (
+    get_job_executor, get_job_dir, get_progress_path, load_job_result, parse_cascade_thresholds, JobQueueFull,
+    PipelineError, PIPELINES, SINGLE_FILE_PIPELINES
+)
+from repositories.job_repository import JobRepository, JOB_STATUSES, FINISHED_STATUSES
+from utils.profiling import PROFILE_ARTIFACTS, get_profile_dir, get_profile_urls, load_profile_summary
+from utils.progress import ProgressEventLog, tail_progress_events
+from .helpers import (
+    create_success_response, create_error_response, create_busy_response, create_ndjson_response,
+    create_stream_response, get_profile_mode, parse_page_args, paginate_response
+)
+from .uploads import resolve_file_ref
+
+# ブループリント作成
+jobs_bp = Blueprint('jobs', __name__)
+
+
+@jobs_bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """分析ジョブを投入（job_uuid を即座に返す）"""
+    try:
+        data = request.get_json()
+        if not data:
+            return create_error_response("Request body is required", 400)
+
+        kind = data.get('kind', 'enhanced')
+        if kind not in PIPELINES:
+            return create_error_response(f"Invalid job kind: {kind}", 400, {'available_kinds': list(PIPELINES)})
+
+        # ファイルはパスまたはアップロード済みの sha256 で指定
+        file_a_ref, file_a_path = resolve_file_ref(data, 'a')
+        file_b_ref, file_b_path = resolve_file_ref(data, 'b')
+        if kind in SINGLE_FILE_PIPELINES:
+            # 変換元ファイルのみ必須（指定のない側には同じファイルを記録）
+            file_a_ref, file_a_path = (file_a_ref, file_a_path) if file_a_ref else (file_b_ref, file_b_path)
+            file_b_ref, file_b_path = (file_b_ref, file_b_path) if file_b_ref else (file_a_ref, file_a_path)
+        if not file_a_ref or not file_b_ref:
+            return create_error_response("file_a_path/file_a_sha256 and file_b_path/file_b_sha256 are required", 400)
+
+        # ファイル存在確認
+        if not os.path.exists(file_a_path):
+            return create_error_response(f"File A not found: {file_a_ref}", 404)
+
+        if not os.path.exists(file_b_path):
+            return create_error_response(f"File B not found: {file_b_ref}", 404)
+
+        # プロファイル指定は X-Mercury-Profile ヘッダー・options.profile・profile の順
+        options = dict(data.get('options') or {})
+        try:
+            profile_mode = get_profile_mode(options, data)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+        options.pop('profile', None)
+        if profile_mode:
+            options['profile'] = profile_mode
+        try:
+            options.update(parse_cascade_thresholds(options))
+        except PipelineError as e:
+            return create_error_response(str(e), 400)
+
+        job_uuid = submit_analysis_job(kind, file_a_ref, file_b_ref, options, data)
+        return job_accepted_response(job_uuid)
+
+    except JobQueueFull as e:
+        return queue_full_response(e)
+
+    except Exception as e:
+        current_app.logger.error(f"Job submit error: {e}")
+        return create_error_response(f"Job submission failed: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """ジョブ一覧"""
+    try:
+        status = request.args.get('status')
+        if status and status not in JOB_STATUSES:
+            return create_error_response(f"Invalid status: {status}", 400)
+
+        limit = min(int(request.args.get('limit', 50)), 500)
+        jobs = JobRepository().list_jobs(status, limit)
+
+        return create_success_response({'jobs': jobs, 'total': len(jobs)})
+
+    except Exception as e:
+        current_app.logger.error(f"Job list error: {e}")
+        return create_error_response(f"Failed to list jobs: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/pool', methods=['GET'])
+def get_pool_stats():
+    """ワーカープールの利用状況"""
+    try:
+        return create_success_response(get_job_executor().get_stats())
+
+    except Exception as e:
+        current_app.logger.error(f"Job pool stats error: {e}")
+        return create_error_response(f"Failed to get pool stats: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/<job_uuid>', methods=['GET'])
+def get_job_status(job_uuid):
+    """ジョブの状態・進捗"""
+    try:
+        job = JobRepository().get_job(job_uuid)
+        if not job:
+            return create_error_response(f"Job not found: {job_uuid}", 404)
+
+        if job['status'] == 'pending':
+            job['queue_position'] = get_job_executor().queue_position(job_uuid)
+
+        return create_success_response(job)
+
+    except Exception as e:
+        current_app.logger.error(f"Job status error: {e}")
+        return create_error_response(f"Failed to get job status: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/<job_uuid>/result', methods=['GET'])
+def get_job_result(job_uuid):
+    """完了したジョブの結果"""
+    try:
+        job = JobRepository().get_job(job_uuid)
+        if not job:
+            return create_error_response(f"Job not found: {job_uuid}", 404)
+
+        if job['status'] != 'completed':
+            return create_error_response(f"Job is not completed: {job['status']}", 409, {
+                'status': job['status'],
+                'progress': job['progress'],
+                'error_message': job.get('error_message')
+            })
+
+        result = load_job_result(job_uuid)
+        if result is None:
+            return create_error_response(f"Result file missing for job: {job_uuid}", 410)
+
+        return create_success_response({'job_uuid': job_uuid, 'result': result})
+
+    except Exception as e:
+        current_app.logger.error(f"Job result error: {e}")
+        return create_error_response(f"Failed to get job result: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/<job_uuid>/export', methods=['GET'])
+def download_job_export(job_uuid):
+    """マッチング結果CSVをチャンク転送でダウンロード"""
+    try:
+        # パス組み立て前に UUID 形式を検証（ディレクトリトラバーサル防止）
+        try:
+            job_uuid = str(uuid.UUID(job_uuid))
+        except ValueError:
+            return create_error_response(f"Invalid job id: {job_uuid}", 400)
+
+        export_path = get_export_path(get_job_dir(job_uuid))
+        if not os.path.exists(export_path):
+            return create_error_response(f"Export not found for job: {job_uuid}", 404)
+
+        return create_stream_response(
+            iter_file_chunks(export_path),
+            'text/csv',
+            {'Content-Disposition': f'attachment; filename="matches_{job_uuid}.csv"'}
+        )
+
+    except Exception as e:
+        current_app.logger.error(f"Job export error: {e}")
+        return create_error_response(f"Failed to download export: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/<job_uuid>/profile', methods=['GET'])
+def get_job_profile(job_uuid):
+    """プロファイル結果（format 省略時はサマリー、collapsed / pstats / text はファイルをダウンロード）"""
+    try:
+        try:
+            job_uuid = str(uuid.UUID(job_uuid))
+        except ValueError:
+            return create_error_response(f"Invalid job id: {job_uuid}", 400)
+
+        profile_dir = get_profile_dir(get_job_dir(job_uuid))
+        artifact = request.args.get('format')
+        if artifact is None:
+            summary = load_profile_summary(profile_dir)
+            if summary is None:
+                return create_error_response(f"Profile not found for job: {job_uuid}", 404)
+            return create_success_response({'job_uuid': job_uuid, **summary, **get_profile_urls(job_uuid)})
+
+        if artifact not in PROFILE_ARTIFACTS:
+            return create_error_response(f"Invalid format: {artifact}", 400, {'available_formats': list(PROFILE_ARTIFACTS)})
+
+        filename, mimetype = PROFILE_ARTIFACTS[artifact]
+        path = os.path.join(profile_dir, filename)
+        if not os.path.exists(path):
+            return create_error_response(f"Profile {artifact} not found for job: {job_uuid}", 404)
+
+        return create_stream_response(
+            iter_file_chunks(path),
+            mimetype,
+            {'Content-Disposition': f'attachment; filename="{job_uuid}_{filename}"'}
+        )
+
+    except Exception as e:
+        current_app.logger.error(f"Job profile error: {e}")
+        return create_error_response(f"Failed to get profile: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/<job_uuid>/matches', methods=['GET'])
+def list_job_matches(job_uuid):
+    """マッチ一覧（スコア順・カーソル方式ページング、min_score / max_score で絞り込み）"""
+    return _result_page(job_uuid, 'matches')
+
+
+@jobs_bp.route('/jobs/<job_uuid>/unmatched', methods=['GET'])
+def list_job_unmatched(job_uuid):
+    """アンマッチ行一覧（side=a|b、行番号順・カーソル方式ページング）"""
+    return _result_page(job_uuid, 'unmatched')
+
+
+@jobs_bp.route('/jobs/<job_uuid>/mappings', methods=['GET'])
+def list_job_mappings(job_uuid):
+    """フィールドマッピング一覧（信頼度順・カーソル方式ページング）"""
+    return _result_page(job_uuid, 'mappings')
+
+
+def _result_page(job_uuid, kind):
+    """結果ストアから1ページ分を返す（全件をメモリに載せない）
+
+    format=ndjson の場合はページングせず、条件に合う全件を1行1件でストリーミング配信する。
+    """
+    try:
+        # パス組み立て前に UUID 形式を検証（ディレクトリトラバーサル防止）
+        try:
+            job_uuid = str(uuid.UUID(job_uuid))
+        except ValueError:
+            return create_error_response(f"Invalid job id: {job_uuid}", 400)
+
+        store = ResultStore(get_result_store_path(get_job_dir(job_uuid)))
+        if not store.exists():
+            return create_error_response(f"Results not found for job: {job_uuid}", 404)
+
+        try:
+            page_args = parse_page_args(request.args)
+            side = request.args.get('side', '').lower() or None
+            page = store.page(kind, side=side, **page_args)
+        except ValueError as e:
+            return create_error_response(str(e), 400)
+
+        if request.args.get('format') == 'ndjson':
+            # 先頭ページの検証は済んでいるので、以降はページ単位で読みながら配信
+            filters = {key: value for key, value in page_args.items() if key not in ('cursor', 'limit')}
+            filename = f"{kind}{'_' + side if side else ''}_{job_uuid}.ndjson"
+            return create_ndjson_response(store.iter_items(kind, side=side, **filters), filename)
+
+        counts = store.get_counts()
+        total = counts.get(f"unmatched_{side}") if kind == 'unmatched' else counts.get(kind)
+        # 絞り込み時は総件数を返さない（全件の COUNT は行わない）
+        if 'min_score' in page_args or 'max_score' in page_args:
+            total = None
+
+        next_url = None
+        if page['next_cursor']:
+            query = {key: value for key, value in request.args.items() if key != 'cursor'}
+            query['cursor'] = page['next_cursor']
+            next_url = f"{request.path}?{urlencode(query)}"
+
+        return create_success_response(paginate_response(page, total, next_url))
+
+    except Exception as e:
+        current_app.logger.error(f"Job {kind} page error: {e}")
+        return create_error_response(f"Failed to get job {kind}: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/<job_uuid>/events', methods=['GET'])
+def stream_job_events(job_uuid):
+    """進捗イベントを Server-Sent Events で配信（Last-Event-ID で再開可能）"""
+    try:
+        repository = JobRepository()
+        if not repository.get_job(job_uuid):
+            return create_error_response(f"Job not found: {job_uuid}", 404)
+
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id', '0')
+        try:
+            last_seq = int(last_event_id)
+        except ValueError:
+            last_seq = 0
+
+        config = Config.get_config('default')
+
+        def final_state():
+            """終了済み（または削除・停止したジョブ）なら最終状態を返す"""
+            job = repository.get_progress_state(job_uuid)
+            if job is None:
+                return {'job_uuid': job_uuid, 'status': 'missing'}
+            status = job['status']
+            if status not in FINISHED_STATUSES:
+                if status != 'running' or (job['idle_seconds'] or 0) < config.JOB_STALE_TIMEOUT:
+                    return None
+                # 実行中のまま更新が止まっている（ワーカーの異常終了など）
+                status = 'stale'
+            return {
+                'job_uuid': job_uuid,
+                'status': status,
+                'progress': job['progress'],
+                'error_message': job.get('error_message'),
+                'result_url': job.get('result_url')
+            }
+
+        events = tail_progress_events(
+            ProgressEventLog(get_progress_path(job_uuid)), final_state, last_seq=last_seq,
+            max_duration=config.JOB_EVENTS_MAX_DURATION, retry_ms=config.JOB_EVENTS_RETRY_MS
+        )
+        return Response(events, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # プロキシでのバッファリングを無効化
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Job events error: {e}")
+        return create_error_response(f"Failed to stream job events: {str(e)}", 500)
+
+
+@jobs_bp.route('/jobs/<job_uuid>/cancel', methods=['POST'])
+def cancel_job(job_uuid):
+    """ジョブを取り消し"""
+    try:
+        if not get_job_executor().cancel(job_uuid):
+            job = JobRepository().get_job(job_uuid)
+            if not job:
+                return create_error_response(f"Job not found: {job_uuid}", 404)
+            return create_error_response(f"Job already finished: {job['status']}", 409)
+
+        return create_success_response({'job_uuid': job_uuid, 'status': 'cancelled'}, 'Job cancelled')
+
+    except Exception as e:
+        current_app.logger.error(f"Job cancel error: {e}")
+        return create_error_response(f"Failed to cancel job: {str(e)}", 500)
+
+
+def submit_analysis_job(kind, file_a_path, file_b_path, options, data=None):
+    """ジョブ投入の共通処理（分析API・Webページからも使用）
+
+    file_a_path / file_b_path はファイルパスまたは sha256:<hash> 参照（ジョブ記録にそのまま保存）。
+    """
+    data = data or {}
+    return get_job_executor().submit(
+        kind, file_a_path, file_b_path, options,
+        category2_id=data.get('category2_id'),
+        company_a_id=data.get('company_a_id'),
+        company_b_id=data.get('company_b_id'),
+        created_by=data.get('created_by') or request.remote_addr
+    )
+
+
+def job_accepted_response(job_uuid):
+    """202 Accepted レスポンス"""
+    return create_success_response({
+        'job_uuid': job_uuid,
+        'status': 'pending',
+        'queue_position': get_job_executor().queue_position(job_uuid),
+        'status_url': f"/api/jobs/{job_uuid}",
+        'result_url': f"/api/jobs/{job_uuid}/result"
+    }, 'Job accepted', 202)
+
+
+def queue_full_response(error: JobQueueFull):
+    """ワーカープール飽和時の 429 レスポンス"""
+    return create_busy_response(
+        "Analysis workers are busy, retry later", error.retry_after, error.to_dict()
+    )
@@ -0,0 +1,100 @@
+"""
+Mercury Mapping Engine - Mapping Rules API Routes
+生成マッピングルールの保存・取得APIルート
+"""
+from flask import Blueprint, request, current_app
+from jobs import load_job_result
+from repositories.job_repository import JobRepository
+from repositories.mapping_rule_repository import MappingRuleRepository
+from .helpers import create_success_response, create_error_response
+
+# ブループリント作成
+mapping_rules_bp = Blueprint('mapping_rules', __name__)
+
+_KEY_FIELDS = ('category2_id', 'company_a_id', 'company_b_id')
+
+
+@mapping_rules_bp.route('/mapping-rules', methods=['GET'])
+def get_mapping_rules():
+    """カテゴリ×会社ペアのルールセット（バージョン情報とルール一覧）"""
+    try:
+        try:
+            key = tuple(int(request.args[field]) for field in _KEY_FIELDS)
+        except (KeyError, ValueError):
+            return create_error_response("category2_id, company_a_id and company_b_id are required", 400)
+
+        include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
+        repository = MappingRuleRepository()
+        rule_set = repository.get_rule_set(*key)
+        if rule_set is None:
+            return create_error_response("Mapping rule set not found", 404)
+
+        return create_success_response({
+            'rule_set': rule_set,
+            'rules': repository.get_rules(*key, include_inactive=include_inactive)
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Mapping rules fetch error: {e}")
+        return create_error_response(f"Failed to get mapping rules: {str(e)}", 500)
+
+
+@mapping_rules_bp.route('/mapping-rules', methods=['POST'])
+def save_mapping_rules():
+    """ルールセットを保存（rules を直接指定、または job_uuid で完了済みジョブの generated_rules を保存）"""
+    try:
+        data = request.get_json()
+        if not data:
+            return create_error_response("Request body is required", 400)
+
+        job_uuid = data.get('job_uuid')
+        if job_uuid:
+            job = JobRepository().get_job(job_uuid)
+            if not job:
+                return create_error_response(f"Job not found: {job_uuid}", 404)
+            if job['status'] != 'completed':
+                return create_error_response(f"Job is not completed: {job['status']}", 409)
+
+            result = load_job_result(job_uuid)
+            if result is None:
+                return create_error_response(f"Result file missing for job: {job_uuid}", 410)
+
+            rules = (result.get('generated_rules') or {}).get('rules')
+            key = tuple(job[field] for field in _KEY_FIELDS)
+        else:
+            rules = data.get('rules')
+            try:
+                key = tuple(int(data[field]) for field in _KEY_FIELDS)
+            except (KeyError, TypeError, ValueError):
+                return create_error_response("category2_id, company_a_id and company_b_id are required", 400)
+
+        if not isinstance(rules, list):
+            return create_error_response("No mapping rules to save", 400)
+        errors = _validate_rules(rules)
+        if errors:
+            return create_error_response("Invalid mapping rules", 400, {'errors': errors})
+
+        saved = MappingRuleRepository().save_rule_set(*key, rules, source_job_uuid=job_uuid)
+        return create_success_response(saved, 'Mapping rules saved')
+
+    except Exception as e:
+        current_app.logger.error(f"Mapping rules save error: {e}")
+        return create_error_response(f"Failed to save mapping rules: {str(e)}", 500)
+
+
+def _validate_rules(rules):
+    """ルールごとの入力チェック（エラーがなければ None）"""
+    errors = {}
+    for index, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            errors[index] = "Rule must be an object"
+            continue
+        if not str(rule.get('source_field') or rule.get('company_a_field') or '').strip():
+            errors[index] = "source_field is required"
+        elif not str(rule.get('target_field') or rule.get('company_b_field') or '').strip():
+            errors[index] = "target_field is required"
+        elif rule.get('confidence') is not None and (
+                isinstance(rule['confidence'], bool) or not isinstance(rule['confidence'], (int, float))):
+            errors[index] = "confidence must be a number"
+
+    return errors if errors else None
@@ -0,0 +1,26 @@
+"""
+Mercury Mapping Engine - Metrics API Routes
+Prometheus 形式のメトリクス出力APIルート
+"""
+from flask import Blueprint, Response, current_app
+from utils.metrics import add_cache_hit_ratios, get_metrics_registry, render_prometheus
+from .helpers import create_error_response
+
+# ブループリント作成
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """全プロセス（Webワーカー・ジョブワーカー）のメトリクスを合算して返す"""
+    try:
+        registry = get_metrics_registry()
+        registry.flush()
+        families = add_cache_hit_ratios(registry.collect())
+        return Response(render_prometheus(families), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+    except Exception as e:
+        current_app.logger.error(f"Metrics error: {e}")
+        return create_error_response(f"Failed to collect metrics: {str(e)}", 500)
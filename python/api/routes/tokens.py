@@ -3,8 +3,7 @@ Mercury Mapping Engine - Tokens API Routes
 トークン計算APIルート
 """
 from flask import Blueprint, request, current_app
-import os
-import requests
+from ai.token_counter import get_token_counter
 from .helpers import create_success_response, create_error_response
 
 # ブループリント作成
@@ -13,49 +12,44 @@ tokens_bp = Blueprint('tokens', __name__)
 
 @tokens_bp.route('/tokens/count', methods=['POST'])
 def count_tokens():
-    """プロンプトのトークン数をカウント"""
+    """プロンプトのトークン数をカウント（count_tokens API の結果はキャッシュ）"""
     try:
-        claude_api_key = os.getenv('CLAUDE_API_KEY')
-        if not claude_api_key or claude_api_key == 'your-api-key-here':
-            return create_error_response('Claude API key not configured', 400)
-        
         data = request.get_json()
         if not data:
             return create_error_response('Request body is required', 400)
         
         prompt = data.get('prompt', '')
+        prompts = data.get('prompts')
         model = data.get('model', 'claude-3-haiku-20240307')
         
-        if not prompt:
+        if not prompt and not prompts:
             return create_error_response('Prompt is required', 400)
-        
-        # Claude APIでトークン数を計算
-        token_count = _count_tokens_with_api(claude_api_key, prompt, model)
-        
-        if token_count is not None:
-            # コスト見積もり
-            estimated_cost = _estimate_cost(model, token_count)
-            
-            return create_success_response({
-                'model': model,
-                'input_tokens': token_count,
-                'estimated_cost': estimated_cost,
-                'prompt_length': len(prompt),
-                'method': 'claude_api'
-            })
-        else:
-            # フォールバック: 簡易計算
-            estimated_tokens = _estimate_tokens_simple(prompt)
-            estimated_cost = _estimate_cost(model, estimated_tokens)
-            
+        if not isinstance(prompt, str):
+            return create_error_response('prompt must be a string', 400)
+        
+        counter = get_token_counter()
+        
+        # 複数プロンプトはまとめて計数（重複・キャッシュ済みはAPIを呼ばない）
+        if prompts:
+            if not isinstance(prompts, list):
+                return create_error_response('prompts must be a list', 400)
+            invalid = [i for i, text in enumerate(prompts) if not isinstance(text, str)]
+            if invalid:
+                return create_error_response('prompts must be a list of strings', 400, {'invalid_indexes': invalid})
+            counts = counter.count_many(prompts, model, remote=True)
             return create_success_response({
                 'model': model,
-                'input_tokens': estimated_tokens,
-                'estimated_cost': estimated_cost,
-                'prompt_length': len(prompt),
-                'method': 'estimation',
-                'warning': 'API token count failed, using estimation'
+                'counts': [_format_count(model, text, info) for text, info in zip(prompts, counts)],
+                'total_input_tokens': sum(info['tokens'] for info in counts),
+                'cache_stats': counter.get_stats()
             })
+        
+        token_info = counter.count(prompt, model, remote=True)
+        response_data = _format_count(model, prompt, token_info)
+        if token_info['method'] != 'claude_api':
+            response_data['warning'] = 'API token count unavailable, using calibrated estimation'
+        
+        return create_success_response(response_data)
             
     except Exception as e:
         current_app.logger.error(f"Token count error: {e}")
@@ -64,7 +58,7 @@ def count_tokens():
 
 @tokens_bp.route('/tokens/estimate', methods=['POST'])
 def estimate_tokens():
-    """簡易トークン数推定（APIを使わない）"""
+    """ローカル推定によるトークン数（APIを使わない）"""
     try:
         data = request.get_json()
         if not data:
@@ -75,24 +69,20 @@ def estimate_tokens():
         
         if not prompt:
             return create_error_response('Prompt is required', 400)
+        if not isinstance(prompt, str):
+            return create_error_response('prompt must be a string', 400)
         
-        # 複数の推定方法
-        estimates = {
-            'simple': _estimate_tokens_simple(prompt),
-            'word_based': _estimate_tokens_word_based(prompt),
-            'character_based': _estimate_tokens_character_based(prompt)
-        }
-        
-        # 平均値を使用
-        average_estimate = sum(estimates.values()) // len(estimates)
+        counter = get_token_counter()
+        token_info = counter.count(prompt)
         
         # コスト見積もり
-        estimated_cost = _estimate_cost(model, average_estimate)
+        estimated_cost = _estimate_cost(model, token_info['tokens'])
         
         return create_success_response({
             'model': model,
-            'estimated_tokens': average_estimate,
-            'estimation_methods': estimates,
+            'estimated_tokens': token_info['tokens'],
+            'character_breakdown': token_info['breakdown'],
+            'calibration_factor': counter.get_stats()['calibration_factor'],
             'estimated_cost': estimated_cost,
             'prompt_length': len(prompt),
             'method': 'estimation_only',
@@ -104,6 +94,12 @@ def estimate_tokens():
         return create_error_response(f"Token estimation failed: {str(e)}", 500)
 
 
+@tokens_bp.route('/tokens/stats')
+def token_counter_stats():
+    """トークン計数キャッシュ・校正の統計"""
+    return create_success_response(get_token_counter().get_stats())
+
+
 @tokens_bp.route('/tokens/cost', methods=['POST'])
 def calculate_cost():
     """トークン数からコストを計算"""
@@ -136,76 +132,16 @@ def calculate_cost():
         return create_error_response(f"Cost calculation failed: {str(e)}", 500)
 
 
-def _count_tokens_with_api(api_key, prompt, model):
-    """Claude APIを使用してトークン数をカウント"""
-    try:
-        url = "https://api.anthropic.com/v1/messages/count_tokens"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": api_key,
-            "anthropic-version": "2023-06-01"
-        }
-        
-        data = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ]
-        }
-        
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('input_tokens', 0)
-        else:
-            current_app.logger.warning(f"Token count API failed: {response.status_code}")
-            return None
-            
-    except Exception as e:
-        current_app.logger.error(f"Token count API error: {e}")
-        return None
-
-
-def _estimate_tokens_simple(text):
-    """簡易トークン数推定（文字数÷4）"""
-    return max(1, len(text) // 4)
-
-
-def _estimate_tokens_word_based(text):
-    """単語ベースのトークン数推定"""
-    import re
-    
-    # 英語の単語数
-    english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-    
-    # 日本語の文字数（ひらがな、カタカナ、漢字）
-    japanese_chars = len(re.findall(r'[ひらがなカタカナ一-龯]', text))
-    
-    # 推定：英語1単語≈1トークン、日本語2文字≈1トークン
-    estimated_tokens = english_words + (japanese_chars // 2)
-    
-    return max(1, estimated_tokens)
-
-
-def _estimate_tokens_character_based(text):
-    """文字種別ベースのトークン数推定"""
-    import re
-    
-    # 文字種別カウント
-    ascii_chars = len(re.findall(r'[a-zA-Z0-9]', text))
-    japanese_chars = len(re.findall(r'[ひらがなカタカナ一-龯]', text))
-    symbols = len(re.findall(r'[^\w\s]', text))
-    spaces = text.count(' ')
-    
-    # 推定係数
-    estimated = (ascii_chars * 0.3) + (japanese_chars * 0.7) + (symbols * 0.5) + (spaces * 0.1)
-    
-    return max(1, int(estimated))
+def _format_count(model, prompt, token_info):
+    """トークン計数結果をレスポンス形式に整形"""
+    return {
+        'model': model,
+        'input_tokens': token_info['tokens'],
+        'estimated_cost': _estimate_cost(model, token_info['tokens']),
+        'prompt_length': len(prompt),
+        'method': 'claude_api' if token_info['method'] == 'claude_api' else 'estimation',
+        'cached': token_info['cached']
+    }
 
 
 def _estimate_cost(model, input_tokens, output_tokens=0):
@@ -0,0 +1,82 @@
+"""
+Mercury Mapping Engine - Uploads API Routes
+CSVアップロードAPIルート（内容ハッシュで保存・重複排除）
+"""
+from flask import Blueprint, request, current_app
+import os
+from utils.upload_store import get_upload_store, HASH_REF_PREFIX
+from .helpers import create_success_response, create_error_response
+
+# ブループリント作成
+uploads_bp = Blueprint('uploads', __name__)
+
+
+@uploads_bp.route('/uploads', methods=['POST'])
+def upload_files():
+    """CSVファイルをアップロード（multipart、複数可）して sha256 参照を返す"""
+    try:
+        if not request.files:
+            return create_error_response("No files uploaded", 400)
+
+        upload_store = get_upload_store()
+        uploads = {}
+        for field_name, file_storage in request.files.items(multi=True):
+            if not file_storage.filename:
+                continue
+            stored = upload_store.save_file(file_storage)
+            stored.pop('path', None)
+            uploads.setdefault(field_name, []).append(stored)
+
+        if not uploads:
+            return create_error_response("No files uploaded", 400)
+
+        # 1フィールド1ファイルの場合は配列にしない
+        uploads = {name: files[0] if len(files) == 1 else files for name, files in uploads.items()}
+        return create_success_response({'uploads': uploads}, 'Files uploaded', 201)
+
+    except Exception as e:
+        current_app.logger.error(f"Upload error: {e}")
+        return create_error_response(f"Upload failed: {str(e)}", 500)
+
+
+@uploads_bp.route('/uploads/stats', methods=['GET'])
+def get_upload_stats():
+    """保存・重複排除の統計"""
+    from core.csv_analyzer import get_parsed_csv_cache
+    return create_success_response({
+        'upload_store': get_upload_store().get_stats(),
+        'parsed_csv_cache': get_parsed_csv_cache().get_stats()
+    })
+
+
+@uploads_bp.route('/uploads/<sha256>', methods=['GET'])
+def get_upload_info(sha256):
+    """アップロード済みファイルの情報"""
+    try:
+        upload_store = get_upload_store()
+        if not upload_store.exists(sha256):
+            return create_error_response(f"Upload not found: {sha256}", 404)
+
+        path = upload_store.path_for(sha256)
+        return create_success_response({
+            'sha256': sha256.lower(),
+            'ref': HASH_REF_PREFIX + sha256.lower(),
+            'size': os.path.getsize(path)
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Upload info error: {e}")
+        return create_error_response(f"Failed to get upload info: {str(e)}", 500)
+
+
+def resolve_file_ref(data, side, default_path=None):
+    """リクエストのファイル指定を (参照, 実パス) に変換
+
+    file_<side>_sha256 があればアップロード保存領域を参照し、
+    なければ file_<side>_path（sha256:<hash> 形式も可）を使う。
+    """
+    sha256 = data.get(f'file_{side}_sha256')
+    file_ref = f"{HASH_REF_PREFIX}{sha256.lower()}" if sha256 else data.get(f'file_{side}_path', default_path)
+    if not file_ref:
+        return None, None
+    return file_ref, get_upload_store().resolve(file_ref)
@@ -0,0 +1,13 @@
+"""
+Mercury Mapping Engine - Benchmarks
+合成トレーディングカードデータによるマッチング処理のベンチマーク
+
+    python -m benchmarks.generate --rows 10000 --output-dir /tmp/cards   # CSV を出力
+    python -m benchmarks.run --sizes 1000,10000 --output results.json   # ベンチマーク実行
+"""
+from .dataset import generate_catalogs, write_catalogs
+
+__all__ = [
+    'generate_catalogs',
+    'write_catalogs'
+]
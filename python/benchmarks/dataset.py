@@ -0,0 +1,221 @@
+"""
+Mercury Mapping Engine - Synthetic Card Catalogs
+A社・B社の対になったトレーディングカード商品データを生成
+
+A社は name / serial / releace_date(YYYY/M/D) / price(1,280) 形式、B社は カード名 / 型番 /
+発売日(YYYYMMDD) / 価格(1280円) 形式で出力する。B社側の同一カードには noise の確率で
+表記ゆれ（全角英数・ひらがな/カタカナ・空白・記号・型番の書式）を加える。
+
+B社の行は shuffle_window 行ごとのブロック内でのみ並べ替えるため、先頭 k 行どうしを
+比較しても対応する行の大半が含まれる（2乗オーダーのマッチャーを先頭だけで計測できる）。
+"""
+import csv
+import os
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+
+HEADERS_A = ['name', 'serial', 'releace_date', 'attribute', 'rarity', 'series', 'price']
+HEADERS_B = ['カード名', '型番', '発売日', '色', 'レアリティ', 'シリーズ', '価格']
+
+# 正解のフィールド対応（A社 → B社）
+FIELD_TRUTH = list(zip(HEADERS_A, HEADERS_B))
+
+_EPITHETS = [
+    '炎の', '蒼き', '伝説の', '闇の', '光の', '疾風の', '鋼の', '氷結の', '雷鳴の', '黄金の',
+    '深紅の', '白銀の', '漆黒の', '大地の', '天空の', '聖なる', '孤高の', '若き', '幻の', '不屈の',
+    '月影の', '星詠みの', '紅蓮の', '翠の', '暁の', '宵闇の', '勇敢な', '静寂の', '嵐の', '真紅の',
+    '碧海の', '無双の'
+]
+_CHARACTERS = [
+    'アカリ', 'ソウマ', 'レイナ', 'カイト', 'ミサキ', 'ユウト', 'ヒナタ', 'リク', 'サクラ', 'ハルト',
+    'ツバサ', 'アオイ', 'コハル', 'レン', 'ミオ', 'シオン', 'カナデ', 'イツキ', 'ユイ', 'タクミ',
+    'ドラグーン', 'フェニックス', 'ナイト', 'ウィザード', 'ゴーレム', 'ワイバーン', 'セイレーン',
+    'ヴァルキリー', 'グリフォン', 'キメラ', 'リヴァイアサン', 'ケルベロス', 'ペガサス', 'ユニコーン',
+    'ガーディアン', 'サムライ', 'ニンジャ', 'シャーマン', 'パラディン', 'アサシン', 'ハンター',
+    'プリンセス', 'エンペラー', 'マジシャン', 'バーサーカー', 'スナイパー', 'ドルイド', 'ルーンナイト'
+]
+_FORMS = ['', '＆ミライ', '（パラレル）', ' EX', ' -覚醒-', ' Ver.2', '（プロモ）', ' & トワ']
+_LEVELS = 64
+
+_SERIES = [
+    ('PK', 'プロモーションパック'), ('BT', 'ブースターパック第1弾'), ('BS', 'ブースターパック第2弾'),
+    ('ST', 'スターターデッキ'), ('EX', 'エクストラパック'), ('PR', 'プロモカード'),
+    ('SP', 'スペシャルセット'), ('CP', 'チャンピオンシップパック')
+]
+_ATTRIBUTES = ['赤', '青', '緑', '黄', '紫', '白', '黒']
+_RARITIES = ['C', 'U', 'R', 'SR', 'SEC', 'P']
+_RARITY_WEIGHTS = [40, 25, 18, 10, 3, 4]
+
+_NAME_CAPACITY = len(_EPITHETS) * len(_CHARACTERS) * len(_FORMS) * _LEVELS
+# 名前の組み合わせを散らすための乗数（_NAME_CAPACITY と互いに素）
+_NAME_STRIDE = 7919
+
+_FULL_WIDTH = str.maketrans({chr(code): chr(code + 0xFEE0) for code in range(0x21, 0x7F)})
+_KATAKANA_TO_HIRAGANA = str.maketrans({chr(code): chr(code - 0x60) for code in range(0x30A1, 0x30F7)})
+
+
+def card_name(key: int) -> str:
+    """key ごとに決まるカード名（_NAME_CAPACITY 件までは重複しない）"""
+    key = (key * _NAME_STRIDE) % _NAME_CAPACITY
+    key, epithet = divmod(key, len(_EPITHETS))
+    key, character = divmod(key, len(_CHARACTERS))
+    level, form = divmod(key, len(_FORMS))
+    return f"{_EPITHETS[epithet]}{_CHARACTERS[character]}{_FORMS[form]} Lv.{level + 1}"
+
+
+def _make_card(key: int, rng: random.Random) -> Dict[str, Any]:
+    """表記に依存しないカード属性"""
+    code, series = _SERIES[key % len(_SERIES)]
+    return {
+        'name': card_name(key),
+        'serial': f"{code}{key // len(_SERIES) + 1:03d}",
+        'release': date(2020, 1, 1) + timedelta(days=rng.randrange(6 * 365)),
+        'attribute': rng.choice(_ATTRIBUTES),
+        'rarity': rng.choices(_RARITIES, _RARITY_WEIGHTS)[0],
+        'series': series,
+        'price': rng.randrange(10, 3000) * 10
+    }
+
+
+def _format_a(card: Dict[str, Any]) -> Dict[str, str]:
+    release = card['release']
+    return {
+        'name': card['name'],
+        'serial': card['serial'],
+        'releace_date': f"{release.year}/{release.month}/{release.day}",
+        'attribute': card['attribute'],
+        'rarity': card['rarity'],
+        'series': card['series'],
+        'price': f"{card['price']:,}"
+    }
+
+
+def _noisy_name(name: str, rng: random.Random) -> str:
+    variant = rng.randrange(5)
+    if variant == 0:
+        return name.translate(_FULL_WIDTH)
+    if variant == 1:
+        return name.translate(_KATAKANA_TO_HIRAGANA)
+    if variant == 2:
+        return name.replace(' ', '　').replace('＆', '&')
+    if variant == 3:
+        return f" {name} "
+    return name.replace('Lv.', 'LV').replace('（', '(').replace('）', ')')
+
+
+def _noisy_serial(serial: str, rng: random.Random) -> str:
+    variant = rng.randrange(3)
+    if variant == 0:
+        return serial.lower()
+    if variant == 1:
+        return f"{serial[:2]}-{serial[2:]}"
+    return serial.translate(_FULL_WIDTH)
+
+
+def _format_b(card: Dict[str, Any], noise: float, rng: random.Random) -> Dict[str, str]:
+    release = card['release']
+    row = {
+        'カード名': card['name'],
+        '型番': card['serial'],
+        '発売日': release.strftime('%Y%m%d'),
+        '色': card['attribute'],
+        'レアリティ': card['rarity'],
+        'シリーズ': card['series'],
+        '価格': f"{card['price']}円"
+    }
+    if rng.random() < noise:
+        row['カード名'] = _noisy_name(card['name'], rng)
+    if rng.random() < noise:
+        row['型番'] = _noisy_serial(card['serial'], rng)
+    if rng.random() < noise:
+        row['発売日'] = release.strftime('%Y-%m-%d')
+    if rng.random() < noise:
+        row['レアリティ'] = card['rarity'].translate(_FULL_WIDTH)
+    if rng.random() < noise:
+        # 仕入先ごとの価格差
+        row['価格'] = f"{card['price'] + rng.choice([-100, -50, 50, 100])}円"
+    return row
+
+
+def generate_catalogs(rows: int, overlap: float = 0.6, noise: float = 0.2,
+                      seed: int = 42, shuffle_window: int = 50) -> Dict[str, Any]:
+    """A社・B社それぞれ rows 行のカタログと正解データを生成
+
+    Args:
+        rows: 各社の行数
+        overlap: A社の行のうち B社にも存在する割合
+        noise: B社の同一カードで各フィールドに表記ゆれを加える確率
+        seed: 乱数シード（同じ引数なら同じデータ）
+        shuffle_window: B社の行を並べ替えるブロックの行数（1 で並べ替えなし）
+
+    Returns:
+        headers_a / data_a / headers_b / data_b / truth（(A行, B行) の正解ペア）/
+        field_truth（正解のフィールド対応）/ params
+    """
+    if rows < 1:
+        raise ValueError("rows must be positive")
+    if not 0.0 <= overlap <= 1.0 or not 0.0 <= noise <= 1.0:
+        raise ValueError("overlap and noise must be between 0 and 1")
+
+    rng = random.Random(seed)
+    shared = int(rows * overlap)
+    # 共通カードを A社の行全体に散らす
+    shared_rows = set(rng.sample(range(rows), shared))
+
+    data_a = []
+    pending_b: List[Tuple[Dict[str, str], int]] = []   # (B社の行, 対応する A社の行 or -1)
+    for i in range(rows):
+        card = _make_card(i, rng)
+        data_a.append(_format_a(card))
+        if i in shared_rows:
+            pending_b.append((_format_b(card, noise, rng), i))
+        else:
+            # B社にしかないカード（A社のカードとは別のキー）
+            pending_b.append((_format_b(_make_card(rows + i, rng), noise, rng), -1))
+
+    window = max(1, shuffle_window)
+    for start in range(0, rows, window):
+        block = pending_b[start:start + window]
+        rng.shuffle(block)
+        pending_b[start:start + window] = block
+
+    data_b = [row for row, _ in pending_b]
+    truth = sorted((a_index, b_index) for b_index, (_, a_index) in enumerate(pending_b) if a_index >= 0)
+
+    return {
+        'headers_a': list(HEADERS_A),
+        'data_a': data_a,
+        'headers_b': list(HEADERS_B),
+        'data_b': data_b,
+        'truth': truth,
+        'field_truth': list(FIELD_TRUTH),
+        'params': {
+            'rows': rows,
+            'overlap': overlap,
+            'noise': noise,
+            'seed': seed,
+            'shuffle_window': window,
+            'shared_rows': shared
+        }
+    }
+
+
+def write_catalogs(catalogs: Dict[str, Any], output_dir: str) -> Dict[str, str]:
+    """a.csv / b.csv / truth.csv（UTF-8 BOM 付き、アップロード画面でそのまま使える形式）を書き出し"""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: os.path.join(output_dir, f"{name}.csv") for name in ('a', 'b', 'truth')}
+
+    for side in ('a', 'b'):
+        with open(paths[side], 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=catalogs[f"headers_{side}"])
+            writer.writeheader()
+            writer.writerows(catalogs[f"data_{side}"])
+
+    with open(paths['truth'], 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['row_a_index', 'row_b_index'])
+        writer.writerows(catalogs['truth'])
+
+    return paths
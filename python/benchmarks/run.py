@@ -0,0 +1,292 @@
+"""
+Mercury Mapping Engine - Benchmark Runner
+合成カタログで各マッチャーのスループット・ピークメモリ・適合率/再現率を計測し JSON に保存
+
+    python -m benchmarks.run --sizes 1000,10000,100000 --output results.json
+    python -m benchmarks.run --sizes 1000 --baseline results_main.json    # 前回結果との比較
+
+各マッチャーは A社×B社 の総当たり（2乗オーダー）のため、データセットの先頭
+max_rows 行どうしを対象に計測する（--max-rows で変更可）。適合率・再現率はその範囲内の
+正解ペアに対して計算する。ピークメモリは tracemalloc を有効にした別の1回で計測する
+（tracemalloc 有効時は処理が遅くなるため、時間計測には含めない）。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from .dataset import generate_catalogs
+
+
+Pair = Tuple[int, int]
+RESULT_FORMAT_VERSION = 1
+
+
+def _window(catalogs: Dict[str, Any], rows: int):
+    return (catalogs['data_a'][:rows], catalogs['data_b'][:rows],
+            catalogs['headers_a'], catalogs['headers_b'])
+
+
+def _run_two_stage(catalogs: Dict[str, Any], rows: int) -> Dict[str, Any]:
+    from core.two_stage_matching import two_stage_matching_system
+
+    data_a, data_b, headers_a, headers_b = _window(catalogs, rows)
+    identical_pairs, field_mappings = two_stage_matching_system(data_a, data_b, headers_a, headers_b)
+
+    # 結果は行 dict そのものなので、オブジェクトIDで行番号に戻す
+    index_a = {id(row): i for i, row in enumerate(data_a)}
+    index_b = {id(row): j for j, row in enumerate(data_b)}
+    return {
+        'comparisons': len(data_a) * len(data_b),
+        'predicted_pairs': {(index_a[id(pair['card_a'])], index_b[id(pair['card_b'])]) for pair in identical_pairs},
+        'predicted_fields': {(m.get('field_a'), m.get('field_b')) for m in field_mappings}
+    }
+
+
+def _run_flexible(catalogs: Dict[str, Any], rows: int) -> Dict[str, Any]:
+    from core.flexible_matching import flexible_enhanced_matching
+
+    data_a, data_b, headers_a, headers_b = _window(catalogs, rows)
+    matches, mappings = flexible_enhanced_matching(data_a, data_b, headers_a, headers_b, max_sample_size=rows)
+    return {
+        # FlexibleMatcher は max_comparisons で比較数を打ち切る
+        'comparisons': min(mappings['total_comparisons'], 10000),
+        'predicted_pairs': {(m['row_a_index'], m['row_b_index']) for m in matches},
+        'predicted_fields': {(field_a, field_b) for field_a, field_b, _ in mappings['flexible_field_mappings']}
+    }
+
+
+def _run_brute_force(catalogs: Dict[str, Any], rows: int) -> Dict[str, Any]:
+    from core.card_matcher import CardMatcher
+
+    data_a, data_b, headers_a, headers_b = _window(catalogs, rows)
+    matches = CardMatcher().brute_force_matching(data_a, data_b, headers_a, headers_b,
+                                                 max_sample_size=rows, similarity_mode='library')
+    return {
+        'comparisons': len(data_a) * len(data_b),
+        'predicted_pairs': {(m['row_a_index'], m['row_b_index']) for m in matches},
+        'predicted_fields': None
+    }
+
+
+def _run_field_mapper(catalogs: Dict[str, Any], rows: int) -> Dict[str, Any]:
+    """正解ペア（先頭 rows 件）を入力にしたフィールドマッピングの精度"""
+    from core.field_mapper import FieldMapper
+
+    data_a, data_b = catalogs['data_a'], catalogs['data_b']
+    headers_a, headers_b = catalogs['headers_a'], catalogs['headers_b']
+    card_matches = [
+        {'row_a_index': i, 'row_b_index': j, 'row_a_data': data_a[i], 'row_b_data': data_b[j]}
+        for i, j in catalogs['truth'][:rows]
+    ]
+    mapper = FieldMapper()
+    field_mappings = mapper.analyze_field_mappings_from_matches(card_matches, headers_a, headers_b)
+    confident = mapper.calculate_mapping_confidence(field_mappings, card_matches)
+    return {
+        'comparisons': len(card_matches) * len(headers_a) * len(headers_b),
+        'predicted_pairs': None,
+        'predicted_fields': {(m['company_a_field'], m['company_b_field']) for m in confident}
+    }
+
+
+# 名前 → (実行関数, 既定の最大行数)
+TARGETS: Dict[str, Tuple[Callable[[Dict[str, Any], int], Dict[str, Any]], int]] = {
+    'two_stage': (_run_two_stage, 2000),
+    'flexible': (_run_flexible, 100),
+    'brute_force': (_run_brute_force, 40),
+    'field_mapper': (_run_field_mapper, 500)
+}
+
+
+def precision_recall(predicted: Set, expected: Set) -> Dict[str, Any]:
+    true_positives = len(predicted & expected)
+    precision = true_positives / len(predicted) if predicted else 0.0
+    recall = true_positives / len(expected) if expected else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'predicted': len(predicted),
+        'expected': len(expected),
+        'true_positives': true_positives,
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(f1, 4)
+    }
+
+
+def run_target(name: str, catalogs: Dict[str, Any], rows: int,
+               repeat: int = 1, measure_memory: bool = True) -> Dict[str, Any]:
+    """1マッチャー × 1データセットの計測"""
+    func, _ = TARGETS[name]
+    rows = min(rows, len(catalogs['data_a']))
+
+    timings = []
+    outcome = None
+    for _ in range(max(1, repeat)):
+        start_time = time.perf_counter()
+        outcome = func(catalogs, rows)
+        timings.append(time.perf_counter() - start_time)
+
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            func(catalogs, rows)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    elapsed = statistics.median(timings)
+    result = {
+        'target': name,
+        'dataset_rows': len(catalogs['data_a']),
+        'rows': rows,
+        'repeat': len(timings),
+        'elapsed_s': round(elapsed, 4),
+        'elapsed_min_s': round(min(timings), 4),
+        'comparisons': outcome['comparisons'],
+        'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'comparisons_per_second': round(outcome['comparisons'] / elapsed, 1) if elapsed > 0 else None,
+        'peak_memory_mb': round(peak_memory / 1024 / 1024, 2) if peak_memory is not None else None
+    }
+
+    if outcome['predicted_pairs'] is not None:
+        expected = {(i, j) for i, j in catalogs['truth'] if i < rows and j < rows}
+        result['pairs'] = precision_recall(outcome['predicted_pairs'], expected)
+    if outcome['predicted_fields'] is not None:
+        result['fields'] = precision_recall(outcome['predicted_fields'], set(catalogs['field_truth']))
+    return result
+
+
+def _git_revision() -> Dict[str, Any]:
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+        return {'commit': commit, 'dirty': bool(status.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def run_benchmarks(sizes: List[int], targets: List[str], overlap: float = 0.6, noise: float = 0.2,
+                   seed: int = 42, repeat: int = 1, max_rows: Optional[Dict[str, int]] = None,
+                   measure_memory: bool = True) -> Dict[str, Any]:
+    """sizes ごとにデータセットを生成し、targets を順に計測"""
+    max_rows = max_rows or {}
+    datasets = []
+    results = []
+    for size in sizes:
+        start_time = time.perf_counter()
+        catalogs = generate_catalogs(size, overlap=overlap, noise=noise, seed=seed)
+        datasets.append({**catalogs['params'], 'generate_s': round(time.perf_counter() - start_time, 3)})
+
+        for name in targets:
+            rows = max_rows.get(name, TARGETS[name][1])
+            result = run_target(name, catalogs, rows, repeat=repeat, measure_memory=measure_memory)
+            results.append(result)
+            print(_format_result(result), flush=True)
+        del catalogs
+
+    return {
+        'format_version': RESULT_FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git': _git_revision(),
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'datasets': datasets,
+        'results': results
+    }
+
+
+def _format_result(result: Dict[str, Any]) -> str:
+    line = (f"{result['target']:<13} n={result['dataset_rows']:<8} rows={result['rows']:<6} "
+            f"{result['elapsed_s']:>8.3f}s {result['comparisons_per_second'] or 0:>12,.0f} cmp/s")
+    if result['peak_memory_mb'] is not None:
+        line += f" {result['peak_memory_mb']:>8.2f}MB"
+    for kind in ('pairs', 'fields'):
+        if kind in result:
+            line += f"  {kind} P={result[kind]['precision']:.3f} R={result[kind]['recall']:.3f}"
+    return line
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """同じ (target, dataset_rows, rows) の結果どうしの差分（比率は current / baseline）"""
+    previous = {(r['target'], r['dataset_rows'], r['rows']): r for r in baseline.get('results', [])}
+    rows = []
+    for result in current.get('results', []):
+        before = previous.get((result['target'], result['dataset_rows'], result['rows']))
+        if before is None:
+            continue
+        entry = {'target': result['target'], 'dataset_rows': result['dataset_rows'], 'rows': result['rows']}
+        for key in ('elapsed_s', 'peak_memory_mb'):
+            if before.get(key) and result.get(key) is not None:
+                entry[f"{key}_ratio"] = round(result[key] / before[key], 3)
+        for kind in ('pairs', 'fields'):
+            if kind in result and kind in before:
+                for metric in ('precision', 'recall'):
+                    entry[f"{kind}_{metric}_delta"] = round(result[kind][metric] - before[kind][metric], 4)
+        rows.append(entry)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合成カタログによるマッチングのベンチマーク')
+    parser.add_argument('--sizes', default='1000,10000', help='データセット行数（カンマ区切り）')
+    parser.add_argument('--targets', default=','.join(TARGETS), help=f"計測対象: {', '.join(TARGETS)}")
+    parser.add_argument('--max-rows', action='append', default=[], metavar='TARGET=N',
+                        help='計測対象ごとの最大行数（例: brute_force=100）')
+    parser.add_argument('--overlap', type=float, default=0.6)
+    parser.add_argument('--noise', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=1, help='時間計測の繰り返し回数（中央値を採用）')
+    parser.add_argument('--no-memory', action='store_true', help='tracemalloc によるピークメモリ計測を省略')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='比較対象の結果JSON')
+    parser.add_argument('--verbose', action='store_true', help='マッチャーのINFOログを表示')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    targets = [name.strip() for name in args.targets.split(',') if name.strip()]
+    unknown = [name for name in targets if name not in TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets: {unknown}")
+    max_rows = {}
+    for item in args.max_rows:
+        name, _, value = item.partition('=')
+        if name not in TARGETS or not value.isdigit():
+            parser.error(f"Invalid --max-rows: {item}")
+        max_rows[name] = int(value)
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    report = run_benchmarks(sizes, targets, overlap=args.overlap, noise=args.noise, seed=args.seed,
+                            repeat=args.repeat, max_rows=max_rows, measure_memory=not args.no_memory)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline'] = {'path': args.baseline, 'git': baseline.get('git')}
+        report['comparison'] = compare_results(baseline, report)
+        for entry in report['comparison']:
+            print(json.dumps(entry, ensure_ascii=False))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Results saved: {args.output}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,18 +2,48 @@
 Mercury Mapping Engine - Database Configuration
 データベース接続管理
 """
+import threading
+import time
+from collections import OrderedDict
 import mysql.connector
 from mysql.connector import pooling
+from mysql.connector.errors import PoolError
 from contextlib import contextmanager
+from utils.reference_cache import get_reference_cache
 from .settings import Config
 
 
+class DatabasePoolTimeout(Exception):
+    """プール・オーバーフロー分とも使用中で、待機上限までに接続を取得できなかった"""
+
+
 class DatabaseManager:
-    """データベース接続管理クラス"""
+    """データベース接続管理クラス
+
+    プール（pool_size）が枯渇した場合は max_overflow 件まで一時接続を開き、
+    それも使い切った場合は timeout 秒まで返却を待つ。
+    パラメータ付きクエリは接続ごとにプリペアドステートメントとしてキャッシュする。
+    """
     
-    def __init__(self, config_name='default'):
+    def __init__(self, config_name='default', pool_size=None):
         self.config = Config.get_database_config(config_name)
+        self.pool_config = Config.get_database_pool_config(config_name)
+        if pool_size is not None:
+            self.pool_config['pool_size'] = pool_size
         self.pool = None
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._overflow = 0
+        self._metrics = {
+            'checkouts': 0,
+            'overflow_checkouts': 0,
+            'timeouts': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'in_use_max': 0,
+            'statement_cache_hits': 0,
+            'statement_cache_misses': 0
+        }
         self._create_connection_pool()
     
     def _create_connection_pool(self):
@@ -22,31 +52,97 @@ class DatabaseManager:
             pool_config = self.config.copy()
             pool_config.update({
                 'pool_name': 'mercury_pool',
-                'pool_size': 5,
-                'pool_reset_session': True
+                'pool_size': max(1, min(self.pool_config['pool_size'], pooling.CNX_POOL_MAXSIZE)),
+                'pool_reset_session': self.pool_config['reset_session']
             })
             
             self.pool = pooling.MySQLConnectionPool(**pool_config)
-            print("✅ Database connection pool created")
+            print(f"✅ Database connection pool created (size={pool_config['pool_size']}, "
+                  f"overflow={self.pool_config['max_overflow']})")
             
         except Exception as e:
             print(f"❌ Failed to create database connection pool: {e}")
             raise
     
+    def _checkout(self):
+        """接続を取得（プール → オーバーフロー → 返却待ちの順）し、(接続, オーバーフローか) を返す"""
+        started = time.monotonic()
+        deadline = started + self.pool_config['timeout']
+        overflow = False
+        connection = None
+        
+        with self._condition:
+            while True:
+                try:
+                    connection = self.pool.get_connection()
+                    break
+                except PoolError:
+                    if self._overflow < self.pool_config['max_overflow']:
+                        self._overflow += 1
+                        overflow = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics['timeouts'] += 1
+                        raise DatabasePoolTimeout(
+                            f"Timed out after {self.pool_config['timeout']}s waiting for a database connection"
+                        )
+                    self._condition.wait(remaining)
+        
+        if overflow:
+            # プール外の一時接続（返却時に切断）
+            try:
+                connection = mysql.connector.connect(**self.config)
+            except Exception:
+                with self._condition:
+                    self._overflow -= 1
+                    self._condition.notify()
+                raise
+        
+        wait_ms = (time.monotonic() - started) * 1000
+        with self._condition:
+            self._in_use += 1
+            self._metrics['checkouts'] += 1
+            self._metrics['overflow_checkouts'] += int(overflow)
+            self._metrics['wait_ms_total'] += wait_ms
+            self._metrics['wait_ms_max'] = max(self._metrics['wait_ms_max'], wait_ms)
+            self._metrics['in_use_max'] = max(self._metrics['in_use_max'], self._in_use)
+        return connection, overflow
+    
+    def _checkin(self, connection, overflow):
+        """接続を返却（プール接続はプールへ、一時接続は切断）
+
+        autocommit 無効のため、SELECT だけでも REPEATABLE READ のスナップショットが残る。
+        pool_reset_session を無効にしている場合もプールへ戻す前にロールバックして終了させ、
+        次の利用者が古いデータを読まないようにする。
+        """
+        try:
+            if not overflow and connection.in_transaction:
+                connection.rollback()
+        except Exception as e:
+            print(f"Connection rollback failed: {e}")
+        try:
+            connection.close()
+        except Exception as e:
+            print(f"Connection close failed: {e}")
+        finally:
+            with self._condition:
+                self._in_use -= 1
+                if overflow:
+                    self._overflow -= 1
+                self._condition.notify()
+    
     @contextmanager
     def get_connection(self):
         """コネクションをコンテキストマネージャーで取得"""
-        connection = None
+        connection, overflow = self._checkout()
         try:
-            connection = self.pool.get_connection()
             yield connection
         except Exception as e:
-            if connection:
-                connection.rollback()
+            connection.rollback()
             raise e
         finally:
-            if connection and connection.is_connected():
-                connection.close()
+            self._checkin(connection, overflow)
     
     @contextmanager
     def get_cursor(self, dictionary=False):
@@ -58,6 +154,68 @@ class DatabaseManager:
             finally:
                 cursor.close()
     
+    @contextmanager
+    def transaction(self, dictionary=False):
+        """1トランザクションでまとめて実行（正常終了でコミット、例外時はロールバック）"""
+        with self.get_connection() as connection:
+            cursor = connection.cursor(dictionary=dictionary)
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+    
+    def _prepared_cursor(self, connection, query, dictionary):
+        """接続ごとのプリペアドステートメントキャッシュからカーソルを取得（無効時は None）"""
+        cache_size = self.pool_config['statement_cache_size']
+        # セッションリセットを行う場合は返却ごとにステートメントが破棄されるため使わない
+        if cache_size <= 0 or self.pool_config['reset_session']:
+            return None
+        
+        # プール接続は実体の接続にキャッシュを持たせる（再接続でステートメントは無効になる）
+        target = getattr(connection, '_cnx', None) or connection
+        connection_id = getattr(target, 'connection_id', None)
+        cache = getattr(target, '_mercury_statement_cache', None)
+        if cache is None or getattr(target, '_mercury_statement_connection_id', None) != connection_id:
+            cache = OrderedDict()
+            target._mercury_statement_cache = cache
+            target._mercury_statement_connection_id = connection_id
+        
+        key = (query, dictionary)
+        cursor = cache.get(key)
+        with self._condition:
+            self._metrics['statement_cache_hits' if cursor is not None else 'statement_cache_misses'] += 1
+        if cursor is not None:
+            cache.move_to_end(key)
+            return cursor
+        
+        cursor = connection.cursor(prepared=True, dictionary=dictionary)
+        cache[key] = cursor
+        while len(cache) > cache_size:
+            _, evicted = cache.popitem(last=False)
+            try:
+                evicted.close()
+            except Exception:
+                pass
+        return cursor
+    
+    def _discard_prepared(self, connection, query, dictionary):
+        """失敗したステートメントをキャッシュから外す"""
+        target = getattr(connection, '_cnx', None) or connection
+        cache = getattr(target, '_mercury_statement_cache', None)
+        if cache is not None:
+            cache.pop((query, dictionary), None)
+    
+    def close(self):
+        """プール内の接続をすべて切断（一時的に作成したマネージャーの後始末用）"""
+        if self.pool is not None:
+            # mysql.connector のプールには全接続を切断する公開APIがない
+            self.pool._remove_connections()
+            self.pool = None
+    
     def test_connection(self):
         """接続テスト"""
         try:
@@ -70,28 +228,78 @@ class DatabaseManager:
             return False
     
     def execute_query(self, query, params=None, fetch=False, dictionary=False):
-        """クエリ実行ヘルパー"""
+        """クエリ実行ヘルパー
+
+        結果セットを返す文（cursor.description あり）は fetch=True で行を返し、
+        それ以外は影響行数を返してコミットする。パラメータ付きクエリはプリペアドステートメントで実行する。
+        """
         try:
-            with self.get_cursor(dictionary=dictionary) as (cursor, connection):
-                cursor.execute(query, params or ())
-                
-                if fetch:
-                    if 'SELECT' in query.upper():
-                        return cursor.fetchall()
-                    else:
-                        return cursor.rowcount
-                else:
+            with self.get_connection() as connection:
+                cursor = self._prepared_cursor(connection, query, dictionary) if params else None
+                prepared = cursor is not None
+                if not prepared:
+                    cursor = connection.cursor(dictionary=dictionary)
+                try:
+                    cursor.execute(query, params or ())
+                    
+                    if cursor.description is not None:
+                        # 未読の結果を残さない（次の実行・返却でエラーになるため）
+                        rows = cursor.fetchall()
+                        return rows if fetch else cursor.rowcount
+                    
                     connection.commit()
                     return cursor.rowcount
+                except Exception:
+                    if prepared:
+                        self._discard_prepared(connection, query, dictionary)
+                        cursor.close()
+                    raise
+                finally:
+                    if not prepared:
+                        cursor.close()
                     
         except Exception as e:
             print(f"Query execution failed: {e}")
             raise
     
-    def get_categories(self):
-        """カテゴリ一覧を取得"""
+    def executemany(self, query, seq_of_params, batch_size=None):
+        """同じ文を複数パラメータで実行（batch_size 件ごとに送信し、全体を1トランザクションでコミット）
+
+        INSERT ... VALUES は mysql.connector が複数行 INSERT にまとめて送信する。
+        """
+        batch_size = batch_size or self.pool_config['executemany_batch_size']
+        seq_of_params = list(seq_of_params)
+        total = 0
+        with self.transaction() as cursor:
+            for start in range(0, len(seq_of_params), batch_size):
+                cursor.executemany(query, seq_of_params[start:start + batch_size])
+                total += max(cursor.rowcount, 0)
+        return total
+    
+    def get_pool_stats(self):
+        """プールの利用状況（メトリクス出力用）"""
+        with self._condition:
+            checkouts = self._metrics['checkouts']
+            return {
+                **self._metrics,
+                'wait_ms_total': round(self._metrics['wait_ms_total'], 3),
+                'wait_ms_max': round(self._metrics['wait_ms_max'], 3),
+                'wait_ms_avg': round(self._metrics['wait_ms_total'] / checkouts, 3) if checkouts else 0.0,
+                'in_use': self._in_use,
+                'overflow_in_use': self._overflow,
+                'pool_size': self.pool.pool_size if self.pool else 0,
+                'max_overflow': self.pool_config['max_overflow'],
+                'timeout': self.pool_config['timeout']
+            }
+    
+    def get_categories(self, use_cache=True):
+        """カテゴリ一覧を取得（参照データキャッシュ経由）"""
         query = "SELECT * FROM mercury_category2 WHERE active = 1"
-        return self.execute_query(query, fetch=True, dictionary=True)
+        if not use_cache:
+            return self.execute_query(query, fetch=True, dictionary=True)
+        return get_reference_cache().get_or_load(
+            'categories', 'active', lambda: self.execute_query(query, fetch=True, dictionary=True)
+        )
     
     def health_check(self):
         """ヘルスチェック用のクエリ実行"""
@@ -105,13 +313,15 @@ class DatabaseManager:
 
 # グローバルなデータベースマネージャーインスタンス
 _db_manager = None
+_db_config_name = None
 
 
 def init_db(app):
     """アプリケーション初期化時のDB設定"""
-    global _db_manager
+    global _db_manager, _db_config_name
     
     config_name = 'production' if not app.config.get('DEBUG') else 'development'
+    _db_config_name = config_name
     _db_manager = DatabaseManager(config_name)
     
     # アプリケーションコンテキストにDB管理を追加
@@ -124,6 +334,20 @@ def init_db(app):
         app.logger.error("❌ Database connection failed")
 
 
+def init_worker_db(config_name=None):
+    """ワーカープロセス用のDB初期化（親プロセスのコネクションプールは共有しない）"""
+    global _db_manager, _db_config_name
+    
+    _db_config_name = config_name or _db_config_name or 'default'
+    _db_manager = DatabaseManager(_db_config_name)
+    return _db_manager
+
+
+def get_db_config_name():
+    """init_db() で使用した設定名"""
+    return _db_config_name
+
+
 def get_db_manager():
     """グローバルなDB管理インスタンスを取得"""
     if _db_manager is None:
@@ -0,0 +1,210 @@
+"""
+Mercury Mapping Engine - Local Database
+MySQL を用意できない環境（テスト・ローカル検証）向けの SQLite 代替
+
+DatabaseManager と同じインターフェース（get_connection / get_cursor / transaction / execute_query）を持ち、
+リポジトリ層で使っている MySQL 構文（%s, NOW(), ON DUPLICATE KEY UPDATE, VALUES(col), FOR UPDATE）を
+SQLite 向けに書き換えて実行する。
+"""
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+# init.sql のうち SQLite で使うテーブル（ENUM / JSON は TEXT、UNSIGNED 等は省略）
+LOCAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mercury_common_mapping_rule (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category2_id INTEGER NOT NULL,
+    company_a_id INTEGER NOT NULL,
+    company_b_id INTEGER NOT NULL,
+    company_a_field TEXT NOT NULL,
+    company_b_field TEXT NOT NULL,
+    common_field_name TEXT NOT NULL,
+    mapping_type TEXT DEFAULT 'direct',
+    transform_rule TEXT,
+    confidence REAL DEFAULT NULL,
+    priority INTEGER DEFAULT 1,
+    rule_version INTEGER NOT NULL DEFAULT 1,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT NULL,
+    updated_at TEXT DEFAULT NULL,
+    UNIQUE (category2_id, company_a_id, company_b_id, company_a_field, company_b_field)
+);
+
+CREATE TABLE IF NOT EXISTS mercury_normalization_rule (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category2_id INTEGER NOT NULL,
+    field_name TEXT NOT NULL,
+    rule_type TEXT NOT NULL,
+    rule_config TEXT NOT NULL,
+    execution_order INTEGER DEFAULT 1,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT DEFAULT NULL,
+    updated_at TEXT DEFAULT NULL
+);
+
+CREATE TABLE IF NOT EXISTS mercury_mapping_rule_set (
+    category2_id INTEGER NOT NULL,
+    company_a_id INTEGER NOT NULL,
+    company_b_id INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    rule_count INTEGER NOT NULL DEFAULT 0,
+    source_job_uuid TEXT NULL,
+    created_at TEXT DEFAULT NULL,
+    updated_at TEXT DEFAULT NULL,
+    PRIMARY KEY (category2_id, company_a_id, company_b_id)
+);
+
+CREATE TABLE IF NOT EXISTS mercury_match_result (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    row_a_index INTEGER NOT NULL,
+    row_b_index INTEGER NOT NULL,
+    score REAL NOT NULL,
+    method TEXT DEFAULT NULL,
+    created_at TEXT DEFAULT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_match_result_job_score ON mercury_match_result (job_id, score);
+"""
+
+_PLACEHOLDER_PATTERN = re.compile(r'%s')
+_NOW_PATTERN = re.compile(r'\bNOW\(\)', re.IGNORECASE)
+_FOR_UPDATE_PATTERN = re.compile(r'\s+FOR\s+UPDATE\b', re.IGNORECASE)
+_ON_DUPLICATE_PATTERN = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.IGNORECASE)
+_VALUES_FUNCTION_PATTERN = re.compile(r'\bVALUES\((\w+)\)', re.IGNORECASE)
+
+
+def translate_query(query: str) -> str:
+    """MySQL 構文を SQLite 構文に変換"""
+    query = _PLACEHOLDER_PATTERN.sub('?', query)
+    query = _NOW_PATTERN.sub('CURRENT_TIMESTAMP', query)
+    query = _FOR_UPDATE_PATTERN.sub('', query)
+
+    match = _ON_DUPLICATE_PATTERN.search(query)
+    if match:
+        # 衝突対象は省略（SQLite 3.35 以降、テーブルの一意制約すべてが対象）
+        update_clause = _VALUES_FUNCTION_PATTERN.sub(r'excluded.\1', query[match.end():])
+        query = f"{query[:match.start()]}ON CONFLICT DO UPDATE SET{update_clause}"
+    return query
+
+
+class _LocalCursor:
+    """mysql.connector のカーソル相当（dictionary=True なら行を dict で返す）"""
+
+    def __init__(self, cursor: sqlite3.Cursor, dictionary: bool = False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, query, params=None):
+        self._cursor.execute(translate_query(query), tuple(params or ()))
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(translate_query(query), [tuple(params) for params in seq_of_params])
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return self._convert(row) if row is not None else None
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def _convert(self, row):
+        if not self._dictionary:
+            return tuple(row)
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+
+class LocalDatabaseManager:
+    """SQLite を使う DatabaseManager 互換クラス
+
+    単一コネクションをロックで直列化して使う（':memory:' でもテーブルが共有される）。
+    """
+
+    def __init__(self, path: str = ':memory:', schema: str = LOCAL_SCHEMA):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        if schema:
+            self._connection.executescript(schema)
+
+    @contextmanager
+    def get_connection(self):
+        with self._lock:
+            try:
+                yield self._connection
+            except Exception:
+                self._connection.rollback()
+                raise
+
+    @contextmanager
+    def get_cursor(self, dictionary=False):
+        with self.get_connection() as connection:
+            cursor = _LocalCursor(connection.cursor(), dictionary)
+            try:
+                yield cursor, connection
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self, dictionary=False):
+        """1トランザクションでまとめて実行（正常終了でコミット、例外時はロールバック）"""
+        with self.get_connection() as connection:
+            cursor = _LocalCursor(connection.cursor(), dictionary)
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def execute_query(self, query, params=None, fetch=False, dictionary=False):
+        with self.get_cursor(dictionary=dictionary) as (cursor, connection):
+            cursor.execute(query, params)
+            if fetch and cursor.description is not None:
+                return cursor.fetchall()
+            connection.commit()
+            return cursor.rowcount
+
+    def executemany(self, query, seq_of_params, batch_size=1000):
+        seq_of_params = list(seq_of_params)
+        total = 0
+        with self.transaction() as cursor:
+            for start in range(0, len(seq_of_params), batch_size):
+                cursor.executemany(query, seq_of_params[start:start + batch_size])
+                total += max(cursor.rowcount, 0)
+        return total
+
+    def get_pool_stats(self):
+        return {'pool_size': 1, 'in_use': 0, 'checkouts': 0, 'timeouts': 0}
+
+    def test_connection(self):
+        return self.health_check()
+
+    def health_check(self):
+        try:
+            return len(self.execute_query("SELECT 1 as status", fetch=True)) > 0
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
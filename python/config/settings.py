@@ -19,6 +19,15 @@ class BaseConfig:
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'mercurypass')
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'mercury')
     MYSQL_CHARSET = 'utf8mb4'
+    MYSQL_ALLOW_LOCAL_INFILE = os.getenv('MYSQL_ALLOW_LOCAL_INFILE', 'false').lower() == 'true'  # LOAD DATA LOCAL INFILE
+    
+    # コネクションプール設定（プロセスごと。Webワーカー・ジョブワーカーはそれぞれ独自のプールを持つ）
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))                    # 常時保持する接続数（最大32）
+    DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '10'))    # プール枯渇時に追加で開く接続数
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))            # 接続待ちの上限秒数
+    DB_POOL_RESET_SESSION = os.getenv('DB_POOL_RESET_SESSION', 'false').lower() == 'true'  # 返却時のセッションリセット
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '64'))  # 接続ごとのプリペアドステートメント数（0で無効）
+    DB_EXECUTEMANY_BATCH_SIZE = int(os.getenv('DB_EXECUTEMANY_BATCH_SIZE', '1000'))
     
     # Claude API設定
     CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
@@ -31,6 +40,8 @@ class BaseConfig:
     # ファイル設定
     UPLOAD_FOLDER = '/app/uploads'
     RESULTS_FOLDER = '/app/results'
+    RESULT_RETENTION_SECONDS = int(os.getenv('RESULT_RETENTION_SECONDS', str(7 * 24 * 3600)))  # 結果ディレクトリの保持秒数（0で無期限）
+    RESULT_SWEEP_INTERVAL = int(os.getenv('RESULT_SWEEP_INTERVAL', '3600'))  # 期限切れ結果を削除する間隔（秒）
     LOGS_FOLDER = '/app/logs'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     
@@ -47,6 +58,28 @@ class BaseConfig:
     FIELD_CONSISTENCY_THRESHOLD = 0.6
     MIN_SAMPLE_COUNT = 3
     
+    # カスケードマッチング設定（この範囲のスコアのみAIで再判定）
+    CASCADE_LOWER_THRESHOLD = float(os.getenv('CASCADE_LOWER_THRESHOLD', '0.5'))
+    CASCADE_UPPER_THRESHOLD = float(os.getenv('CASCADE_UPPER_THRESHOLD', '0.85'))
+    
+    # ジョブ設定
+    JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', '2'))          # 同時実行数（ワーカープロセス数）
+    JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '8'))            # 実行待ちキューの上限
+    JOB_START_METHOD = os.getenv('JOB_START_METHOD', 'spawn')         # multiprocessing の起動方式
+    JOB_RETRY_AFTER = int(os.getenv('JOB_RETRY_AFTER', '30'))         # 混雑時の Retry-After 秒数
+    JOB_SYNC_TIMEOUT = int(os.getenv('JOB_SYNC_TIMEOUT', '600'))      # 同期分析の待機上限秒数
+    JOB_SHUTDOWN_GRACE = int(os.getenv('JOB_SHUTDOWN_GRACE', '20'))   # Webワーカー終了時に実行中ジョブを待つ秒数
+    JOB_PROGRESS_DB_INTERVAL = float(os.getenv('JOB_PROGRESS_DB_INTERVAL', '2.0'))  # 進捗のDB反映間隔（秒）
+    JOB_STALE_TIMEOUT = int(os.getenv('JOB_STALE_TIMEOUT', '900'))    # 実行中のまま更新がない場合に停止とみなす秒数
+    JOB_EVENTS_MAX_DURATION = int(os.getenv('JOB_EVENTS_MAX_DURATION', '300'))  # 進捗SSE 1接続の最大秒数
+    JOB_EVENTS_RETRY_MS = int(os.getenv('JOB_EVENTS_RETRY_MS', '3000'))  # 進捗SSE 再接続までの待機ミリ秒
+    MATCH_RESULT_PERSIST = os.getenv('MATCH_RESULT_PERSIST', 'true').lower() == 'true'  # マッチ結果をDBへ保存
+    MATCH_RESULT_BATCH_SIZE = int(os.getenv('MATCH_RESULT_BATCH_SIZE', '5000'))        # 複数行 INSERT 1文あたりの行数
+    MATCH_RESULT_LOAD_DATA = os.getenv('MATCH_RESULT_LOAD_DATA', 'false').lower() == 'true'  # LOAD DATA LOCAL INFILE を使う
+    DEFAULT_CATEGORY2_ID = int(os.getenv('DEFAULT_CATEGORY2_ID', '255'))
+    DEFAULT_COMPANY_A_CODE = os.getenv('DEFAULT_COMPANY_A_CODE', 'A')
+    DEFAULT_COMPANY_B_CODE = os.getenv('DEFAULT_COMPANY_B_CODE', 'B')
+    
     # ログ設定
     LOG_LEVEL = 'INFO'
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -137,7 +170,21 @@ class Config:
             'user': config_class.MYSQL_USER,
             'password': config_class.MYSQL_PASSWORD,
             'database': config_class.MYSQL_DATABASE,
-            'charset': config_class.MYSQL_CHARSET
+            'charset': config_class.MYSQL_CHARSET,
+            'allow_local_infile': config_class.MYSQL_ALLOW_LOCAL_INFILE
+        }
+    
+    @classmethod
+    def get_database_pool_config(cls, config_name='default'):
+        """コネクションプール設定を辞書で取得"""
+        config_class = cls.get_config(config_name)
+        return {
+            'pool_size': config_class.DB_POOL_SIZE,
+            'max_overflow': config_class.DB_POOL_MAX_OVERFLOW,
+            'timeout': config_class.DB_POOL_TIMEOUT,
+            'reset_session': config_class.DB_POOL_RESET_SESSION,
+            'statement_cache_size': config_class.DB_STATEMENT_CACHE_SIZE,
+            'executemany_batch_size': config_class.DB_EXECUTEMANY_BATCH_SIZE
         }
     
     @classmethod
@@ -166,5 +213,7 @@ class Config:
             'price_similarity_threshold': config_class.PRICE_SIMILARITY_THRESHOLD,
             'field_similarity_threshold': config_class.FIELD_SIMILARITY_THRESHOLD,
             'field_consistency_threshold': config_class.FIELD_CONSISTENCY_THRESHOLD,
-            'min_sample_count': config_class.MIN_SAMPLE_COUNT
+            'min_sample_count': config_class.MIN_SAMPLE_COUNT,
+            'cascade_lower_threshold': config_class.CASCADE_LOWER_THRESHOLD,
+            'cascade_upper_threshold': config_class.CASCADE_UPPER_THRESHOLD
         }
\ No newline at end of file
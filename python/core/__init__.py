@@ -31,6 +31,11 @@ DEFAULT_CONFIG = {
     'card_name_similarity_threshold': 0.8,
     'price_similarity_threshold': 0.9,
     
+    # カスケードマッチング設定（ライブラリで判定できない範囲のみAIへ）
+    'cascade_lower_threshold': 0.5,
+    'cascade_upper_threshold': 0.85,
+    'cascade_ai_batch_size': 10,
+    
     # フィールドマッピング設定
     'field_similarity_threshold': 0.7,
     'field_consistency_threshold': 0.6,
@@ -38,9 +43,17 @@ DEFAULT_CONFIG = {
 }
 
 def create_mapping_engine(config=None):
-    """ファクトリー関数: 設定付きでMappingEngineを作成"""
+    """ファクトリー関数: 設定付きでMappingEngineを作成
+
+    新しいインスタンスが必要な場合のみ使う（通常は get_mapping_engine で共有エンジンを取得）。
+    """
     final_config = DEFAULT_CONFIG.copy()
     if config:
         final_config.update(config)
     
-    return MappingEngine(final_config)
\ No newline at end of file
+    return MappingEngine(final_config)
+
+
+from .engine_registry import EngineRegistry, get_engine_registry, get_mapping_engine, config_fingerprint
+
+__all__ += ['EngineRegistry', 'get_engine_registry', 'get_mapping_engine', 'config_fingerprint']
@@ -3,24 +3,39 @@ Mercury Mapping Engine - Card Matcher
 カードマッチングエンジン
 """
 import re
-from typing import Dict, List, Tuple, Any, Optional
+from typing import Callable, Dict, List, Tuple, Any, Optional
 from utils.text_similarity import TextSimilarity
 from utils.logger import analysis_logger, performance_logger
+from utils.metrics import CANDIDATE_PAIRS
+
+
+# 比較ごとに使う正規表現は事前にコンパイル
+_NON_NUMERIC_PATTERN = re.compile(r'[^\d.,]')
+_NON_WORD_PATTERN = re.compile(r'[^\w]')
+
+# AI類似度分析の1プロンプトあたりのペア数上限（多いとJSONエラーが増える）
+AI_PROMPT_MAX_PAIRS = 10
 
 
 class CardMatcher:
     """カードマッチング専用クラス"""
 
-    def __init__(self, config=None):
+    def __init__(self, config=None, text_similarity: Optional[TextSimilarity] = None):
         self.config = config or {}
         self.match_threshold = self.config.get('card_match_threshold', 0.75)
         self.name_similarity_threshold = self.config.get('card_name_similarity_threshold', 0.8)
         self.price_similarity_threshold = self.config.get('price_similarity_threshold', 0.9)
-        self.text_similarity = TextSimilarity()
-
-    def find_matching_cards(self, data_a, data_b, headers_a, headers_b):
+        # カスケードモード: この範囲のスコアのみAIに判定を委ねる
+        self.cascade_lower_threshold = self.config.get('cascade_lower_threshold', 0.5)
+        self.cascade_upper_threshold = self.config.get('cascade_upper_threshold', 0.85)
+        # 1プロンプトで判定できるペア数に収める（超えた分が問い合わせられずに失われないように）
+        batch_size = int(self.config.get('cascade_ai_batch_size', AI_PROMPT_MAX_PAIRS))
+        self.cascade_ai_batch_size = max(1, min(batch_size, AI_PROMPT_MAX_PAIRS))
+        self.text_similarity = text_similarity or TextSimilarity()
+
+    def find_matching_cards(self, data_a, data_b, headers_a, headers_b, **kwargs):
         """新生代マッチング - 力技のみ"""
-        return self.brute_force_matching(data_a, data_b, headers_a, headers_b)
+        return self.brute_force_matching(data_a, data_b, headers_a, headers_b, **kwargs)
 
     def identify_card_name_fields(self, headers: List[str]) -> List[str]:
         """カード名と思われるフィールドを特定"""
@@ -168,7 +183,7 @@ class CardMatcher:
             return None
 
         # 数字とピリオド、カンマのみ抽出
-        numeric_str = re.sub(r'[^\d.,]', '', str(value_str))
+        numeric_str = _NON_NUMERIC_PATTERN.sub('', str(value_str))
         numeric_str = numeric_str.replace(',', '')
 
         try:
@@ -229,11 +244,14 @@ class CardMatcher:
             'low_quality_matches': low_quality
         }
 
+    @performance_logger.timed('brute_force_matching')
     def brute_force_matching(self, data_a: List[Dict], data_b: List[Dict],
                              headers_a: List[str], headers_b: List[str],
                              max_sample_size: int = 100,
-                             similarity_mode: str = 'library',  # 'library' or 'ai'
-                             ai_manager=None) -> List[Dict[str, Any]]:
+                             similarity_mode: str = 'library',  # 'library', 'ai' or 'cascade'
+                             ai_manager=None,
+                             tier_stats: Optional[Dict[str, int]] = None,
+                             progress_callback: Optional[Callable[[int, int, int], None]] = None) -> List[Dict[str, Any]]:
         """
         ハイブリッド力技マッチング: ライブラリ vs AI で類似度計算を切り替え
 
@@ -243,19 +261,26 @@ class CardMatcher:
             headers_a: A社ヘッダー
             headers_b: B社ヘッダー
             max_sample_size: 最大サンプルサイズ
-            similarity_mode: 'library' (Python libs) or 'ai' (Claude API)
-            ai_manager: AI Manager instance (similarity_mode='ai'時に必要)
+            similarity_mode: 'library' (Python libs), 'ai' (Claude API),
+                             'cascade' (ライブラリで判定できない曖昧なペアのみClaude API)
+            ai_manager: AI Manager instance (similarity_mode='ai'/'cascade'時に必要)
+            tier_stats: カスケード各段で解決したペア数の集計先（省略時は内部で作成）
+            progress_callback: A社1行ごとに (処理済み行数, 総行数, 比較済みペア数) で呼び出す
 
         Returns:
             高精度マッチング結果
         """
-        performance_logger.start_timer('brute_force_matching')
-
         mode_info = {
             'library': '🐍 Python Library Mode - 高速・安価',
-            'ai': '🤖 Claude AI Mode - 高精度・意味理解'
+            'ai': '🤖 Claude AI Mode - 高精度・意味理解',
+            'cascade': '🪜 Cascade Mode - ライブラリ判定 + 曖昧ペアのみAI'
         }
 
+        if tier_stats is None:
+            tier_stats = {}
+        tier_stats.update(self._new_tier_stats())
+        ai_cache = {}
+
         analysis_logger.logger.info(f"🔥 Brute Force Matching 開始 - {mode_info.get(similarity_mode, similarity_mode)}")
 
         # サンプリング
@@ -281,6 +306,10 @@ class CardMatcher:
                     field_match_results = self._compare_all_fields_ai(
                         row_a, row_b, headers_a, headers_b, ai_manager
                     )
+                elif similarity_mode == 'cascade':
+                    field_match_results = self._compare_all_fields_cascade(
+                        row_a, row_b, headers_a, headers_b, ai_manager, tier_stats, ai_cache
+                    )
                 else:
                     raise ValueError(f"Unknown similarity_mode: {similarity_mode}")
 
@@ -314,6 +343,9 @@ class CardMatcher:
                 best_match = max(best_matches, key=lambda x: x['match_score'])
                 matches.append(best_match)
 
+            if progress_callback:
+                progress_callback(i + 1, len(sample_a), (i + 1) * len(sample_b))
+
         # 重複除去
         unique_matches = self._remove_duplicate_matches_brute_force(matches)
 
@@ -322,13 +354,27 @@ class CardMatcher:
 
         analysis_logger.logger.info(f"🎯 Brute Force結果: {len(unique_matches)}件のマッチ")
         analysis_logger.logger.info(f"📈 発見されたフィールド対応: {len(field_mapping_stats)}組")
+        if similarity_mode == 'cascade':
+            analysis_logger.logger.info(
+                f"🪜 カスケード内訳: ライブラリ確定 {tier_stats['library_accepted']}件 / "
+                f"ライブラリ棄却 {tier_stats['library_rejected']}件 / "
+                f"AI判定 {tier_stats['ai_resolved']}件 (API呼び出し {tier_stats['ai_calls']}回)"
+            )
 
         # 結果にモード情報とフィールドマッピング情報を追加
         for match in unique_matches:
             match['discovered_field_mappings'] = field_mapping_stats
             match['analysis_mode'] = similarity_mode
-
-        performance_logger.end_timer('brute_force_matching')
+            if similarity_mode == 'cascade':
+                match['tier_stats'] = tier_stats
+
+        pairs = len(sample_a) * len(sample_b)
+        CANDIDATE_PAIRS.inc(pairs, matcher=f"brute_force_{similarity_mode}", phase='generated')
+        CANDIDATE_PAIRS.inc(pairs, matcher=f"brute_force_{similarity_mode}", phase='scored')
+        performance_logger.set_attributes(
+            mode=similarity_mode, comparisons=pairs, matches=len(unique_matches),
+            ai_calls=tier_stats.get('ai_calls', 0)
+        )
         return unique_matches
 
     def _compare_all_fields_library(self, row_a: Dict, row_b: Dict,
@@ -398,7 +444,8 @@ class CardMatcher:
             ai_results = self._batch_ai_similarity_analysis(field_pairs, ai_manager)
 
             for i, pair in enumerate(field_pairs):
-                ai_result = ai_results.get(i, {})
+                # パース結果のキーは文字列インデックス
+                ai_result = ai_results.get(str(i)) or ai_results.get(i) or {}
                 similarity = ai_result.get('similarity', 0.0)
 
                 if similarity > 0.5:
@@ -416,17 +463,129 @@ class CardMatcher:
 
         return field_matches
 
+    def _compare_all_fields_cascade(self, row_a: Dict, row_b: Dict,
+                                    headers_a: List[str], headers_b: List[str],
+                                    ai_manager, tier_stats: Dict[str, int],
+                                    ai_cache: Dict[Tuple[str, str, str, str], Dict]) -> List[Dict]:
+        """🪜 カスケード比較: ライブラリで判定し、不確実帯のペアのみAIで再判定"""
+        field_matches = []
+        ambiguous = []
+
+        for field_a in headers_a:
+            value_a = str(row_a.get(field_a, '')).strip()
+            if not value_a or len(value_a) < 2:
+                continue
+
+            for field_b in headers_b:
+                value_b = str(row_b.get(field_b, '')).strip()
+                if not value_b or len(value_b) < 2:
+                    continue
+
+                similarities = self._calculate_comprehensive_similarity(value_a, value_b)
+                max_similarity = max(similarities.values())
+                library_match = {
+                    'field_a': field_a,
+                    'field_b': field_b,
+                    'value_a': value_a,
+                    'value_b': value_b,
+                    'similarity': max_similarity,
+                    'similarity_details': similarities,
+                    'match_type': self._classify_match_type(value_a, value_b, similarities),
+                    'calculation_method': 'library',
+                    'resolved_tier': 'library'
+                }
+
+                if max_similarity >= self.cascade_upper_threshold:
+                    # 明らかな一致: ライブラリで確定
+                    tier_stats['library_accepted'] += 1
+                    field_matches.append(library_match)
+                elif max_similarity < self.cascade_lower_threshold:
+                    # 明らかな不一致: ライブラリで棄却
+                    tier_stats['library_rejected'] += 1
+                else:
+                    ambiguous.append(library_match)
+
+        if not ambiguous:
+            return field_matches
+
+        if not ai_manager:
+            # AIが使えない場合はライブラリモードと同じ判定に倒す
+            tier_stats['ai_fallback'] += len(ambiguous)
+            field_matches.extend(m for m in ambiguous if m['similarity'] > 0.5)
+            return field_matches
+
+        # 同一ペアの再問い合わせを避ける
+        pending = []
+        for pair in ambiguous:
+            cache_key = (pair['field_a'], pair['field_b'], pair['value_a'], pair['value_b'])
+            if cache_key in ai_cache:
+                tier_stats['ai_cache_hits'] += 1
+            else:
+                pending.append(pair)
+
+        # プロンプトは最大10ペアまでなのでチャンク単位で問い合わせる
+        for start in range(0, len(pending), self.cascade_ai_batch_size):
+            chunk = pending[start:start + self.cascade_ai_batch_size]
+            tier_stats['ai_calls'] += 1
+            ai_results = self._batch_ai_similarity_analysis(chunk, ai_manager)
+            for i, pair in enumerate(chunk):
+                cache_key = (pair['field_a'], pair['field_b'], pair['value_a'], pair['value_b'])
+                ai_cache[cache_key] = ai_results.get(str(i)) or ai_results.get(i) or {}
+
+        for pair in ambiguous:
+            cache_key = (pair['field_a'], pair['field_b'], pair['value_a'], pair['value_b'])
+            ai_result = ai_cache.get(cache_key) or {}
+
+            if 'similarity' not in ai_result:
+                # AI判定に失敗したペアはライブラリ結果を採用
+                tier_stats['ai_fallback'] += 1
+                if pair['similarity'] > 0.5:
+                    field_matches.append(pair)
+                continue
+
+            tier_stats['ai_resolved'] += 1
+            try:
+                similarity = float(ai_result.get('similarity', 0.0))
+            except (TypeError, ValueError):
+                similarity = 0.0
+
+            if similarity > 0.5:
+                field_matches.append({
+                    'field_a': pair['field_a'],
+                    'field_b': pair['field_b'],
+                    'value_a': pair['value_a'],
+                    'value_b': pair['value_b'],
+                    'similarity': similarity,
+                    'library_similarity': pair['similarity'],
+                    'ai_reasoning': ai_result.get('reasoning', ''),
+                    'match_type': ai_result.get('match_type', 'ai_determined'),
+                    'calculation_method': 'ai',
+                    'resolved_tier': 'ai',
+                    'ai_confidence': ai_result.get('confidence', similarity)
+                })
+
+        return field_matches
+
+    @staticmethod
+    def _new_tier_stats() -> Dict[str, int]:
+        """カスケード段別の集計カウンタを初期化"""
+        return {
+            'library_accepted': 0,
+            'library_rejected': 0,
+            'ai_resolved': 0,
+            'ai_fallback': 0,
+            'ai_cache_hits': 0,
+            'ai_calls': 0
+        }
+
     def _batch_ai_similarity_analysis(self, field_pairs: List[Dict], ai_manager) -> Dict:
         """バッチでAI類似度分析実行"""
         try:
             # プロンプト構築
             prompt = self._build_similarity_analysis_prompt(field_pairs)
 
-            # Claude API呼び出し
-            result = ai_manager.claude_client.call_api(
-                prompt,
-                model='claude-3-haiku-20240307'  # 高速モデルで効率化
-            )
+            # Claude API呼び出し（モデルは呼び出し元が ai_model で指定したクライアントの既定モデル）
+            result = ai_manager.claude_client.call_api(prompt)
 
             if result['success']:
                 # JSONレスポンスをパース
@@ -442,7 +601,7 @@ class CardMatcher:
     def _build_similarity_analysis_prompt(self, field_pairs: List[Dict]) -> str:
             """AI類似度分析用プロンプト構築（JSON形式改善）"""
             pairs_text = ""
-            for i, pair in enumerate(field_pairs[:10]):  # 10ペアに制限してJSONエラーを減らす
+            for i, pair in enumerate(field_pairs[:AI_PROMPT_MAX_PAIRS]):  # ペア数を制限してJSONエラーを減らす
                 pairs_text += f"""
     {i}: "{pair['field_a']}" vs "{pair['field_b']}"
         値: "{pair['value_a']}" vs "{pair['value_b']}"
@@ -555,8 +714,8 @@ class CardMatcher:
                     similarities['numeric_close'] = max(0, 1.0 - diff_ratio)
 
             # 3. 正規化類似度（大文字小文字、記号無視）
-            normalized_a = re.sub(r'[^\w]', '', value_a.lower())
-            normalized_b = re.sub(r'[^\w]', '', value_b.lower())
+            normalized_a = _NON_WORD_PATTERN.sub('', value_a.lower())
+            normalized_b = _NON_WORD_PATTERN.sub('', value_b.lower())
             if normalized_a and normalized_b:
                 similarities['normalized'] = self.text_similarity.calculate_fuzzy_similarity(
                     normalized_a, normalized_b
@@ -0,0 +1,253 @@
+"""
+Mercury Mapping Engine - Claude Mapping
+Claude APIによるフィールドマッピング推定とマッピングベースのカード特定
+"""
+import json
+import os
+import re
+import time
+from ai.claude_client import ClaudeClient
+from utils.logger import analysis_logger, performance_logger
+from utils.metrics import CANDIDATE_PAIRS
+
+
+@performance_logger.timed('claude_field_mapping')
+def claude_field_mapping_analysis(headers_a, headers_b, sample_data_a, sample_data_b, model_name='claude-sonnet-4-20250514',
+                                   on_mapping=None):
+    """Claude APIを使ってフィールドマッピングを分析（受信したマッピングを on_mapping へ逐次通知）"""
+    try:
+        # Claude API設定
+        api_key = os.environ.get('CLAUDE_API_KEY')
+        if not api_key:
+            analysis_logger.logger.error("CLAUDE_API_KEY環境変数が設定されていません")
+            return []
+        
+        # CSVサンプルデータを準備
+        csv_sample_a = format_csv_sample(headers_a, sample_data_a[:5])
+        csv_sample_b = format_csv_sample(headers_b, sample_data_b[:5])
+        
+        # Claude APIプロンプト
+        prompt = f"""この2つのCSVファイルを比較して、A社とB社の対応するフィールドペアを特定してください。信頼度も含めて教えてください。
+
+A社のCSV:
+```
+{csv_sample_a}
+```
+
+B社のCSV:
+```
+{csv_sample_b}
+```
+
+以下のJSON形式で回答してください：
+{{
+    "field_mappings": [
+        {{
+            "field_a": "A社フィールド名",
+            "field_b": "B社フィールド名", 
+            "confidence": 0.95,
+            "reasoning": "判断理由"
+        }}
+    ]
+}}
+
+完全一致、概念的一致、形式的一致を含めて判断してください。"""
+
+        client = ClaudeClient(api_key, {'timeout': 60, 'max_retries': 2, 'retry_backoff': 5.0})
+
+        analysis_logger.logger.info("🤖 Claude APIでフィールドマッピング分析開始（ストリーミング）...")
+        analysis_logger.logger.info(f"   - リクエストURL: {client.base_url}/messages")
+        analysis_logger.logger.info(f"   - モデル: {model_name}")
+        analysis_logger.logger.info(f"   - プロンプト長: {len(prompt)}文字")
+        analysis_logger.logger.info("   - リクエストデータ:")
+        analysis_logger.logger.info(f"     プロンプト: {prompt[:200]}...")
+
+        enhanced_mappings = []
+        seen_pairs = set()
+
+        def _to_enhanced_mapping(mapping):
+            """enhanced.py形式に変換"""
+            return {
+                'field_a': mapping['field_a'],
+                'field_b': mapping['field_b'],
+                'confidence': mapping['confidence'],
+                'sample_count': len(sample_data_a),
+                'total_comparisons': len(sample_data_a),
+                'field_type': 'claude_api_analysis',
+                'quality_score': 'Claude_AI',
+                'reasoning': mapping.get('reasoning', '')
+            }
+
+        def _handle_streamed_item(key, item):
+            """field_mappings の要素が届いた時点で即座に後続処理へ渡す"""
+            if key != 'field_mappings' or not isinstance(item, dict):
+                return
+            if 'field_a' not in item or 'field_b' not in item or 'confidence' not in item:
+                return
+            pair = (item['field_a'], item['field_b'])
+            if pair in seen_pairs:  # 重複を除外
+                return
+            seen_pairs.add(pair)
+
+            mapping = _to_enhanced_mapping(item)
+            enhanced_mappings.append(mapping)
+            analysis_logger.logger.info(f"     受信マッピング{len(enhanced_mappings)}: {mapping['field_a']} -> {mapping['field_b']} (信頼度: {mapping['confidence']})")
+            if on_mapping:
+                on_mapping(mapping)
+
+        # Claude API呼び出し（429/529/5xx・タイムアウトはクライアント側でバックオフ付きリトライ）
+        result = client.call_api_stream(prompt, model_name, max_tokens=4000, on_item=_handle_streamed_item)
+        analysis_logger.logger.info(f"   - レスポンス状態: {200 if result['success'] else result.get('status_code')} (リトライ {result.get('retries', 0)}回)")
+
+        if result.get('success'):
+            content = result['content']
+
+            analysis_logger.logger.info("   - Claude APIレスポンス受信成功")
+            analysis_logger.logger.info(f"     レスポンス長: {len(content)}文字 (初回トークン: {result.get('first_token_ms')}ms)")
+            analysis_logger.logger.info(f"     レスポンス内容: {content[:500]}...")
+
+            if not enhanced_mappings:
+                # ストリーム中に要素を取り出せなかった場合は全文からJSONを抽出
+                json_match = re.search(r'\{.*\}', content, re.DOTALL)
+                if not json_match:
+                    analysis_logger.logger.error("Claude APIレスポンスからJSONを抽出できませんでした")
+                    analysis_logger.logger.error(f"     レスポンス全文: {content}")
+                    return []
+                analysis_logger.logger.info(f"     JSON抽出成功: {len(json_match.group())}文字")
+                mapping_data = json.loads(json_match.group())
+                for mapping in mapping_data.get('field_mappings', []):
+                    _handle_streamed_item('field_mappings', mapping)
+
+            analysis_logger.logger.info(f"✅ Claude APIマッピング完了: {len(enhanced_mappings)}件")
+            return enhanced_mappings
+        else:
+            status_code = result.get('status_code')
+            analysis_logger.logger.error(f"Claude API呼び出し失敗: {status_code}")
+            analysis_logger.logger.error(f"     エラーレスポンス: {result.get('error')}")
+
+            # 高コストモデルで過負荷の場合、軽量モデルでリトライ
+            if status_code == 529 and model_name in ['claude-sonnet-4-20250514', 'claude-3-5-sonnet-20241022', 'claude-3-opus-20240229']:
+                analysis_logger.logger.info("   - 軽量モデル(Haiku)でフォールバック試行...")
+                fallback = claude_field_mapping_analysis(headers_a, headers_b, sample_data_a, sample_data_b,
+                                                          'claude-3-5-haiku-20241022', on_mapping=on_mapping)
+                return enhanced_mappings + [m for m in fallback if (m['field_a'], m['field_b']) not in seen_pairs]
+
+            return enhanced_mappings
+
+    except Exception as e:
+        analysis_logger.logger.error(f"Claude APIマッピング分析エラー: {str(e)}")
+        return []
+
+def format_csv_sample(headers, sample_data):
+    """CSVサンプルデータを文字列形式にフォーマット"""
+    lines = [','.join(headers)]
+    for row in sample_data:
+        values = [str(row.get(header, '')).replace(',', ';') for header in headers]
+        lines.append(','.join(values))
+    return '\n'.join(lines)
+
+def prepare_mapping_columns(mapping, data_a, data_b, max_sample_size, normalized_columns):
+    """高信頼度マッピングの照合カラムを正規化して保持（ストリーム受信中に実行）"""
+    if mapping.get('confidence', 0) <= 0.8:
+        return
+
+    if max_sample_size and max_sample_size > 0:
+        data_a = data_a[:max_sample_size]
+        data_b = data_b[:max_sample_size]
+
+    for side, field, data in (('a', mapping['field_a'], data_a), ('b', mapping['field_b'], data_b)):
+        if (side, field) not in normalized_columns:
+            normalized_columns[(side, field)] = [str(row.get(field, '')).strip().lower() for row in data]
+
+@performance_logger.timed('claude_mapping_matching')
+def match_cards_with_claude_mappings(data_a, data_b, claude_mappings, max_sample_size, normalized_columns=None,
+                                     progress_callback=None):
+    """Claudeマッピングを使って同一カード特定
+
+    progress_callback: A社1行ごとに (処理済み行数, 総行数, 比較済みペア数) で呼び出す
+    """
+    start_time = time.time()
+    
+    # データサイズ制限（無制限の場合はスキップ）
+    if max_sample_size and max_sample_size > 0:
+        if len(data_a) > max_sample_size:
+            data_a = data_a[:max_sample_size]
+        if len(data_b) > max_sample_size:
+            data_b = data_b[:max_sample_size]
+    
+    analysis_logger.logger.info(f"🔍 Claudeマッピングベースカード特定開始: {len(data_a)}×{len(data_b)}行")
+    
+    # 高信頼度マッピングのみを使用（confidence > 0.8）
+    reliable_mappings = {}
+    for mapping in claude_mappings:
+        if mapping.get('confidence', 0) > 0.8:
+            reliable_mappings[mapping['field_a']] = mapping['field_b']
+    
+    analysis_logger.logger.info(f"📝 使用する高信頼度マッピング: {len(reliable_mappings)}件")
+    
+    # 正規化済みカラム（ストリーム受信中に作成済みのものは再利用）
+    normalized_columns = normalized_columns if normalized_columns is not None else {}
+    prepared = sum(1 for field_a, field_b in reliable_mappings.items()
+                   if ('a', field_a) in normalized_columns and ('b', field_b) in normalized_columns)
+    for field_a, field_b in reliable_mappings.items():
+        prepare_mapping_columns({'field_a': field_a, 'field_b': field_b, 'confidence': 1.0},
+                                 data_a, data_b, 0, normalized_columns)
+    analysis_logger.logger.info(f"   - 事前正規化済みカラム: {prepared}/{len(reliable_mappings)}組")
+    
+    column_pairs = [
+        (normalized_columns[('a', field_a)], normalized_columns[('b', field_b)])
+        for field_a, field_b in reliable_mappings.items()
+    ]
+    
+    matches = []
+    scored_pairs = 0
+    for i, card_a in enumerate(data_a):
+        best_match = None
+        best_index = -1
+        best_score = 0.0
+        
+        for j, card_b in enumerate(data_b):
+            score = 0.0
+            matched_fields = 0
+            
+            # 高信頼度マッピングでスコア計算
+            for values_a, values_b in column_pairs:
+                val_a = values_a[i]
+                val_b = values_b[j]
+                
+                if val_a and val_b and val_a != 'n/a':
+                    matched_fields += 1
+                    if val_a == val_b:
+                        score += 1.0  # 完全一致
+                    elif val_a in val_b or val_b in val_a:
+                        score += 0.7  # 部分一致
+            
+            # 正規化スコア
+            if matched_fields > 0:
+                scored_pairs += 1
+                normalized_score = score / matched_fields
+                if normalized_score > best_score and normalized_score >= 0.7:  # 70%以上の一致
+                    best_score = normalized_score
+                    best_match = card_b
+                    best_index = j
+        
+        if best_match:
+            matches.append({
+                'card_a': card_a,
+                'card_b': best_match,
+                'row_a_index': i,
+                'row_b_index': best_index,
+                'overall_similarity': round(best_score, 3),
+                'similarity_details': {}
+            })
+        
+        if progress_callback:
+            progress_callback(i + 1, len(data_a), (i + 1) * len(data_b))
+    
+    elapsed_time = time.time() - start_time
+    analysis_logger.logger.info(f"✅ Claudeマッピングベース特定完了: {len(matches)}組 ({elapsed_time:.2f}秒)")
+    CANDIDATE_PAIRS.inc(len(data_a) * len(data_b), matcher='claude_mapping', phase='generated')
+    CANDIDATE_PAIRS.inc(scored_pairs, matcher='claude_mapping', phase='scored')
+    performance_logger.set_attributes(comparisons=scored_pairs, matches=len(matches))
+    
+    return matches
@@ -4,8 +4,73 @@ CSV解析エンジン
 """
 import csv
 import io
+import os
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any
 from utils.logger import analysis_logger, performance_logger
+from utils.metrics import ROWS_PROCESSED
+from utils.upload_store import hash_from_path
+
+
+class ParsedCSVCache:
+    """パース済みCSVのLRUキャッシュ（プロセス内）
+
+    キーはファイル内容のハッシュ（アップロード保存領域のファイル名）、
+    それ以外のファイルは (実パス, 更新時刻, サイズ) とパース条件の組み合わせ。
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_key(filepath: str) -> tuple:
+        content_hash = hash_from_path(filepath)
+        if content_hash:
+            return ('sha256', content_hash)
+        stat = os.stat(filepath)
+        return ('file', os.path.realpath(filepath), stat.st_mtime_ns, stat.st_size)
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # 呼び出し側でのキー追加がキャッシュに残らないよう浅いコピーを返す
+        return dict(result)
+
+    def put(self, key: tuple, result: Dict[str, Any]):
+        if self.max_entries <= 0 or 'error' in result:
+            return
+        with self._lock:
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# ワーカープロセスごとに共有するキャッシュ
+_parsed_csv_cache = ParsedCSVCache(int(os.getenv('CSV_PARSE_CACHE_SIZE', '8')))
+
+
+def get_parsed_csv_cache() -> ParsedCSVCache:
+    return _parsed_csv_cache
 
 
 class CSVAnalyzer:
@@ -16,9 +81,31 @@ class CSVAnalyzer:
         self.max_rows = self.config.get('csv_max_rows', 1000)
         self.sample_rows = self.config.get('csv_sample_rows', 5)
         self.encoding = self.config.get('csv_encoding', 'utf-8')
+        self.cache = _parsed_csv_cache if self.config.get('csv_parse_cache', True) else None
+
+    def _cached(self, method: str, filepath: str, parse, *params) -> Dict[str, Any]:
+        """パース結果をキャッシュ経由で取得"""
+        if self.cache is None:
+            return parse()
+        try:
+            key = (method, ParsedCSVCache.file_key(filepath), self.encoding, self.sample_rows) + params
+        except OSError:
+            return parse()
+
+        result = self.cache.get(key)
+        if result is not None:
+            analysis_logger.logger.info(f"♻️ CSV parse cache hit: {filepath}")
+            return result
+
+        result = parse()
+        self.cache.put(key, result)
+        return result
 
     def analyze_file(self, filepath: str) -> Dict[str, Any]:
-        """CSVファイルを分析（BOM対応）"""
+        """CSVファイルを分析（BOM対応、パース結果はキャッシュ）"""
+        return self._cached('sample', filepath, lambda: self._analyze_file(filepath))
+
+    def _analyze_file(self, filepath: str) -> Dict[str, Any]:
         try:
             # BOM対応でファイルを読み込み
             with open(filepath, 'r', encoding='utf-8-sig') as file:  # utf-8-sig でBOM自動除去
@@ -85,11 +172,12 @@ class CSVAnalyzer:
             }
 
     def analyze_file_full(self, filepath: str, max_rows: Optional[int] = None) -> Dict[str, Any]:
-        """CSV ファイルを全件分析（行数制限付き）"""
-        performance_logger.start_timer('csv_full_analysis')
-        
+        """CSV ファイルを全件分析（行数制限付き、パース結果はキャッシュ）"""
         max_rows = max_rows or self.max_rows
-        
+        return self._cached('full', filepath, lambda: self._analyze_file_full(filepath, max_rows), max_rows)
+
+    @performance_logger.timed('csv_full_analysis')
+    def _analyze_file_full(self, filepath: str, max_rows: int) -> Dict[str, Any]:
         try:
             with open(filepath, 'r', encoding=self.encoding) as f:
                 content = f.read()
@@ -130,7 +218,8 @@ class CSVAnalyzer:
                 len(headers), 
                 len(all_data)
             )
-            performance_logger.end_timer('csv_full_analysis')
+            performance_logger.set_attributes(rows=len(all_data))
+            ROWS_PROCESSED.inc(len(all_data), stage='csv_parse')
             
             return result
             
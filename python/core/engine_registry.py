@@ -0,0 +1,106 @@
+"""
+Mercury Mapping Engine - Engine Registry
+設定ごとの MappingEngine をプロセス内で使い回すレジストリ
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from utils.logger import analysis_logger
+from .mapping_engine import MappingEngine
+
+
+# 保持するエンジン数の上限（設定の組み合わせが増えても古いものから破棄）
+ENGINE_REGISTRY_SIZE = int(os.getenv('ENGINE_REGISTRY_SIZE', '8'))
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """設定内容から決まるキー（キーの順序に依存しない）"""
+    canonical = json.dumps(config, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class EngineRegistry:
+    """設定フィンガープリント → MappingEngine
+
+    エンジンは類似度のメモ化などのキャッシュを保持したまま、リクエスト・ジョブをまたいで再利用する。
+    ワーカープロセスはそれぞれ独自のレジストリを持つ。
+    """
+
+    def __init__(self, max_engines: int = ENGINE_REGISTRY_SIZE):
+        self.max_engines = max(1, max_engines)
+        self._engines: 'OrderedDict[str, MappingEngine]' = OrderedDict()
+        self._created_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'resets': 0}
+
+    def get(self, config: Optional[Dict[str, Any]] = None) -> MappingEngine:
+        """設定に対応するエンジンを取得（なければ作成）"""
+        from . import DEFAULT_CONFIG
+        final_config = DEFAULT_CONFIG.copy()
+        if config:
+            final_config.update(config)
+        fingerprint = config_fingerprint(final_config)
+
+        with self._lock:
+            engine = self._engines.get(fingerprint)
+            if engine is not None:
+                self._engines.move_to_end(fingerprint)
+                self._stats['hits'] += 1
+                return engine
+
+            self._stats['misses'] += 1
+            engine = MappingEngine(final_config)
+            self._engines[fingerprint] = engine
+            self._created_at[fingerprint] = time.time()
+
+            while len(self._engines) > self.max_engines:
+                evicted, _ = self._engines.popitem(last=False)
+                self._created_at.pop(evicted, None)
+                self._stats['evictions'] += 1
+
+        analysis_logger.logger.info(f"🔧 MappingEngine created: {fingerprint}")
+        return engine
+
+    def reset(self, fingerprint: Optional[str] = None) -> int:
+        """エンジンを破棄（fingerprint 省略時は全て）し、破棄した件数を返す"""
+        with self._lock:
+            if fingerprint is None:
+                removed = len(self._engines)
+                self._engines.clear()
+                self._created_at.clear()
+            else:
+                removed = 1 if self._engines.pop(fingerprint, None) is not None else 0
+                self._created_at.pop(fingerprint, None)
+            self._stats['resets'] += 1
+
+        analysis_logger.logger.info(f"♻️ MappingEngine registry reset: {removed} engine(s)")
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            engines = [
+                {
+                    'fingerprint': fingerprint,
+                    'created_at': self._created_at.get(fingerprint),
+                    'caches': engine.get_cache_stats()
+                }
+                for fingerprint, engine in self._engines.items()
+            ]
+            return {**self._stats, 'size': len(engines), 'max_engines': self.max_engines,
+                    'pid': os.getpid(), 'engines': engines}
+
+
+_engine_registry = EngineRegistry()
+
+
+def get_engine_registry() -> EngineRegistry:
+    return _engine_registry
+
+
+def get_mapping_engine(config: Optional[Dict[str, Any]] = None) -> MappingEngine:
+    """共有エンジンを取得（create_mapping_engine と同じ設定の解釈）"""
+    return _engine_registry.get(config)
@@ -10,18 +10,17 @@ from utils.logger import analysis_logger, performance_logger
 class FieldMapper:
     """フィールドマッピング専用クラス"""
     
-    def __init__(self, config=None):
+    def __init__(self, config=None, text_similarity: Optional[TextSimilarity] = None):
         self.config = config or {}
         self.field_similarity_threshold = self.config.get('field_similarity_threshold', 0.7)
         self.field_consistency_threshold = self.config.get('field_consistency_threshold', 0.6)
         self.min_sample_count = self.config.get('min_sample_count', 3)
-        self.text_similarity = TextSimilarity()
+        self.text_similarity = text_similarity or TextSimilarity()
     
+    @performance_logger.timed('field_mapping_analysis')
     def analyze_field_mappings_from_matches(self, card_matches: List[Dict], 
                                           headers_a: List[str], headers_b: List[str]) -> Dict[Tuple[str, str], Dict[str, Any]]:
         """マッチしたカードからフィールド対応を分析"""
-        performance_logger.start_timer('field_mapping_analysis')
-        
         field_mappings = {}
         
         # 各フィールドペアの対応度を計算
@@ -50,14 +49,15 @@ class FieldMapper:
                         'similarity_details': similarities
                     }
         
-        performance_logger.end_timer('field_mapping_analysis')
+        performance_logger.set_attributes(
+            comparisons=len(headers_a) * len(headers_b) * len(card_matches), mappings=len(field_mappings)
+        )
         return field_mappings
     
+    @performance_logger.timed('mapping_confidence_calculation')
     def calculate_mapping_confidence(self, field_mappings: Dict[Tuple[str, str], Dict[str, Any]], 
                                    card_matches: List[Dict]) -> List[Dict[str, Any]]:
         """フィールドマッピングの信頼度を計算"""
-        performance_logger.start_timer('mapping_confidence_calculation')
-        
         confident_mappings = []
         min_samples = max(self.min_sample_count, len(card_matches) * 0.3)
         
@@ -92,7 +92,7 @@ class FieldMapper:
             len(confident_mappings),
             len([m for m in confident_mappings if m['confidence'] > 0.8])
         )
-        performance_logger.end_timer('mapping_confidence_calculation')
+        performance_logger.set_attributes(mappings=len(confident_mappings))
         
         return confident_mappings
     
@@ -129,11 +129,10 @@ class FieldMapper:
         else:
             return 'unknown'
     
+    @performance_logger.timed('traditional_mapping_analysis')
     def analyze_traditional_mappings(self, headers_a: List[str], headers_b: List[str], 
                                    sample_data_a: List[Dict], sample_data_b: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
         """従来手法でのフィールドマッピング分析（比較用）"""
-        performance_logger.start_timer('traditional_mapping_analysis')
-        
         # A社基準：各A社フィールドに対するB社フィールドのマッピング度
         a_to_b_mappings = []
         for field_a in headers_a:
@@ -178,7 +177,7 @@ class FieldMapper:
                 'matches': best_matches[:3]  # 上位3件
             })
         
-        performance_logger.end_timer('traditional_mapping_analysis')
+        performance_logger.set_attributes(comparisons=2 * len(headers_a) * len(headers_b))
         return a_to_b_mappings, b_to_a_mappings
     
     def create_mapping_rules(self, confident_mappings: List[Dict[str, Any]], 
@@ -9,6 +9,9 @@ import unicodedata
 from difflib import SequenceMatcher
 from typing import List, Dict, Any, Tuple, Optional
 import logging
+from utils.logger import performance_logger
+from utils.metrics import CANDIDATE_PAIRS
+from utils.text_similarity import count_similarity_call
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +45,7 @@ class FlexibleMatcher:
     
     def calculate_string_similarity(self, str1: str, str2: str) -> float:
         """2つの文字列の類似度を計算"""
+        count_similarity_call('sequence')
         if not str1 or not str2:
             return 0.0
         
@@ -351,10 +355,15 @@ class FlexibleMatcher:
         else:
             return 0.0
     
+    @performance_logger.timed('flexible_matching')
     def flexible_card_matching(self, data_a: List[Dict], data_b: List[Dict], 
                               headers_a: List[str], headers_b: List[str], 
-                              max_comparisons: int = 10000) -> List[Dict]:
-        """柔軟なカードマッチング"""
+                              max_comparisons: int = 10000,
+                              progress_callback=None) -> List[Dict]:
+        """柔軟なカードマッチング
+
+        progress_callback: A社1行ごとに (処理済み行数, 総行数, 比較済みペア数) で呼び出す
+        """
         
         logger.info(f"Starting flexible matching: A={len(data_a)}, B={len(data_b)}")
         
@@ -389,6 +398,8 @@ class FlexibleMatcher:
                     matches.append({
                         'card_a': card_a,
                         'card_b': card_b,
+                        'row_a_index': i,  # パース済みデータ上の行番号（CSV出力で使用）
+                        'row_b_index': j,
                         'card_a_row': i + 2,  # CSV行番号（ヘッダー行を除いて+2）
                         'card_b_row': j + 2,  # CSV行番号（ヘッダー行を除いて+2）
                         'overall_similarity': round(card_similarity, 3),
@@ -397,8 +408,14 @@ class FlexibleMatcher:
                             card_a, card_b, top_field_matches
                         )
                     })
+            
+            if progress_callback:
+                progress_callback(i + 1, len(data_a), comparison_count)
         
         logger.info(f"Flexible matching completed: {len(matches)} matches found, {comparison_count} comparisons")
+        CANDIDATE_PAIRS.inc(len(data_a) * len(data_b), matcher='flexible', phase='generated')
+        CANDIDATE_PAIRS.inc(comparison_count, matcher='flexible', phase='scored')
+        performance_logger.set_attributes(comparisons=comparison_count, matches=len(matches))
         
         return matches
     
@@ -449,7 +466,7 @@ class FlexibleMatcher:
 
 def flexible_enhanced_matching(data_a: List[Dict], data_b: List[Dict], 
                              headers_a: List[str], headers_b: List[str], 
-                             max_sample_size: int = 100) -> Tuple[List[Dict], Dict]:
+                             max_sample_size: int = 100, progress_callback=None) -> Tuple[List[Dict], Dict]:
     """
     柔軟な拡張マッチング - enhanced.pyとの互換性を保持
     """
@@ -464,7 +481,8 @@ def flexible_enhanced_matching(data_a: List[Dict], data_b: List[Dict],
     matcher = FlexibleMatcher(similarity_threshold=0.7)  # 少し閾値を下げる
     
     # 柔軟マッチングを実行
-    matches = matcher.flexible_card_matching(data_a, data_b, headers_a, headers_b)
+    matches = matcher.flexible_card_matching(data_a, data_b, headers_a, headers_b,
+                                             progress_callback=progress_callback)
     
     # フィールドマッピング情報を生成
     field_matches = matcher.find_best_field_matches(headers_a, headers_b, data_a, data_b)
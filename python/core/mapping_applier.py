@@ -0,0 +1,318 @@
+"""
+Mercury Mapping Engine - Mapping Applier
+マッピングルールで仕入先ファイル全体を共通レイアウト（または相手先のレイアウト）に変換
+
+変換元ファイルはレコード境界で区切ったチャンク単位で読み込み、チャンクごとのパース・射影を
+ワーカープロセスで並列実行して入力順に出力ファイルへ追記する（同時に保持するチャンク数は workers × 2 まで）。
+
+transform_rule の形式:
+    transform: [{"rule_type": "regex", "rule_config": {...}}, ...]（単一の dict も可。
+               rule_type / rule_config は mercury_normalization_rule と同じ）
+    extract:   {"pattern": "...", "group": 1, "default": ""}（一致部分を取り出す）
+"""
+import codecs
+import csv
+import io
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from config.settings import Config
+from utils.logger import analysis_logger
+from utils.metrics import ROWS_PROCESSED
+from .normalization import NormalizationRuleError, compile_transform
+
+
+# 1チャンクのバイト数（レコード境界で区切る）
+MAPPING_APPLY_CHUNK_BYTES = int(os.getenv('MAPPING_APPLY_CHUNK_BYTES', str(4 * 1024 * 1024)))
+MAPPING_APPLY_WORKERS = int(os.getenv('MAPPING_APPLY_WORKERS', str(os.cpu_count() or 1)))
+
+SOURCE_SIDES = ('a', 'b')
+TARGET_LAYOUTS = ('common', 'a', 'b')
+
+# 進捗通知 progress(percent, rows_processed)
+ApplyProgressCallback = Callable[[int, int], None]
+
+
+class MappingPlanError(ValueError):
+    """ルール・入力ファイルから変換計画を作れない"""
+
+
+def build_plan_spec(rules: List[Dict[str, Any]], source: str = 'b', target: str = 'common') -> Dict[str, Any]:
+    """ルール一覧（優先度順）から変換計画を作成（ワーカープロセスへ渡せる形式）
+
+    同じ出力列に複数のルールがある場合は優先度順に評価し、最初に空でない値を採用する。
+    """
+    if source not in SOURCE_SIDES:
+        raise MappingPlanError(f"Invalid source: {source}")
+    if target not in TARGET_LAYOUTS:
+        raise MappingPlanError(f"Invalid target: {target}")
+
+    source_key = f"company_{source}_field"
+    target_key = 'common_field_name' if target == 'common' else f"company_{target}_field"
+
+    columns: Dict[str, List[Dict[str, Any]]] = {}
+    for rule in rules:
+        if not rule.get('active', 1):
+            continue
+        field = rule.get(source_key)
+        column = rule.get(target_key)
+        if not field or not column:
+            continue
+        columns.setdefault(column, []).append({
+            'field': field,
+            'mapping_type': rule.get('mapping_type') or 'direct',
+            'transform_rule': rule.get('transform_rule')
+        })
+
+    return {
+        'source': source,
+        'target': target,
+        'columns': list(columns),
+        'sources': list(columns.values()),
+        'rule_count': sum(len(sources) for sources in columns.values())
+    }
+
+
+def _compile_source(source: Dict[str, Any]) -> Optional[Callable[[Any], Any]]:
+    """1ルール分の値変換（direct なら None）"""
+    mapping_type = source['mapping_type']
+    transform_rule = source.get('transform_rule')
+    if mapping_type == 'direct' or not transform_rule:
+        return None
+
+    if mapping_type == 'extract':
+        config = dict(transform_rule)
+        config['extract'] = config.pop('group', config.get('extract', 0))
+        return compile_transform([{'rule_type': 'regex', 'rule_config': config}])
+
+    steps = transform_rule if isinstance(transform_rule, list) else [transform_rule]
+    return compile_transform(steps)
+
+
+class ProjectionPlan:
+    """変換元ヘッダーに対してコンパイルした射影（行のリスト → 出力列のリスト）"""
+
+    def __init__(self, spec: Dict[str, Any], headers: List[str]):
+        header_index = {header: i for i, header in enumerate(headers)}
+        self.width = len(headers)
+        self.columns = spec['columns']
+        self.missing_fields = set()
+        self._getters = []
+
+        for sources in spec['sources']:
+            compiled = []
+            for source in sources:
+                index = header_index.get(source['field'])
+                if index is None:
+                    self.missing_fields.add(source['field'])
+                    continue
+                try:
+                    compiled.append((index, _compile_source(source)))
+                except (NormalizationRuleError, TypeError, ValueError) as e:
+                    raise MappingPlanError(f"Invalid transform_rule for {source['field']}: {e}")
+            self._getters.append(self._build_getter(compiled))
+
+    @staticmethod
+    def _build_getter(compiled):
+        """出力1列分の取り出し関数（単一の direct は itemgetter のみ）"""
+        if not compiled:
+            return lambda row: ''
+        if len(compiled) == 1:
+            index, func = compiled[0]
+            if func is None:
+                return itemgetter(index)
+            return lambda row: func(row[index]) or ''
+
+        def coalesce(row):
+            for index, func in compiled:
+                value = func(row[index]) if func is not None else row[index]
+                if value:
+                    return value
+            return ''
+        return coalesce
+
+    def project(self, row: List[str]) -> List[str]:
+        if len(row) < self.width:
+            row = row + [''] * (self.width - len(row))
+        return [getter(row) for getter in self._getters]
+
+    def project_chunk(self, rows: List[List[str]]) -> str:
+        """チャンクを変換してCSVテキストで返す"""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self.project(row) for row in rows)
+        return buffer.getvalue()
+
+
+# ワーカープロセス側の変換計画（initializer で1回だけコンパイル）
+_worker_plan: Optional[ProjectionPlan] = None
+
+
+def _init_apply_worker(spec: Dict[str, Any], headers: List[str]):
+    global _worker_plan
+    _worker_plan = ProjectionPlan(spec, headers)
+
+
+def _project_block(data: bytes) -> Tuple[int, bytes]:
+    return _convert_block(_worker_plan, data)
+
+
+def _convert_block(plan: ProjectionPlan, data: bytes) -> Tuple[int, bytes]:
+    """レコード境界で切り出したバイト列をパース・変換し、(行数, 出力CSV) を返す"""
+    rows = [row for row in csv.reader(io.StringIO(data.decode('utf-8'), newline='')) if row]
+    return len(rows), plan.project_chunk(rows).encode('utf-8')
+
+
+def _record_boundary(data: bytes) -> int:
+    """data の中で最後のレコード境界（引用符の外にある改行の直後）の位置。なければ -1
+
+    UTF-8 のマルチバイト文字は '"' や改行のバイトを含まないため、バイト列のまま判定できる。
+    """
+    end = len(data)
+    quotes = data.count(b'"')
+    while True:
+        newline = data.rfind(b'\n', 0, end)
+        if newline < 0:
+            return -1
+        quotes -= data.count(b'"', newline, end)
+        if quotes % 2 == 0:
+            return newline + 1
+        end = newline
+
+
+def _iter_blocks(raw: BinaryIO, carry: bytes, block_bytes: int) -> Iterator[bytes]:
+    """ファイルをレコード境界で区切ったブロック単位で読み出し"""
+    while True:
+        chunk = raw.read(block_bytes)
+        if not chunk:
+            if carry.strip():
+                yield carry
+            return
+        data = carry + chunk
+        boundary = _record_boundary(data)
+        if boundary < 0:
+            # 1レコードがブロックより長い場合は次のブロックと連結
+            carry = data
+            continue
+        carry = data[boundary:]
+        yield data[:boundary]
+
+
+def _read_headers(raw: BinaryIO, block_bytes: int) -> Tuple[List[str], bytes]:
+    """先頭レコード（ヘッダー）と、その後ろの読み込み済みバイト列"""
+    data = b''
+    while True:
+        chunk = raw.read(block_bytes)
+        data += chunk
+        # 先頭から順に、引用符の外にある最初の改行を探す
+        position = 0
+        while True:
+            newline = data.find(b'\n', position)
+            if newline < 0 or data.count(b'"', 0, newline) % 2 == 0:
+                break
+            position = newline + 1
+        if newline >= 0 or not chunk:
+            break
+
+    header_bytes, rest = (data[:newline + 1], data[newline + 1:]) if newline >= 0 else (data, b'')
+    if header_bytes.startswith(codecs.BOM_UTF8):
+        header_bytes = header_bytes[len(codecs.BOM_UTF8):]
+    headers = next(csv.reader(io.StringIO(header_bytes.decode('utf-8'), newline='')), [])
+    return [header.strip() for header in headers], rest
+
+
+def apply_mapping_file(source_path: str, output_path: str, spec: Dict[str, Any],
+                       chunk_bytes: Optional[int] = None, workers: Optional[int] = None,
+                       progress: Optional[ApplyProgressCallback] = None) -> Dict[str, Any]:
+    """変換元CSV（UTF-8）を変換計画に従って出力CSVへ変換（一時ファイルに書いてから置き換え）
+
+    パース・変換はワーカー側で行い、親プロセスはレコード境界での切り出しと書き込みのみ行う。
+    """
+    chunk_bytes = max(64 * 1024, chunk_bytes or MAPPING_APPLY_CHUNK_BYTES)
+    workers = max(1, workers or MAPPING_APPLY_WORKERS)
+    start_time = time.time()
+    total_bytes = os.path.getsize(source_path) or 1
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+
+    with open(source_path, 'rb') as raw:
+        headers, carry = _read_headers(raw, chunk_bytes)
+        if not headers:
+            raise MappingPlanError(f"Source file is empty: {source_path}")
+
+        plan = ProjectionPlan(spec, headers)
+        if not plan.columns:
+            raise MappingPlanError("No mapping rules to apply")
+        if plan.missing_fields:
+            analysis_logger.logger.warning(f"⚠️ 変換元に存在しないフィールド: {sorted(plan.missing_fields)}")
+
+        # 1プロセスならプールを作らずに変換
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(Config.get_config('default').JOB_START_METHOD),
+                initializer=_init_apply_worker,
+                initargs=(spec, headers)
+            )
+
+        rows = 0
+        chunks = 0
+        try:
+            with open(tmp_path, 'wb') as output:
+                header_buffer = io.StringIO()
+                csv.writer(header_buffer).writerow(plan.columns)
+                output.write(header_buffer.getvalue().encode('utf-8-sig'))
+                pending = deque()
+
+                def write(result: Tuple[int, bytes]):
+                    nonlocal rows
+                    rows += result[0]
+                    output.write(result[1])
+                    if progress:
+                        progress(min(99, int(raw.tell() * 100 / total_bytes)), rows)
+
+                for block in _iter_blocks(raw, carry, chunk_bytes):
+                    chunks += 1
+                    if pool is None:
+                        write(_convert_block(plan, block))
+                        continue
+                    pending.append(pool.submit(_project_block, block))
+                    # 先頭のチャンクから順に書き出し、未処理チャンクを溜めすぎない
+                    while len(pending) >= workers * 2:
+                        write(pending.popleft().result())
+
+                while pending:
+                    write(pending.popleft().result())
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.time() - start_time
+    summary = {
+        'path': output_path,
+        'rows': rows,
+        'chunks': chunks,
+        'workers': workers,
+        'columns': plan.columns,
+        'missing_fields': sorted(plan.missing_fields),
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None
+    }
+    analysis_logger.logger.info(
+        f"🔁 マッピング適用完了: {rows}行 → {len(plan.columns)}列 "
+        f"({elapsed:.2f}秒, {summary['rows_per_second']}行/秒, workers={workers})"
+    )
+    ROWS_PROCESSED.inc(rows, stage='apply_mapping')
+    if progress:
+        progress(100, rows)
+    return summary
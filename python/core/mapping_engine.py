@@ -7,26 +7,38 @@ from .csv_analyzer import CSVAnalyzer
 from .card_matcher import CardMatcher
 from .field_mapper import FieldMapper
 from utils.logger import analysis_logger, performance_logger
+from utils.text_similarity import TextSimilarity
 
 
 class MappingEngine:
-    """統合マッピングエンジン"""
+    """統合マッピングエンジン
+
+    リクエスト固有の状態は持たないため、複数スレッドから共有できる
+    （core.engine_registry で設定ごとに使い回す）。
+    """
     
     def __init__(self, config=None):
         self.config = config or {}
         
-        # 各コンポーネントを初期化
+        # 各コンポーネントを初期化（類似度計算のメモ化はコンポーネント間で共有）
+        self.text_similarity = TextSimilarity()
         self.csv_analyzer = CSVAnalyzer(self.config)
-        self.card_matcher = CardMatcher(self.config)
-        self.field_mapper = FieldMapper(self.config)
+        self.card_matcher = CardMatcher(self.config, text_similarity=self.text_similarity)
+        self.field_mapper = FieldMapper(self.config, text_similarity=self.text_similarity)
         
         analysis_logger.logger.info("MappingEngine initialized with modular components")
     
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """エンジンが保持するキャッシュの統計"""
+        return {'text_similarity': self.text_similarity.cache_info()}
+    
+    def clear_caches(self):
+        self.text_similarity.clear_cache()
+    
+    @performance_logger.timed('full_csv_analysis')
     def analyze_csv_files(self, filepath_a: str, filepath_b: str, 
                          full_analysis: bool = True) -> Dict[str, Any]:
         """CSV ファイルの分析"""
-        performance_logger.start_timer('full_csv_analysis')
-        
         try:
             if full_analysis:
                 analysis_a = self.csv_analyzer.analyze_file_full(filepath_a)
@@ -58,20 +70,24 @@ class MappingEngine:
                 'analysis_type': 'full' if full_analysis else 'sample'
             }
             
-            performance_logger.end_timer('full_csv_analysis')
+            performance_logger.set_attributes(rows_a=analysis_a.get('total_rows'),
+                                              rows_b=analysis_b.get('total_rows'))
             return result
             
         except Exception as e:
             analysis_logger.log_error('csv_files_analysis', str(e))
             return {'error': str(e)}
     
+    @performance_logger.timed('card_based_mapping')
     def analyze_card_based_mapping(self, headers_a: List[str], headers_b: List[str],
                                   sample_data_a: List[Dict], sample_data_b: List[Dict],
                                   full_data_a: Optional[List[Dict]] = None,
-                                  full_data_b: Optional[List[Dict]] = None) -> Tuple[List[Dict], List[Dict]]:
+                                  full_data_b: Optional[List[Dict]] = None,
+                                  similarity_mode: str = 'library',
+                                  ai_manager=None,
+                                  tier_stats: Optional[Dict[str, int]] = None,
+                                  progress_callback=None) -> Tuple[List[Dict], List[Dict]]:
         """カードベースでのフィールドマッピング分析"""
-        performance_logger.start_timer('card_based_mapping')
-        
         try:
             # データが少ない場合はサンプルデータを使用
             data_a = full_data_a if full_data_a else sample_data_a
@@ -80,7 +96,13 @@ class MappingEngine:
             analysis_logger.logger.info(f"分析データ数: A社={len(data_a)}, B社={len(data_b)}")
             
             # ステップ1: 同じカードを特定
-            card_matches = self.card_matcher.find_matching_cards(data_a, data_b, headers_a, headers_b)
+            card_matches = self.card_matcher.find_matching_cards(
+                data_a, data_b, headers_a, headers_b,
+                similarity_mode=similarity_mode,
+                ai_manager=ai_manager,
+                tier_stats=tier_stats,
+                progress_callback=progress_callback
+            )
             
             if len(card_matches) < self.config.get('min_sample_count', 3):
                 analysis_logger.logger.warning("マッチするカードが少なすぎます。従来の方法にフォールバック")
@@ -92,7 +114,7 @@ class MappingEngine:
             # ステップ3: 信頼度を計算
             enhanced_mappings = self.field_mapper.calculate_mapping_confidence(field_mappings, card_matches)
             
-            performance_logger.end_timer('card_based_mapping')
+            performance_logger.set_attributes(rows_a=len(data_a), rows_b=len(data_b), matches=len(card_matches))
             return enhanced_mappings, card_matches
             
         except Exception as e:
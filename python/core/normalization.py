@@ -0,0 +1,386 @@
+"""
+Mercury Mapping Engine - Normalization Pipeline
+mercury_normalization_rule のルールをカラムごとの処理関数にコンパイルして適用
+
+rule_type ごとの rule_config:
+    text_clean: unicode_normalize ('NFKC' 等), replace ({"＆": "&"}), remove ("文字列"),
+                collapse_whitespace (bool), case ('lower' / 'upper'), strip (bool, 既定 true)
+    split:      separator または pattern（正規表現）, index (既定 0), maxsplit, strip (既定 true)
+    value_map:  mapping ({"SR": "スーパーレア"}), case_insensitive (bool), default（未定義時は元の値）
+    regex:      pattern, replacement (既定 ''), flags ('i' / 'm' / 's'), count,
+                extract（グループ番号・名前。指定時は一致部分を取り出し、不一致なら default / 元の値）
+
+field_name が '*' のルールは全カラムに適用する（カラム個別のルールと execution_order 順に合成）。
+"""
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from utils.logger import analysis_logger
+from utils.reference_cache import get_reference_cache
+
+
+# ルール更新の確認間隔（秒）。この間はDBを見ずにコンパイル済みパイプラインを使う
+NORMALIZATION_CHECK_INTERVAL = float(os.getenv('NORMALIZATION_CHECK_INTERVAL', '10'))
+
+ALL_COLUMNS = '*'
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_REGEX_FLAGS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL}
+
+
+class NormalizationRuleError(ValueError):
+    """rule_config が不正でコンパイルできない"""
+
+
+# ===============================================
+# ルール → 処理ステップ
+# ===============================================
+# ステップは ('translate', table) か ('func', callable)。
+# 連続する translate は1つの変換表に合成し、カラムごとに1つの関数にまとめる。
+
+def _compile_text_clean(config: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    steps = []
+
+    form = config.get('unicode_normalize')
+    if form:
+        form = 'NFKC' if form is True else str(form).upper()
+        if form not in ('NFC', 'NFKC', 'NFD', 'NFKD'):
+            raise NormalizationRuleError(f"Unknown unicode_normalize form: {form}")
+        steps.append(('func', lambda value, form=form: unicodedata.normalize(form, value)))
+
+    # 1文字→文字列の置換・削除は変換表、複数文字の置換は1つの正規表現で辞書引き
+    table = {}
+    multi_char = {}
+    for source, target in (config.get('replace') or {}).items():
+        if len(source) == 1:
+            table[ord(source)] = target
+        elif source:
+            multi_char[source] = target
+    for char in config.get('remove') or '':
+        table[ord(char)] = None
+    if table:
+        steps.append(('translate', table))
+    if multi_char:
+        pattern = re.compile('|'.join(re.escape(s) for s in sorted(multi_char, key=len, reverse=True)))
+        steps.append(('func', lambda value, p=pattern, m=multi_char: p.sub(lambda match: m[match.group(0)], value)))
+
+    if config.get('collapse_whitespace'):
+        steps.append(('func', lambda value: _WHITESPACE_PATTERN.sub(' ', value)))
+
+    case = config.get('case')
+    if case == 'lower':
+        steps.append(('func', str.lower))
+    elif case == 'upper':
+        steps.append(('func', str.upper))
+    elif case:
+        raise NormalizationRuleError(f"Unknown case: {case}")
+
+    if config.get('strip', True):
+        steps.append(('func', str.strip))
+    return steps
+
+
+def _compile_split(config: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    index = int(config.get('index', 0))
+    maxsplit = int(config.get('maxsplit', -1))
+    strip = config.get('strip', True)
+
+    if config.get('pattern'):
+        splitter = re.compile(config['pattern'])
+        split = (lambda value: splitter.split(value, maxsplit=max(0, maxsplit))) if maxsplit >= 0 else splitter.split
+    elif config.get('separator'):
+        separator = config['separator']
+        split = lambda value: value.split(separator, maxsplit)
+    else:
+        raise NormalizationRuleError("split rule requires separator or pattern")
+
+    def split_step(value):
+        parts = split(value)
+        if -len(parts) <= index < len(parts):
+            value = parts[index]
+        return value.strip() if strip else value
+
+    return [('func', split_step)]
+
+
+def _compile_value_map(config: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    mapping = config.get('mapping')
+    if not isinstance(mapping, dict):
+        raise NormalizationRuleError("value_map rule requires mapping")
+
+    has_default = 'default' in config
+    default = config.get('default')
+    if config.get('case_insensitive'):
+        lookup = {str(k).lower(): v for k, v in mapping.items()}
+        key = str.lower
+    else:
+        lookup = {str(k): v for k, v in mapping.items()}
+        key = None
+
+    def value_map_step(value):
+        mapped = lookup.get(key(value) if key else value, lookup)
+        if mapped is lookup:
+            return default if has_default else value
+        return mapped
+
+    return [('func', value_map_step)]
+
+
+def _compile_regex(config: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    if not config.get('pattern'):
+        raise NormalizationRuleError("regex rule requires pattern")
+
+    flags = 0
+    for flag in config.get('flags', ''):
+        if flag not in _REGEX_FLAGS:
+            raise NormalizationRuleError(f"Unknown regex flag: {flag}")
+        flags |= _REGEX_FLAGS[flag]
+    try:
+        pattern = re.compile(config['pattern'], flags)
+    except re.error as e:
+        raise NormalizationRuleError(f"Invalid regex pattern: {e}")
+
+    if 'extract' in config:
+        group = config['extract']
+        has_default = 'default' in config
+        default = config.get('default')
+
+        def extract_step(value):
+            match = pattern.search(value)
+            if match is None:
+                return default if has_default else value
+            return match.group(group) or ''
+
+        return [('func', extract_step)]
+
+    replacement = config.get('replacement', '')
+    count = int(config.get('count', 0))
+    return [('func', lambda value: pattern.sub(replacement, value, count))]
+
+
+_RULE_COMPILERS = {
+    'text_clean': _compile_text_clean,
+    'split': _compile_split,
+    'value_map': _compile_value_map,
+    'regex': _compile_regex,
+}
+
+
+def _merge_tables(first: Dict[int, Any], second: Dict[int, Any]) -> Dict[int, Any]:
+    """str.translate の変換表を合成（first を適用した後に second を適用するのと同じ結果）"""
+    merged = {}
+    for code, target in first.items():
+        merged[code] = target.translate(second) if isinstance(target, str) else target
+    for code, target in second.items():
+        merged.setdefault(code, target)
+    return merged
+
+
+def _fuse(steps: List[Tuple[str, Any]]) -> Optional[Callable[[Any], Any]]:
+    """ステップ列を1つの関数にまとめる"""
+    funcs = []
+    table = None
+    for kind, step in steps:
+        if kind == 'translate':
+            table = step if table is None else _merge_tables(table, step)
+            continue
+        if table is not None:
+            funcs.append(lambda value, t=table: value.translate(t))
+            table = None
+        funcs.append(step)
+    if table is not None:
+        funcs.append(lambda value, t=table: value.translate(t))
+
+    if not funcs:
+        return None
+
+    funcs = tuple(funcs)
+
+    def pipeline(value):
+        if value is None:
+            return value
+        if not isinstance(value, str):
+            value = str(value)
+        for func in funcs:
+            value = func(value)
+        return value
+
+    return pipeline
+
+
+def compile_transform(steps: List[Dict[str, Any]]) -> Optional[Callable[[Any], Any]]:
+    """rule_type / rule_config の並びを1つの関数にコンパイル（マッピングルールの transform_rule 用）"""
+    compiled = []
+    for step in steps:
+        compiler = _RULE_COMPILERS.get(step.get('rule_type'))
+        if compiler is None:
+            raise NormalizationRuleError(f"Unknown rule_type: {step.get('rule_type')}")
+        compiled.extend(compiler(step.get('rule_config') or {}))
+    return _fuse(compiled)
+
+
+# ===============================================
+# コンパイル済みパイプライン
+# ===============================================
+
+class CompiledNormalizer:
+    """カテゴリのルールをコンパイルしたもの（カラムごとのパイプラインは初回使用時に合成）"""
+
+    def __init__(self, category2_id: Optional[int], rules: List[Dict[str, Any]], stamp: Any = None):
+        self.category2_id = category2_id
+        self.stamp = stamp
+        self.rule_count = len(rules)
+        self._pipelines: Dict[str, Optional[Callable]] = {}
+
+        # ステップへの変換はここで済ませ、不正なルールはスキップ
+        self._steps_by_field: Dict[str, List[Tuple[int, int, List]]] = {}
+        for rule in rules:
+            compiler = _RULE_COMPILERS.get(rule.get('rule_type'))
+            if compiler is None:
+                analysis_logger.log_error('normalization_rule', f"unknown rule_type: {rule.get('rule_type')}")
+                continue
+            try:
+                steps = compiler(rule.get('rule_config') or {})
+            except (NormalizationRuleError, TypeError, ValueError) as e:
+                analysis_logger.log_error('normalization_rule', f"rule {rule.get('id')}: {e}")
+                continue
+            order = (int(rule.get('execution_order') or 1), int(rule.get('id') or 0))
+            self._steps_by_field.setdefault(rule['field_name'], []).append((*order, steps))
+
+    @property
+    def has_rules(self) -> bool:
+        return bool(self._steps_by_field)
+
+    def get_pipeline(self, column: str) -> Optional[Callable[[Any], Any]]:
+        """カラムの正規化関数（ルールがなければ None）"""
+        if column in self._pipelines:
+            return self._pipelines[column]
+
+        ordered = sorted(self._steps_by_field.get(ALL_COLUMNS, []) + self._steps_by_field.get(column, []),
+                         key=lambda item: item[:2])
+        pipeline = _fuse([step for _, _, steps in ordered for step in steps])
+        self._pipelines[column] = pipeline
+        return pipeline
+
+    def normalize_value(self, column: str, value: Any) -> Any:
+        pipeline = self.get_pipeline(column)
+        return pipeline(value) if pipeline else value
+
+    def normalize_column(self, column: str, values: Iterable[Any]) -> List[Any]:
+        """1カラム分をまとめて正規化（同じ値は1回だけ計算）"""
+        pipeline = self.get_pipeline(column)
+        if pipeline is None:
+            return list(values)
+
+        memo = {}
+        normalized = []
+        for value in values:
+            try:
+                result = memo[value]
+            except KeyError:
+                result = memo[value] = pipeline(value)
+            except TypeError:
+                result = pipeline(value)
+            normalized.append(result)
+        return normalized
+
+    def apply(self, rows: List[Dict[str, Any]], columns: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """データセットをカラム単位で正規化した新しい行リストを返す（元の行は変更しない）"""
+        if not rows or not self.has_rules:
+            return rows
+
+        columns = list(columns) if columns is not None else list(rows[0].keys())
+        targets = [column for column in columns if self.get_pipeline(column) is not None]
+        if not targets:
+            return rows
+
+        normalized_rows = [dict(row) for row in rows]
+        for column in targets:
+            values = self.normalize_column(column, (row.get(column) for row in rows))
+            for row, value in zip(normalized_rows, values):
+                if column in row:
+                    row[column] = value
+        return normalized_rows
+
+
+def compile_rules(rules: List[Dict[str, Any]], category2_id: Optional[int] = None,
+                  stamp: Any = None) -> CompiledNormalizer:
+    return CompiledNormalizer(category2_id, rules, stamp)
+
+
+# ===============================================
+# カテゴリ単位のキャッシュ
+# ===============================================
+
+class NormalizerCache:
+    """category2_id → CompiledNormalizer
+
+    NORMALIZATION_CHECK_INTERVAL 秒ごとにルールの最終更新日時・件数を確認し、変化していれば再コンパイルする。
+    """
+
+    def __init__(self, repository=None, check_interval: float = NORMALIZATION_CHECK_INTERVAL):
+        self._repository = repository
+        self.check_interval = check_interval
+        self._entries: Dict[int, Tuple[CompiledNormalizer, float]] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'checks': 0, 'compiles': 0}
+
+    @property
+    def repository(self):
+        if self._repository is None:
+            from repositories.normalization_rule_repository import NormalizationRuleRepository
+            self._repository = NormalizationRuleRepository()
+        return self._repository
+
+    def get(self, category2_id: int) -> CompiledNormalizer:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(category2_id)
+            if entry is not None and now - entry[1] < self.check_interval:
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['checks'] += 1
+
+        stamp = self.repository.get_rules_stamp(category2_id)
+        if entry is not None and entry[0].stamp == stamp:
+            normalizer = entry[0]
+        else:
+            # 更新を検知した（または初回の）ルールは参照データキャッシュを経由せずに読み直す
+            get_reference_cache().invalidate('normalization_rules', category2_id)
+            normalizer = compile_rules(self.repository.get_active_rules(category2_id), category2_id, stamp)
+            with self._lock:
+                self._stats['compiles'] += 1
+            analysis_logger.logger.info(
+                f"🧹 Normalization rules compiled: category2_id={category2_id}, rules={normalizer.rule_count}"
+            )
+
+        with self._lock:
+            self._entries[category2_id] = (normalizer, now)
+        return normalizer
+
+    def invalidate(self, category2_id: Optional[int] = None):
+        get_reference_cache().invalidate('normalization_rules', category2_id)
+        with self._lock:
+            if category2_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(category2_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'categories': sorted(self._entries)}
+
+
+_normalizer_cache = NormalizerCache()
+
+
+def get_normalizer_cache() -> NormalizerCache:
+    return _normalizer_cache
+
+
+def get_normalizer(category2_id: int) -> CompiledNormalizer:
+    """カテゴリのコンパイル済み正規化パイプライン（プロセス内でキャッシュ）"""
+    return _normalizer_cache.get(category2_id)
@@ -0,0 +1,162 @@
+"""
+Mercury Mapping Engine - Result Export
+マッチング結果のCSV出力（行番号ベース・ストリーミング書き込み）
+"""
+import csv
+import os
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from utils.logger import analysis_logger, performance_logger
+from utils.metrics import ROWS_PROCESSED
+
+
+# A社/B社フィールドの区切り列
+SEPARATOR_COLUMN = "____####____"
+
+EXPORT_FILENAME = 'matches.csv'
+
+
+class MatchIndex:
+    """行番号 → マッチの対応表（各行で最高スコアのマッチのみ保持）
+
+    a_to_b[i] は A社 i 行目に対応する B社の行番号（なければ -1）、
+    a_score[i] はそのスコア。B社側も同様。
+    """
+
+    def __init__(self, matches: List[Dict[str, Any]], rows_a: int, rows_b: int):
+        self.a_to_b = array('l', [-1]) * rows_a
+        self.b_to_a = array('l', [-1]) * rows_b
+        self.a_score = array('d', [0.0]) * rows_a
+        self.b_score = array('d', [0.0]) * rows_b
+        self.skipped = 0
+
+        for match in matches:
+            i = match.get('row_a_index')
+            j = match.get('row_b_index')
+            if i is None or j is None or not (0 <= i < rows_a and 0 <= j < rows_b):
+                self.skipped += 1
+                continue
+
+            score = match_score(match)
+            if self.a_to_b[i] < 0 or score > self.a_score[i]:
+                self.a_to_b[i] = j
+                self.a_score[i] = score
+            if self.b_to_a[j] < 0 or score > self.b_score[j]:
+                self.b_to_a[j] = i
+                self.b_score[j] = score
+
+        if self.skipped:
+            analysis_logger.logger.warning(f"⚠️ 行番号のないマッチをCSV出力から除外: {self.skipped}件")
+
+    @property
+    def matched_a(self) -> int:
+        return sum(1 for j in self.a_to_b if j >= 0)
+
+    @property
+    def matched_b(self) -> int:
+        return sum(1 for i in self.b_to_a if i >= 0)
+
+
+def match_score(match: Dict[str, Any]) -> float:
+    """マッチャーごとに異なるスコアキーを吸収"""
+    score = match.get('overall_similarity')
+    if score is None:
+        score = match.get('match_score', 0.0)
+    return float(score or 0.0)
+
+
+def build_export_headers(headers_a: List[str], headers_b: List[str]) -> List[str]:
+    """A社全フィールド + 区切り + B社全フィールド + マッチスコア"""
+    return [f"A社_{h}" for h in headers_a] + [SEPARATOR_COLUMN] + [f"B社_{h}" for h in headers_b] + ["マッチスコア"]
+
+
+def iter_export_rows(headers_a: List[str], headers_b: List[str], data_a: List[Dict], data_b: List[Dict],
+                     index: MatchIndex) -> Iterator[List[str]]:
+    """出力行を1行ずつ生成（データ数が多い方を基準に全レコード）"""
+    empty_a = [''] * len(headers_a)
+    empty_b = [''] * len(headers_b)
+
+    if len(data_a) >= len(data_b):
+        for i, record_a in enumerate(data_a):
+            j = index.a_to_b[i]
+            if j >= 0:
+                yield _values(record_a, headers_a) + [SEPARATOR_COLUMN] + _values(data_b[j], headers_b) \
+                    + [f"{index.a_score[i]:.3f}"]
+            else:
+                yield _values(record_a, headers_a) + [SEPARATOR_COLUMN] + empty_b + ['0.000']
+    else:
+        for j, record_b in enumerate(data_b):
+            i = index.b_to_a[j]
+            if i >= 0:
+                yield _values(data_a[i], headers_a) + [SEPARATOR_COLUMN] + _values(record_b, headers_b) \
+                    + [f"{index.b_score[j]:.3f}"]
+            else:
+                yield empty_a + [SEPARATOR_COLUMN] + _values(record_b, headers_b) + ['0.000']
+
+
+def write_match_csv(output: TextIO, headers_a: List[str], headers_b: List[str],
+                    data_a: List[Dict], data_b: List[Dict], matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """マッチング結果をファイルオブジェクトへ逐次書き込み"""
+    index = MatchIndex(matches, len(data_a), len(data_b))
+    writer = csv.writer(output)
+    writer.writerow(build_export_headers(headers_a, headers_b))
+
+    rows = 0
+    for row in iter_export_rows(headers_a, headers_b, data_a, data_b, index):
+        writer.writerow(row)
+        rows += 1
+
+    use_a_as_base = len(data_a) >= len(data_b)
+    return {
+        'rows': rows,
+        'base': 'a' if use_a_as_base else 'b',
+        'matched_rows': index.matched_a if use_a_as_base else index.matched_b,
+        'skipped_matches': index.skipped
+    }
+
+
+@performance_logger.timed('match_csv_export')
+def export_matches_to_file(path: str, headers_a: List[str], headers_b: List[str],
+                           data_a: List[Dict], data_b: List[Dict], matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """CSVファイルへ出力（一時ファイルに書いてから置き換え、並行実行でも壊れない）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+        summary = write_match_csv(csvfile, headers_a, headers_b, data_a, data_b, matches)
+    os.replace(tmp_path, path)
+
+    span = performance_logger.current_span().set(rows=summary['rows'])
+    ROWS_PROCESSED.inc(summary['rows'], stage='match_export')
+    elapsed_ms = span.elapsed_ms()
+    analysis_logger.logger.info(f"📊 CSV出力完了: {path}")
+    analysis_logger.logger.info(f"   - 基準データ: {'A社' if summary['base'] == 'a' else 'B社'} ({summary['rows']}件)")
+    analysis_logger.logger.info(f"   - マッチ件数: {summary['matched_rows']}件")
+    analysis_logger.logger.info(f"   - アンマッチ件数: {summary['rows'] - summary['matched_rows']}件")
+
+    return {**summary, 'path': path, 'elapsed_ms': elapsed_ms}
+
+
+def iter_file_chunks(path: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """ダウンロード用にファイルを固定サイズで読み出し"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _values(record: Dict, headers: List[str]) -> List[str]:
+    return [str(record.get(header, '')).strip() or 'N/A' for header in headers]
+
+
+def get_export_path(job_dir: str) -> str:
+    return os.path.join(job_dir, EXPORT_FILENAME)
+
+
+def export_summary(export: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """結果JSON用（実パスは含めない）"""
+    if not export:
+        return None
+    return {key: value for key, value in export.items() if key != 'path'}
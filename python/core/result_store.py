@@ -0,0 +1,260 @@
+"""
+Mercury Mapping Engine - Result Store
+ジョブ単位の分析結果ストア（SQLite・カーソル方式のページング）
+"""
+import base64
+import json
+import os
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.logger import analysis_logger, performance_logger
+from .result_export import MatchIndex, match_score
+
+
+RESULT_STORE_FILENAME = 'results.sqlite'
+
+# 1ページの最大件数
+MAX_PAGE_LIMIT = 1000
+
+_WRITE_BATCH_SIZE = 5000
+
+_SCHEMA = """
+CREATE TABLE matches (
+    id INTEGER PRIMARY KEY,
+    row_a INTEGER,
+    row_b INTEGER,
+    score REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX idx_matches_score ON matches (score, id);
+
+CREATE TABLE unmatched (
+    id INTEGER PRIMARY KEY,
+    side TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX idx_unmatched_side ON unmatched (side, id);
+
+CREATE TABLE mappings (
+    id INTEGER PRIMARY KEY,
+    field_a TEXT,
+    field_b TEXT,
+    score REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX idx_mappings_score ON mappings (score, id);
+
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# 取得対象 → スコアで並べ替え・絞り込みできるか
+RESULT_KINDS = {
+    'matches': True,
+    'unmatched': False,
+    'mappings': True
+}
+
+
+class ResultStore:
+    """分析結果（マッチ・アンマッチ行・フィールドマッピング）を1ファイルに保存
+
+    書き込みはワーカープロセスで1回だけ行い（一時ファイル → 置き換え）、
+    以降は読み取り専用で開いてキーセット方式でページングする。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    @performance_logger.timed('result_store_write')
+    def write(self, data_a: List[Dict], data_b: List[Dict], matches: List[Dict[str, Any]],
+              mappings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """結果を書き込み、件数のサマリーを返す"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+        index = MatchIndex(matches, len(data_a), len(data_b))
+        connection = sqlite3.connect(tmp_path)
+        try:
+            # 一時ファイルへの一括書き込みなので耐障害性より速度を優先
+            connection.execute('PRAGMA journal_mode=OFF')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.executescript(_SCHEMA)
+
+            counts = {
+                'matches': _insert_batches(
+                    connection,
+                    'INSERT INTO matches (row_a, row_b, score, payload) VALUES (?, ?, ?, ?)',
+                    ((m.get('row_a_index'), m.get('row_b_index'), match_score(m), _dumps(m)) for m in matches)
+                ),
+                'unmatched_a': _insert_batches(
+                    connection,
+                    'INSERT INTO unmatched (side, row_index, payload) VALUES (?, ?, ?)',
+                    (('a', i, _dumps({'row_index': i, 'record': record}))
+                     for i, record in enumerate(data_a) if index.a_to_b[i] < 0)
+                ),
+                'unmatched_b': _insert_batches(
+                    connection,
+                    'INSERT INTO unmatched (side, row_index, payload) VALUES (?, ?, ?)',
+                    (('b', j, _dumps({'row_index': j, 'record': record}))
+                     for j, record in enumerate(data_b) if index.b_to_a[j] < 0)
+                ),
+                'mappings': _insert_batches(
+                    connection,
+                    'INSERT INTO mappings (field_a, field_b, score, payload) VALUES (?, ?, ?, ?)',
+                    ((m.get('field_a', m.get('company_a_field')), m.get('field_b', m.get('company_b_field')),
+                      float(m.get('confidence') or 0.0), _dumps(m)) for m in mappings)
+                )
+            }
+            connection.executemany('INSERT INTO meta (key, value) VALUES (?, ?)',
+                                   [(key, str(value)) for key, value in counts.items()])
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, self.path)
+
+        span = performance_logger.current_span().set(**counts)
+        elapsed_ms = span.elapsed_ms()
+        analysis_logger.logger.info(
+            f"🗄️ 結果ストア保存: マッチ{counts['matches']}件, "
+            f"アンマッチ A社{counts['unmatched_a']}件 / B社{counts['unmatched_b']}件, "
+            f"マッピング{counts['mappings']}件"
+        )
+        return {'counts': counts, 'path': self.path, 'elapsed_ms': elapsed_ms}
+
+    def get_counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as connection:
+            return {key: int(value) for key, value in connection.execute('SELECT key, value FROM meta')}
+
+    def page(self, kind: str, cursor: Optional[str] = None, limit: int = 100, sort: str = 'desc',
+             min_score: Optional[float] = None, max_score: Optional[float] = None,
+             side: Optional[str] = None) -> Dict[str, Any]:
+        """1ページ分を取得
+
+        matches / mappings はスコア順（同点は id 順）、unmatched は行番号順。
+        cursor は前ページの next_cursor をそのまま渡す（並び順・絞り込みは同じ指定が必要）。
+        """
+        if kind not in RESULT_KINDS:
+            raise ValueError(f"Invalid result kind: {kind}")
+        if sort not in ('asc', 'desc'):
+            raise ValueError(f"Invalid sort: {sort}")
+        if kind == 'unmatched' and side not in ('a', 'b'):
+            raise ValueError("side must be 'a' or 'b'")
+        limit = max(1, min(int(limit), MAX_PAGE_LIMIT))
+
+        scored = RESULT_KINDS[kind]
+        conditions, params = [], []
+        if kind == 'unmatched':
+            conditions.append('side = ?')
+            params.append(side)
+        if scored and min_score is not None:
+            conditions.append('score >= ?')
+            params.append(float(min_score))
+        if scored and max_score is not None:
+            conditions.append('score <= ?')
+            params.append(float(max_score))
+
+        # キーセット条件（OFFSET を使わないので深いページでも一定コスト）
+        comparison = '>' if sort == 'asc' else '<'
+        if cursor:
+            last_score, last_id = decode_cursor(cursor, sort)
+            if scored:
+                conditions.append(f"(score {comparison} ? OR (score = ? AND id {comparison} ?))")
+                params.extend([last_score, last_score, last_id])
+            else:
+                conditions.append(f"id {comparison} ?")
+                params.append(last_id)
+
+        order = 'DESC' if sort == 'desc' else 'ASC'
+        order_by = f"score {order}, id {order}" if scored else f"id {order}"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        columns = 'id, score, payload' if scored else 'id, NULL, payload'
+        query = f"SELECT {columns} FROM {kind} {where} ORDER BY {order_by} LIMIT ?"
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, params + [limit + 1]).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0], sort) if has_more else None
+
+        return {
+            'items': [json.loads(payload) for _, _, payload in rows],
+            'limit': limit,
+            'sort': sort,
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }
+
+    def iter_items(self, kind: str, batch_size: int = 1000, **filters) -> Iterator[Dict[str, Any]]:
+        """全件をページ単位で読み出し（メモリには1ページ分のみ保持）"""
+        cursor = None
+        while True:
+            page = self.page(kind, cursor, batch_size, **filters)
+            yield from page['items']
+            if not page['has_more']:
+                return
+            cursor = page['next_cursor']
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self.exists():
+            raise FileNotFoundError(self.path)
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+
+def encode_cursor(score: Optional[float], row_id: int, sort: str) -> str:
+    """最終行の (スコア, id) を不透明なカーソル文字列にする"""
+    raw = json.dumps([score, row_id, sort], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Optional[float], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, row_id, cursor_sort = json.loads(raw)
+        row_id = int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if cursor_sort != sort:
+        raise ValueError("Cursor was issued for a different sort order")
+    return score, row_id
+
+
+def get_result_store_path(job_dir: str) -> str:
+    return os.path.join(job_dir, RESULT_STORE_FILENAME)
+
+
+def store_summary(stored: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """結果JSON用（実パスは含めない）"""
+    if not stored:
+        return None
+    return {key: value for key, value in stored.items() if key != 'path'}
+
+
+def _insert_batches(connection: sqlite3.Connection, statement: str, rows: Iterable[tuple]) -> int:
+    """一定件数ずつ executemany で挿入"""
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= _WRITE_BATCH_SIZE:
+            connection.executemany(statement, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        connection.executemany(statement, batch)
+        total += len(batch)
+    return total
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
@@ -8,6 +8,8 @@ import time
 import logging
 from collections import defaultdict
 import re
+from utils.logger import performance_logger
+from utils.metrics import CANDIDATE_PAIRS
 
 # ===============================================
 # Stage 1: 同一カード特定システム
@@ -67,6 +69,7 @@ def normalize_value(value, field_type):
     
     return value.lower().strip()
 
+@performance_logger.timed('stage1_identical_cards')
 def find_identical_cards(data_a, data_b, key_fields):
     """同一カードペアを特定"""
     logger = logging.getLogger('identical_cards')
@@ -144,6 +147,9 @@ def find_identical_cards(data_a, data_b, key_fields):
                 })
     
     logger.info(f"同一カード特定完了: {len(identical_pairs)}組")
+    CANDIDATE_PAIRS.inc(len(data_a) * len(data_b), matcher='two_stage', phase='generated')
+    CANDIDATE_PAIRS.inc(len(data_a) * len(data_b), matcher='two_stage', phase='scored')
+    performance_logger.set_attributes(comparisons=len(data_a) * len(data_b), matches=len(identical_pairs))
     
     # データ管理粒度の違いに対応：同一カードの統合
     consolidated_pairs = consolidate_identical_cards(identical_pairs, logger)
@@ -202,6 +208,7 @@ def consolidate_identical_cards(identical_pairs, logger):
 # Stage 2: フィールドマッピング学習システム
 # ===============================================
 
+@performance_logger.timed('stage2_field_mapping')
 def analyze_field_mappings_from_pairs(identical_pairs, headers_a, headers_b):
     """同一カードペアからフィールドマッピングを学習"""
     logger = logging.getLogger('field_mapping')
@@ -310,6 +317,7 @@ def is_id_field_mapping(field_a, field_b):
     
     return False
 
+@performance_logger.timed('cooccurrence_analysis')
 def analyze_cooccurrence_patterns(identical_pairs, headers_a, headers_b, logger):
     """同一カードペア間での値共起パターン分析"""
     import math
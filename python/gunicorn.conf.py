@@ -0,0 +1,117 @@
+"""
+Mercury Mapping Engine - Gunicorn Configuration
+本番サーバー設定（値はすべて環境変数で上書き可能）
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+注意: 分析ジョブ用のプロセスプール（JOB_MAX_WORKERS）は Web ワーカーごとに作られるため、
+分析の最大同時実行数は GUNICORN_WORKERS × JOB_MAX_WORKERS になる。
+ジョブが残っている間は max_requests によるワーカーの入れ替えを見送り、ワーカーが終了した場合は
+そのワーカーが受け付けた未終了のジョブを failed にする。
+"""
+import multiprocessing
+import os
+import sys
+
+# プロジェクトルートをPythonパスに追加
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import Config
+
+_config = Config.get_config(os.getenv('MERCURY_CONFIG', 'production'))
+# init_db() と同じ基準で選ぶDB設定（マスターでのジョブ状態の更新用）
+_db_config_name = 'development' if getattr(_config, 'DEBUG', False) else 'production'
+
+# 待ち受け
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('FLASK_PORT', '5000')}")
+backlog = int(os.getenv('GUNICORN_BACKLOG', '2048'))
+
+# ワーカー（分析本体はジョブ用プロセスで動くため、Webワーカーは I/O 待ちが中心）
+workers = int(os.getenv('GUNICORN_WORKERS', str(min(multiprocessing.cpu_count() + 1, 8))))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+
+# fork 前にアプリと共有データを読み込む（wsgi.preload_shared_data）
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# 一定リクエストごとにワーカーを入れ替え（jitter で一斉再起動を避ける）
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+# タイムアウト（同期分析は JOB_SYNC_TIMEOUT 秒まで結果を待つので、それより長くする）
+timeout = int(os.getenv('GUNICORN_TIMEOUT', str(_config.JOB_SYNC_TIMEOUT + 30)))
+# 終了時に実行中ジョブを待つ時間（JOB_SHUTDOWN_GRACE）より長くする
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', str(_config.JOB_SHUTDOWN_GRACE + 10)))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# ログ
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', _config.LOG_LEVEL.lower())
+
+
+def on_starting(server):
+    """マスター起動時: 前回起動時のメトリクス（METRICS_DIR）を削除し、実行者のいないジョブを failed にする
+
+    期限切れの結果ディレクトリ（RESULT_RETENTION_SECONDS）を定期的に削除するスレッドもここで開始する。
+    """
+    from utils.metrics import get_metrics_registry
+    get_metrics_registry().reset_directory()
+
+    try:
+        from jobs import recover_abandoned_jobs
+        recover_abandoned_jobs(_db_config_name)
+    except Exception as e:
+        server.log.warning(f"⚠️ Abandoned job recovery failed: {e}")
+
+    try:
+        from jobs import start_result_sweeper
+        start_result_sweeper(_db_config_name)
+    except Exception as e:
+        server.log.warning(f"⚠️ Result sweeper failed to start: {e}")
+
+
+def post_fork(server, worker):
+    """fork 直後: プリロード済みのアプリならDBプールをワーカー側で作り直す"""
+    if not server.cfg.preload_app:
+        return
+
+    from wsgi import app, reinit_worker
+    reinit_worker(app)
+    server.log.info(f"🚀 Worker {worker.pid} ready")
+
+
+def pre_request(worker, req):
+    """ジョブ用のプロセスプールはワーカーごとのため、ジョブが残っている間は max_requests による入れ替えを見送る"""
+    if worker.nr + 1 < worker.max_requests:
+        return
+
+    from jobs import has_unfinished_jobs
+    if has_unfinished_jobs():
+        worker.max_requests = worker.nr + 2
+        worker.log.debug(f"Worker {worker.pid} restart deferred: jobs in flight")
+
+
+def worker_exit(server, worker):
+    """ワーカー終了時: ジョブ用のプロセスプールを停止"""
+    try:
+        from wsgi import shutdown_worker
+        shutdown_worker()
+    except Exception as e:
+        server.log.warning(f"⚠️ Worker {worker.pid} shutdown error: {e}")
+
+
+def child_exit(server, worker):
+    """ワーカー終了後（マスター）: 強制終了などで残ったワーカーのジョブを failed にし、
+    終了したプロセスのメトリクスをアーカイブに合算する"""
+    try:
+        from jobs import fail_worker_jobs
+        fail_worker_jobs(worker.pid, _db_config_name)
+    except Exception as e:
+        server.log.warning(f"⚠️ Worker {worker.pid} job cleanup failed: {e}")
+
+    try:
+        from utils.metrics import get_metrics_registry
+        get_metrics_registry().archive_dead_processes()
+    except Exception as e:
+        server.log.warning(f"⚠️ Worker {worker.pid} metrics archive failed: {e}")
@@ -0,0 +1,44 @@
+"""
+Mercury Mapping Engine - Jobs Package
+非同期分析ジョブ
+"""
+from .pipeline import (
+    run_enhanced_analysis, run_flexible_analysis, run_apply_mapping, parse_cascade_thresholds, PipelineError,
+    PIPELINES, SINGLE_FILE_PIPELINES
+)
+from .executor import (
+    JobExecutor, JobCancelled, JobQueueFull, get_job_executor, get_job_dir, get_export_download_url,
+    get_progress_path, get_result_urls, load_job_result, with_result_urls, run_job, run_pipeline,
+    shutdown_job_executor, has_unfinished_jobs, fail_worker_jobs, recover_abandoned_jobs
+)
+from .retention import start_result_sweeper, sweep_expired_results
+
+__version__ = '1.0.0'
+
+__all__ = [
+    'JobExecutor',
+    'JobCancelled',
+    'JobQueueFull',
+    'PipelineError',
+    'PIPELINES',
+    'SINGLE_FILE_PIPELINES',
+    'fail_worker_jobs',
+    'get_job_executor',
+    'get_job_dir',
+    'get_export_download_url',
+    'get_progress_path',
+    'get_result_urls',
+    'has_unfinished_jobs',
+    'load_job_result',
+    'parse_cascade_thresholds',
+    'recover_abandoned_jobs',
+    'run_apply_mapping',
+    'run_enhanced_analysis',
+    'run_flexible_analysis',
+    'run_job',
+    'run_pipeline',
+    'shutdown_job_executor',
+    'start_result_sweeper',
+    'sweep_expired_results',
+    'with_result_urls'
+]
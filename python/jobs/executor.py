@@ -0,0 +1,564 @@
+"""
+Mercury Mapping Engine - Job Executor
+バックグラウンドジョブの投入と実行（専用ワーカープロセスプール）
+"""
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait as wait_futures
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, Optional
+from config.database import DatabaseManager, get_db_config_name, init_worker_db
+from config.settings import Config
+from core.result_export import get_export_path
+from core.result_store import get_result_store_path
+from repositories.job_repository import JobRepository
+from repositories.mapping_rule_repository import MappingRuleRepository
+from repositories.match_result_repository import MatchResultRepository
+from utils.logger import analysis_logger, performance_logger
+from utils.metrics import flush_metrics, get_metrics_registry
+from utils.profiling import (
+    PipelineProfiler, get_profile_dir, get_profile_urls, parse_profile_mode, reserve_profile_slot
+)
+from utils.progress import ProgressEventLog
+from utils.upload_store import get_upload_store
+from .pipeline import PIPELINES, strip_stored_rows
+
+
+class JobCancelled(Exception):
+    """実行中にジョブが取り消された"""
+
+
+def get_job_dir(job_uuid: str) -> str:
+    """ジョブ単位の結果ディレクトリ"""
+    return os.path.join(Config.get_config('default').RESULTS_FOLDER, 'jobs', job_uuid)
+
+
+def get_job_result_path(job_uuid: str) -> str:
+    return os.path.join(get_job_dir(job_uuid), 'result.json')
+
+
+def get_progress_path(job_uuid: str) -> str:
+    """進捗イベントログ（JSON Lines）"""
+    return os.path.join(get_job_dir(job_uuid), 'progress.jsonl')
+
+
+def get_worker_id(pid: Optional[int] = None) -> str:
+    """ジョブを受け付けたWebワーカーの識別子（ホスト名:PID）"""
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def get_export_download_url(job_uuid: str) -> str:
+    return f"/api/jobs/{job_uuid}/export"
+
+
+def get_result_urls(job_uuid: str) -> Dict[str, str]:
+    """結果ストアのページングAPI"""
+    return {
+        'matches_url': f"/api/jobs/{job_uuid}/matches",
+        'unmatched_a_url': f"/api/jobs/{job_uuid}/unmatched?side=a",
+        'unmatched_b_url': f"/api/jobs/{job_uuid}/unmatched?side=b",
+        'mappings_url': f"/api/jobs/{job_uuid}/mappings"
+    }
+
+
+def with_result_urls(job_uuid: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """ダウンロード・ページングURLを追加し、ストア保存済みの全件データを除外"""
+    if result.get('export'):
+        result['export']['download_url'] = get_export_download_url(job_uuid)
+    if result.get('result_store'):
+        result['result_store'].update(get_result_urls(job_uuid))
+    if result.get('profile'):
+        result['profile'].update(get_profile_urls(job_uuid))
+    return strip_stored_rows(result)
+
+
+def _profiler(options: Optional[Dict[str, Any]], profile_dir: Optional[str]):
+    """options['profile'] 指定時のみプロファイラ、それ以外は何もしないコンテキスト"""
+    mode = parse_profile_mode((options or {}).get('profile'))
+    if mode is None or not profile_dir or not reserve_profile_slot():
+        return nullcontext()
+    return PipelineProfiler(profile_dir, mode)
+
+
+def load_job_result(job_uuid: str) -> Optional[Dict[str, Any]]:
+    """保存済みのジョブ結果を読み込み"""
+    path = get_job_result_path(job_uuid)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class _JobProgress:
+    """進捗イベントをジョブの進捗ログ（SSE配信用）に記録し、
+    ジョブテーブルへは一定間隔でのみ反映する（取り消しもその際に検知）"""
+
+    def __init__(self, repository: JobRepository, job_uuid: str, min_db_interval: Optional[float] = None):
+        self.repository = repository
+        self.job_uuid = job_uuid
+        self.min_db_interval = min_db_interval if min_db_interval is not None \
+            else Config.get_config('default').JOB_PROGRESS_DB_INTERVAL
+        self.event_log = ProgressEventLog(get_progress_path(job_uuid))
+        self._last_db_update = 0.0
+
+    def __call__(self, percent: int, message: str, **details):
+        self.event_log.append(percent, message, **details)
+
+        now = time.time()
+        if now - self._last_db_update < self.min_db_interval and percent < 100:
+            return
+        self._last_db_update = now
+
+        if self.repository.get_status(self.job_uuid) == 'cancelled':
+            raise JobCancelled(self.job_uuid)
+        self.repository.update_progress(self.job_uuid, percent, message)
+        analysis_logger.logger.info(f"⏳ Job {self.job_uuid}: {percent}% {message}")
+
+
+def run_job(job_uuid: str, kind: str, file_a_path: str, file_b_path: str,
+            options: Optional[Dict[str, Any]] = None):
+    """ジョブ本体（ワーカーで実行）
+
+    file_a_path / file_b_path はファイルパスまたは sha256:<hash> 参照。
+    options['save_mapping_rules'] 指定時は generated_rules をジョブのカテゴリ・会社ペアのルールセットとして保存する。
+    マッチ結果は MATCH_RESULT_PERSIST（options['persist_matches'] で上書き可）が有効なら mercury_match_result へ保存する。
+    options['profile']（deterministic / sampling）指定時はパイプラインのプロファイルをジョブディレクトリに保存する。
+    """
+    repository = JobRepository()
+
+    if not repository.mark_running(job_uuid):
+        analysis_logger.logger.info(f"⏭️ Job {job_uuid} skipped (not pending)")
+        return
+
+    analysis_logger.logger.info(f"🚀 Job {job_uuid} started: kind={kind}")
+    start_time = time.time()
+
+    try:
+        # sha256:<hash> 参照はアップロード保存領域の実パスに変換
+        upload_store = get_upload_store()
+        job_dir = get_job_dir(job_uuid)
+        # マッチング結果CSV・結果ストアはジョブディレクトリに出力
+        pipeline_options = {
+            **(options or {}),
+            'export_path': get_export_path(job_dir),
+            'result_store_path': get_result_store_path(job_dir)
+        }
+        pipeline = PIPELINES[kind]
+        with performance_logger.span(f"job_{kind}", job_uuid=job_uuid), \
+                _profiler(options, get_profile_dir(job_dir)) as profiler:
+            result = pipeline(upload_store.resolve(file_a_path), upload_store.resolve(file_b_path),
+                              pipeline_options, progress=_JobProgress(repository, job_uuid))
+        if profiler is not None and profiler.summary is not None:
+            result['profile'] = profiler.summary
+        persist_matches = (options or {}).get('persist_matches', Config.get_config('default').MATCH_RESULT_PERSIST)
+        if persist_matches:
+            match_persistence = _persist_matches(repository, job_uuid, result)
+            if match_persistence is not None:
+                result['match_persistence'] = match_persistence
+        # 全件のマッチは結果ストアから取得するため result.json には含めない
+        result = with_result_urls(job_uuid, result)
+        if (options or {}).get('save_mapping_rules'):
+            result['saved_rules'] = _save_mapping_rules(repository, job_uuid, result)
+
+        # 結果をジョブディレクトリに保存
+        os.makedirs(job_dir, exist_ok=True)
+        result_path = get_job_result_path(job_uuid)
+        tmp_path = f"{result_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, result_path)
+
+        elapsed = time.time() - start_time
+        counts = result.get('counts', {})
+        repository.mark_completed(
+            job_uuid, counts, result_path,
+            result_url=f"/api/jobs/{job_uuid}/result",
+            log_message=f"completed in {elapsed:.1f}s: {counts.get('matched_records', 0)} matches"
+        )
+        analysis_logger.logger.info(f"✅ Job {job_uuid} completed ({elapsed:.2f}秒)")
+
+    except JobCancelled:
+        analysis_logger.logger.info(f"🛑 Job {job_uuid} cancelled")
+
+    except Exception as e:
+        analysis_logger.log_error('job_execution', f"{job_uuid}: {e}\n{traceback.format_exc()}")
+        repository.mark_failed(job_uuid, str(e))
+
+    finally:
+        # ジョブ単位でメトリクスを書き出し（/api/metrics で Web プロセスから集計）
+        flush_metrics()
+
+
+def _save_mapping_rules(repository: JobRepository, job_uuid: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """生成ルールをルールセットとして保存（失敗してもジョブは完了扱い）"""
+    rules = (result.get('generated_rules') or {}).get('rules')
+    if rules is None:
+        return None
+    try:
+        job = repository.get_job(job_uuid)
+        return MappingRuleRepository(repository.db).save_rule_set(
+            job['category2_id'], job['company_a_id'], job['company_b_id'], rules, source_job_uuid=job_uuid
+        )
+    except Exception as e:
+        analysis_logger.log_error('mapping_rule_save', f"{job_uuid}: {e}")
+        return {'error': str(e)}
+
+
+def _persist_matches(repository: JobRepository, job_uuid: str, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """マッチ結果をDBへ一括保存（失敗してもジョブは完了扱い）"""
+    matches = result.get('card_matches')
+    if matches is None:
+        matches = result.get('matches')
+    if matches is None:
+        return None
+    try:
+        job_id = repository.get_job_id(job_uuid)
+        default_method = (result.get('parameters') or {}).get('similarity_mode') or result.get('analysis_type')
+        return MatchResultRepository(repository.db).write_matches(job_id, matches, default_method=default_method)
+    except Exception as e:
+        analysis_logger.log_error('match_result_save', f"{job_uuid}: {e}")
+        return {'error': str(e)}
+
+
+def run_pipeline(kind: str, file_a_path: str, file_b_path: str,
+                 options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """ジョブテーブルを使わない同期分析（ワーカープロセスで実行して結果を返す）
+
+    options['result_store_path'] 指定時は、ストア保存済みの全件データを返さない
+    （プロセス間で巨大な結果を受け渡さない）。
+    options['profile'] と options['profile_dir'] 指定時はプロファイルを profile_dir に保存する。
+    """
+    upload_store = get_upload_store()
+    try:
+        with performance_logger.span(f"sync_{kind}"), \
+                _profiler(options, (options or {}).get('profile_dir')) as profiler:
+            result = PIPELINES[kind](upload_store.resolve(file_a_path), upload_store.resolve(file_b_path),
+                                     options or {})
+        if profiler is not None and profiler.summary is not None:
+            result['profile'] = profiler.summary
+    finally:
+        flush_metrics()
+    return strip_stored_rows(result)
+
+
+def _init_worker(db_config_name: Optional[str], log_level: str):
+    """ワーカープロセス初期化（DBプール・ログ・メトリクスを子プロセス側で作り直す）"""
+    get_metrics_registry().reset()
+    performance_logger.reset_stats()
+    logging.basicConfig(level=getattr(logging, log_level, logging.INFO),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        init_worker_db(db_config_name)
+    except Exception as e:
+        # DBなしでも同期分析（run_pipeline）は実行できる
+        analysis_logger.log_error('worker_db_init', str(e))
+
+
+class JobQueueFull(Exception):
+    """実行中 + 待機中のジョブが上限に達している"""
+
+    def __init__(self, queue_position: int, queue_size: int, retry_after: int):
+        super().__init__(f"Job queue is full ({queue_size} waiting)")
+        self.queue_position = queue_position
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'queue_position': self.queue_position,
+            'queue_size': self.queue_size,
+            'retry_after': self.retry_after
+        }
+
+
+class JobExecutor:
+    """ワーカープロセスプールと実行待ちキューの管理
+
+    同時実行数は max_workers、待機できる件数は queue_size まで。
+    上限を超えた投入は JobQueueFull で拒否する（API側で 429 に変換）。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 repository: Optional[JobRepository] = None):
+        config = Config.get_config('default')
+        self.max_workers = max_workers or config.JOB_MAX_WORKERS
+        self.queue_size = config.JOB_QUEUE_SIZE if queue_size is None else queue_size
+        self.retry_after = config.JOB_RETRY_AFTER
+        self.sync_timeout = config.JOB_SYNC_TIMEOUT
+        self.shutdown_grace = config.JOB_SHUTDOWN_GRACE
+        self.repository = repository or JobRepository()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(config.JOB_START_METHOD),
+            initializer=_init_worker,
+            initargs=(get_db_config_name(), config.LOG_LEVEL)
+        )
+        # 投入順に保持（先頭 max_workers 件が実行中、残りが待機中）
+        self._in_flight: 'OrderedDict[str, Future]' = OrderedDict()
+        # DB登録中で、まだ Future を持たない投入の数（上限チェックに含める）
+        self._reserved = 0
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0, 'cancelled': 0}
+
+    def submit(self, kind: str, file_a_path: str, file_b_path: str, options: Optional[Dict[str, Any]] = None,
+               category2_id: Optional[int] = None, company_a_id: Optional[int] = None,
+               company_b_id: Optional[int] = None, created_by: Optional[str] = None) -> str:
+        """ジョブを登録してワーカーに投入し、job_uuid を即座に返す"""
+        if kind not in PIPELINES:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_uuid = str(uuid.uuid4())
+        with self._lock:
+            # 満杯なら DB に登録する前に拒否し、空きがあれば枠だけ確保する
+            self._check_capacity()
+            self._reserved += 1
+
+        # DB への登録はロックの外で行う（他の投入・状態取得を待たせない）
+        try:
+            config = Config.get_config('default')
+            category2_id = category2_id or config.DEFAULT_CATEGORY2_ID
+            company_a_id = company_a_id or self.repository.resolve_company_id(config.DEFAULT_COMPANY_A_CODE)
+            company_b_id = company_b_id or self.repository.resolve_company_id(config.DEFAULT_COMPANY_B_CODE)
+            self.repository.create_job(
+                job_uuid,
+                category2_id,
+                company_a_id,
+                company_b_id,
+                file_a_path, file_b_path,
+                mapping_options={'kind': kind, **(options or {})},
+                created_by=created_by,
+                worker_id=get_worker_id()
+            )
+        except Exception:
+            with self._lock:
+                self._reserved -= 1
+            raise
+
+        # 正規化ルール・マッピングルールの選択用にカテゴリと会社ペアをパイプラインに渡す
+        job_options = {**(options or {}), 'category2_id': category2_id,
+                       'company_a_id': company_a_id, 'company_b_id': company_b_id}
+        with self._lock:
+            self._reserved -= 1
+            self._track(job_uuid, self._executor.submit(run_job, job_uuid, kind, file_a_path, file_b_path, job_options))
+
+        analysis_logger.logger.info(f"📥 Job {job_uuid} submitted: kind={kind}, queue_position={self.queue_position(job_uuid)}")
+        return job_uuid
+
+    def run(self, kind: str, file_a_path: str, file_b_path: str,
+            options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """同期分析をワーカープロセスで実行して結果を待つ（キュー上限は submit と共通）"""
+        if kind not in PIPELINES:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        key = f"sync-{uuid.uuid4()}"
+        with self._lock:
+            self._check_capacity()
+            future = self._executor.submit(run_pipeline, kind, file_a_path, file_b_path, options)
+            self._track(key, future)
+
+        return future.result(timeout=timeout or self.sync_timeout)
+
+    def cancel(self, job_uuid: str) -> bool:
+        """取り消し（待機中はキューから外し、実行中のジョブは次の進捗報告時に停止）"""
+        cancelled = self.repository.mark_cancelled(job_uuid)
+        with self._lock:
+            future = self._in_flight.get(job_uuid)
+        if cancelled and future is not None:
+            future.cancel()
+        return cancelled
+
+    def queue_position(self, job_uuid: str) -> Optional[int]:
+        """待機中ジョブの順番（1始まり、実行中・未追跡なら None）"""
+        with self._lock:
+            self._prune()
+            keys = list(self._in_flight)
+        if job_uuid not in keys:
+            return None
+        position = keys.index(job_uuid) - self.max_workers + 1
+        return position if position > 0 else None
+
+    def in_flight_count(self) -> int:
+        """実行中 + 待機中 + 登録中のジョブ数"""
+        with self._lock:
+            self._prune()
+            return len(self._in_flight) + self._reserved
+
+    def get_stats(self) -> Dict[str, Any]:
+        """プールの利用状況"""
+        with self._lock:
+            self._prune()
+            in_flight = len(self._in_flight)
+            return {
+                **self._stats,
+                'max_workers': self.max_workers,
+                'queue_size': self.queue_size,
+                'running': min(in_flight, self.max_workers),
+                'queued': max(0, in_flight - self.max_workers),
+                'saturated': in_flight + self._reserved >= self.max_workers + self.queue_size
+            }
+
+    def shutdown(self, wait: bool = True, grace: Optional[float] = None):
+        """プールを停止
+
+        wait=False では待機中のジョブを取り消し（_on_done で failed に更新）、実行中のジョブは
+        grace 秒（既定は JOB_SHUTDOWN_GRACE）まで完了を待つ。終わらなければ failed にして子プロセスを終了する。
+        """
+        if wait:
+            self._executor.shutdown(wait=True)
+            return
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            running = {key: future for key, future in self._in_flight.items() if not future.done()}
+        grace = self.shutdown_grace if grace is None else grace
+        if running and grace > 0:
+            analysis_logger.logger.info(f"⏳ Waiting up to {grace}秒 for {len(running)} running job(s)")
+            wait_futures(list(running.values()), timeout=grace)
+
+        unfinished = [key for key, future in running.items() if not future.done()]
+        if not unfinished:
+            return
+        for key in unfinished:
+            analysis_logger.log_error('job_worker', f"{key}: web worker shut down before the job finished")
+            if not key.startswith('sync-'):
+                try:
+                    self.repository.mark_failed(key, "Web worker shut down before the job finished")
+                except Exception as e:
+                    analysis_logger.log_error('job_worker', f"failed to mark {key} as failed: {e}")
+        # 実行中の子プロセスを残さない（ProcessPoolExecutor に子プロセスを終了する公開APIがない）
+        for process in list((getattr(self._executor, '_processes', None) or {}).values()):
+            process.terminate()
+
+    def _check_capacity(self):
+        """上限チェック（呼び出し側でロック取得済み）"""
+        self._prune()
+        in_flight = len(self._in_flight) + self._reserved
+        if in_flight >= self.max_workers + self.queue_size:
+            self._stats['rejected'] += 1
+            raise JobQueueFull(
+                queue_position=in_flight - self.max_workers + 1,
+                queue_size=self.queue_size,
+                retry_after=self.retry_after
+            )
+
+    def _track(self, key: str, future: Future):
+        """投入済み Future を登録（呼び出し側でロック取得済み）"""
+        self._in_flight[key] = future
+        self._stats['submitted'] += 1
+        future.add_done_callback(lambda f: self._on_done(key, f))
+
+    def _on_done(self, key: str, future: Future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if future.cancelled():
+                self._stats['cancelled'] += 1
+            elif future.exception() is None:
+                self._stats['completed'] += 1
+                return
+            else:
+                self._stats['failed'] += 1
+
+        if future.cancelled():
+            # 開始前に取り消された（API での取り消しは cancelled のまま、停止時の取り消しは failed にする）
+            message = "Job was cancelled before a worker started it"
+        else:
+            # ワーカープロセス異常終了など run_job 内で処理できなかった失敗
+            message = f"Worker error: {future.exception()}"
+        analysis_logger.log_error('job_worker', f"{key}: {message}")
+        if not key.startswith('sync-'):
+            try:
+                self.repository.mark_failed(key, message)
+            except Exception as e:
+                analysis_logger.log_error('job_worker', f"failed to mark {key} as failed: {e}")
+
+    def _prune(self):
+        """完了済みの Future を除去（呼び出し側でロック取得済み）"""
+        for key in [key for key, future in self._in_flight.items() if future.done()]:
+            del self._in_flight[key]
+
+
+_job_executor: Optional[JobExecutor] = None
+_job_executor_lock = threading.Lock()
+
+
+def get_job_executor() -> JobExecutor:
+    """プロセス共通の JobExecutor を取得（初回呼び出し時に作成）"""
+    global _job_executor
+    if _job_executor is None:
+        with _job_executor_lock:
+            if _job_executor is None:
+                _job_executor = JobExecutor()
+    return _job_executor
+
+
+def shutdown_job_executor(wait: bool = False):
+    """作成済みの JobExecutor を停止（Webワーカー終了時に子プロセスを残さない）"""
+    global _job_executor
+    with _job_executor_lock:
+        executor, _job_executor = _job_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def has_unfinished_jobs() -> bool:
+    """このプロセスに未完了のジョブがあるか（JobExecutor を作成していなければ False）"""
+    executor = _job_executor
+    return executor is not None and executor.in_flight_count() > 0
+
+
+@contextmanager
+def _standalone_job_repository(db_config_name: Optional[str]) -> Iterator[JobRepository]:
+    """gunicorn マスター用の一時的な JobRepository（fork 先に接続を残さないよう使用後に切断）"""
+    manager = DatabaseManager(db_config_name or get_db_config_name() or 'default', pool_size=1)
+    try:
+        yield JobRepository(manager)
+    finally:
+        manager.close()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def fail_worker_jobs(pid: int, db_config_name: Optional[str] = None) -> int:
+    """終了したWebワーカーが受け付けた未終了のジョブを failed にする（gunicorn マスターの child_exit 用）"""
+    with _standalone_job_repository(db_config_name) as repository:
+        failed = repository.fail_worker_jobs(get_worker_id(pid), "Web worker exited before the job finished")
+    if failed:
+        analysis_logger.logger.warning(f"⚠️ Marked {failed} job(s) of exited worker {pid} as failed")
+    return failed
+
+
+def recover_abandoned_jobs(db_config_name: Optional[str] = None) -> int:
+    """どのWebワーカーも実行していない pending / running のジョブを failed にする（gunicorn マスター起動時用）
+
+    対象はこのホストのジョブのうち受け付けたワーカーのプロセスが存在しないものと、worker_id のないもの。
+    他ホストのジョブはそのホストのマスターに任せる。
+    """
+    hostname = socket.gethostname()
+    recovered = 0
+    with _standalone_job_repository(db_config_name) as repository:
+        for job in repository.list_unfinished_jobs():
+            if job['worker_id']:
+                host, _, pid = job['worker_id'].rpartition(':')
+                if host != hostname or (pid.isdigit() and _pid_alive(int(pid))):
+                    continue
+            repository.mark_failed(job['job_uuid'], "Job was abandoned: no running web worker owns it")
+            recovered += 1
+    if recovered:
+        analysis_logger.logger.warning(f"⚠️ Marked {recovered} abandoned job(s) as failed")
+    return recovered
@@ -0,0 +1,544 @@
+"""
+Mercury Mapping Engine - Analysis Pipelines
+分析パイプライン（同期API・Webページ・バックグラウンドジョブ共通）
+"""
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+from config.settings import Config
+from core import get_mapping_engine
+from core.flexible_matching import flexible_enhanced_matching
+from core.mapping_applier import MappingPlanError, apply_mapping_file, build_plan_spec
+from core.normalization import get_normalizer
+from core.claude_mapping import claude_field_mapping_analysis, match_cards_with_claude_mappings, prepare_mapping_columns
+from core.result_export import export_matches_to_file, export_summary
+from core.result_store import ResultStore, store_summary
+from utils.logger import analysis_logger
+from utils.progress import ProgressCallback, StageProgress
+
+
+class PipelineError(Exception):
+    """入力不備などでパイプラインを継続できない場合のエラー"""
+
+
+def _report(progress: Optional[ProgressCallback], percent: int, message: str, **details):
+    if progress:
+        progress(percent, message, **details)
+
+
+def parse_cascade_thresholds(options: Dict[str, Any]) -> Dict[str, float]:
+    """options 中のカスケード閾値を検証して float で返す（指定がなければ空、不正値は PipelineError）"""
+    thresholds = {}
+    for key in ('cascade_lower_threshold', 'cascade_upper_threshold'):
+        if options.get(key) is None:
+            continue
+        try:
+            value = float(options[key])
+        except (TypeError, ValueError):
+            raise PipelineError(f"Invalid {key}: {options[key]}")
+        if not 0.0 <= value <= 1.0:
+            raise PipelineError(f"{key} must be between 0 and 1: {value}")
+        thresholds[key] = value
+
+    defaults = Config.get_analysis_config()
+    lower = thresholds.get('cascade_lower_threshold', defaults['cascade_lower_threshold'])
+    upper = thresholds.get('cascade_upper_threshold', defaults['cascade_upper_threshold'])
+    if lower > upper:
+        raise PipelineError(
+            f"cascade_lower_threshold ({lower}) must not be greater than cascade_upper_threshold ({upper})"
+        )
+    return thresholds
+
+
+def run_enhanced_analysis(file_a_path: str, file_b_path: str, options: Optional[Dict[str, Any]] = None,
+                          progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """カードベース分析パイプライン（/api/analyze/enhanced 相当）
+
+    options: confidence_threshold, max_rows, similarity_mode, ai_model,
+             cascade_lower_threshold, cascade_upper_threshold,
+             category2_id（指定時はカテゴリの正規化ルールを適用）,
+             export_path（指定時はマッチング結果CSVを出力）,
+             result_store_path（指定時はページング用の結果ストアに保存）
+    """
+    options = options or {}
+    confidence_threshold = options.get('confidence_threshold', 0.8)
+    max_rows = options.get('max_rows', 1000)
+    similarity_mode = options.get('similarity_mode', 'library')
+    ai_model = options.get('ai_model', 'claude-3-haiku-20240307')
+
+    if similarity_mode not in ('library', 'ai', 'cascade'):
+        raise PipelineError(f"Invalid similarity_mode: {similarity_mode}")
+
+    # エンジン初期化
+    config = Config.get_analysis_config()
+    config['csv_max_rows'] = max_rows
+    config.update(parse_cascade_thresholds(options))
+    engine = get_mapping_engine(config)
+
+    # AI Manager初期化（ai / cascade モードの場合）
+    ai_manager = None
+    if similarity_mode in ('ai', 'cascade'):
+        from ai import create_ai_manager
+        ai_manager = create_ai_manager({'claude_config': {'default_model': ai_model}})
+
+    _report(progress, 5, 'CSV分析開始', stage='csv_analysis')
+    csv_result = engine.analyze_csv_files(file_a_path, file_b_path, full_analysis=True)
+    if 'error' in csv_result:
+        raise PipelineError(f"CSV analysis failed: {csv_result['error']}")
+
+    analysis_a = csv_result['analysis_a']
+    analysis_b = csv_result['analysis_b']
+    _apply_normalization(options, analysis_a, analysis_b)
+
+    # カードベース分析実行（カスケード各段の解決数を集計）
+    _report(progress, 20, 'カードマッチング開始', stage='card_matching')
+    tier_stats = {}
+    enhanced_mappings, card_matches = engine.analyze_card_based_mapping(
+        analysis_a['headers'],
+        analysis_b['headers'],
+        analysis_a['sample_data'],
+        analysis_b['sample_data'],
+        analysis_a.get('full_data'),
+        analysis_b.get('full_data'),
+        similarity_mode=similarity_mode,
+        ai_manager=ai_manager,
+        tier_stats=tier_stats,
+        progress_callback=StageProgress(progress, 'card_matching', 20, 80)
+    )
+
+    _report(progress, 80, 'マッチング結果CSV出力', stage='export')
+    export = _export_matches(options, analysis_a, analysis_b, card_matches)
+    stored = _store_results(options, analysis_a, analysis_b, card_matches, enhanced_mappings)
+
+    _report(progress, 85, 'マッピングサマリー作成', stage='summary')
+    mapping_summary = engine.create_mapping_summary(enhanced_mappings, card_matches, analysis_a, analysis_b)
+    validation_result = engine.validate_mapping_results(enhanced_mappings, card_matches)
+    mapping_rules = engine.export_mapping_rules(enhanced_mappings, confidence_threshold)
+
+    analysis_logger.logger.info(f"Enhanced analysis completed: {len(card_matches)} matches, {len(enhanced_mappings)} mappings")
+
+    return {
+        'analysis_type': 'enhanced',
+        'parameters': {
+            'confidence_threshold': confidence_threshold,
+            'max_rows': max_rows,
+            'similarity_mode': similarity_mode
+        },
+        'file_analysis': {
+            'file_a': _file_info(file_a_path, analysis_a),
+            'file_b': _file_info(file_b_path, analysis_b)
+        },
+        'card_matching': {
+            'total_matches': len(card_matches),
+            'match_quality': engine.card_matcher.analyze_match_quality(card_matches),
+            'tier_stats': tier_stats,
+            'sample_matches': card_matches[:5]  # 上位5件のみ
+        },
+        'field_mappings': {
+            'total_mappings': len(enhanced_mappings),
+            'high_confidence_mappings': [m for m in enhanced_mappings if m['confidence'] >= confidence_threshold],
+            'all_mappings': enhanced_mappings
+        },
+        'mapping_summary': mapping_summary,
+        'validation': validation_result,
+        'generated_rules': mapping_rules,
+        'export': export_summary(export),
+        'result_store': store_summary(stored),
+        'card_matches': card_matches,
+        'counts': _match_counts(analysis_a, analysis_b, card_matches)
+    }
+
+
+def run_flexible_analysis(file_a_path: str, file_b_path: str, options: Optional[Dict[str, Any]] = None,
+                          progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """柔軟マッチング分析パイプライン（/test/files/enhanced 相当）
+
+    options: similarity_mode ('library' / 'claude_mapping'), max_sample_size, full_analysis, ai_model,
+             category2_id（指定時はカテゴリの正規化ルールを適用）,
+             export_path（指定時はマッチング結果CSVを出力）,
+             result_store_path（指定時はページング用の結果ストアに保存）
+    """
+    options = options or {}
+    similarity_mode = options.get('similarity_mode', 'library')
+    max_sample_size = int(options.get('max_sample_size', 0))  # 0 = 無制限
+    full_analysis = options.get('full_analysis', True)
+    ai_model = options.get('ai_model', 'claude-sonnet-4-20250514')
+
+    # 共有MappingEngineを取得（同じ設定ならプロセス内で再利用）
+    analysis_logger.logger.info("🔧 Step 2: MappingEngine初期化開始")
+    config = Config.get_analysis_config()
+    engine = get_mapping_engine(config)
+    analysis_logger.logger.info("✅ MappingEngine初期化完了")
+
+    # CSV分析
+    analysis_logger.logger.info("📊 Step 3: CSV分析開始")
+    _report(progress, 5, 'CSV分析開始', stage='csv_analysis')
+    start_time = time.time()
+
+    csv_result = engine.analyze_csv_files(file_a_path, file_b_path, full_analysis=full_analysis)
+
+    csv_time = time.time() - start_time
+    analysis_logger.logger.info(f"✅ CSV分析完了 ({csv_time:.2f}秒)")
+
+    if 'error' in csv_result:
+        analysis_logger.logger.error(f"❌ CSV分析エラー: {csv_result['error']}")
+        raise PipelineError(csv_result['error'])
+
+    analysis_a = csv_result['analysis_a']
+    analysis_b = csv_result['analysis_b']
+    _apply_normalization(options, analysis_a, analysis_b)
+
+    analysis_logger.logger.info(f"📋 CSV分析結果:")
+    analysis_logger.logger.info(f"   - A社: {len(analysis_a['headers'])}フィールド, {analysis_a['total_rows']}行")
+    analysis_logger.logger.info(f"   - B社: {len(analysis_b['headers'])}フィールド, {analysis_b['total_rows']}行")
+    analysis_logger.logger.info(f"   - A社ヘッダー: {analysis_a['headers'][:5]}...")
+    analysis_logger.logger.info(f"   - B社ヘッダー: {analysis_b['headers'][:5]}...")
+
+    # 🚀 2段階マッチングシステム実行（高速化版）
+    analysis_logger.logger.info("🚀 Step 4: 2段階マッチングシステム開始")
+    _report(progress, 20, 'マッチング開始', stage='matching')
+    start_time = time.time()
+    matching_progress = StageProgress(progress, 'matching', 20, 80)
+
+    card_analysis_error = None
+    data_a = analysis_a.get('full_data', analysis_a['sample_data'])
+    data_b = analysis_b.get('full_data', analysis_b['sample_data'])
+
+    try:
+        analysis_logger.logger.info(f"📊 マッチング対象データ:")
+        analysis_logger.logger.info(f"   - A社データ: {len(data_a)}行")
+        analysis_logger.logger.info(f"   - B社データ: {len(data_b)}行")
+        analysis_logger.logger.info(f"   - 新手法: AI/文字列類似度による柔軟なデータマッチング")
+
+        matches = None
+        # Claude Mapping Modeの場合は先にフィールドマッピングを取得
+        if similarity_mode == 'claude_mapping':
+            analysis_logger.logger.info("🧠 Claude APIフィールドマッピング分析開始")
+            # 高信頼度マッピングが届いた時点で照合用の正規化カラムを先行作成
+            normalized_columns = {}
+            claude_mappings = claude_field_mapping_analysis(
+                analysis_a['headers'],
+                analysis_b['headers'],
+                data_a[:10],  # サンプルデータ
+                data_b[:10],
+                ai_model,  # 選択されたモデルを渡す
+                on_mapping=lambda mapping: prepare_mapping_columns(
+                    mapping, data_a, data_b, max_sample_size, normalized_columns
+                )
+            )
+
+            if claude_mappings:
+                analysis_logger.logger.info(f"✅ Claude マッピング取得: {len(claude_mappings)}件")
+                # Claudeマッピングを使って同一カード特定
+                matches = match_cards_with_claude_mappings(
+                    data_a, data_b, claude_mappings, max_sample_size,
+                    normalized_columns=normalized_columns,
+                    progress_callback=matching_progress
+                )
+                # enhanced_mappingsを辞書形式で作成
+                enhanced_mappings = {
+                    'flexible_field_mappings': claude_mappings,
+                    'matching_strategy': 'claude_mapping',
+                    'similarity_threshold': 0.8,
+                    'total_comparisons': len(data_a) * len(data_b),
+                    'match_count': len(matches)
+                }
+            else:
+                analysis_logger.logger.warning("⚠️ Claude マッピング失敗、従来手法にフォールバック")
+
+        if matches is None:
+            # 柔軟マッチング実行 (AI/文字列類似度ベース)
+            matches, enhanced_mappings = flexible_enhanced_matching(
+                data_a,
+                data_b,
+                analysis_a['headers'],
+                analysis_b['headers'],
+                max_sample_size=max_sample_size,
+                progress_callback=matching_progress
+            )
+
+        matching_time = time.time() - start_time
+        analysis_logger.logger.info(f"✅ 柔軟マッチング完了 ({matching_time:.2f}秒)")
+        # enhanced_mappingsは辞書形式で返される
+        field_mappings = enhanced_mappings.get('flexible_field_mappings', [])
+        analysis_logger.logger.info(f"🎯 結果: {len(matches)}件の同一カード, {len(field_mappings)}件のフィールドマッピング")
+
+        # フィールドマッピングは柔軟マッチングで既に完了
+        analysis_logger.logger.info("✅ Step 5: フィールドマッピング分析は柔軟マッチングで完了済み")
+        analysis_logger.logger.info(f"   - 戦略: {enhanced_mappings.get('matching_strategy', 'unknown')}")
+        analysis_logger.logger.info(f"   - 類似度閾値: {enhanced_mappings.get('similarity_threshold', 0.0)}")
+        analysis_logger.logger.info(f"   - 総比較回数: {enhanced_mappings.get('total_comparisons', 0):,}回")
+
+        card_analysis_success = True
+
+    except Exception as e:
+        analysis_logger.logger.error(f"❌ Brute Force分析エラー: {e}")
+        analysis_logger.logger.error(f"   - エラー詳細: {traceback.format_exc()}")
+        enhanced_mappings = {'flexible_field_mappings': [], 'matching_strategy': 'error', 'match_count': 0}
+        matches = []
+        card_analysis_success = False
+        card_analysis_error = str(e)
+
+    export = None
+    stored = None
+    if card_analysis_success:
+        _report(progress, 80, 'マッチング結果CSV出力', stage='export')
+        export = _export_matches(options, analysis_a, analysis_b, matches)
+        stored = _store_results(options, analysis_a, analysis_b, matches, normalize_field_mappings(
+            enhanced_mappings.get('flexible_field_mappings', [])
+        ))
+
+    # マッピングサマリー作成（詳細ログ付き）
+    analysis_logger.logger.info("📋 Step 6: マッピングサマリー作成開始")
+    _report(progress, 85, 'マッピングサマリー作成', stage='summary')
+    start_time = time.time()
+
+    mapping_summary = None
+    validation_result = None
+    if enhanced_mappings and isinstance(enhanced_mappings, dict):
+        try:
+            mapping_list = normalize_field_mappings(enhanced_mappings.get('flexible_field_mappings', []))
+            analysis_logger.logger.info(f"   - enhanced_mappings: {len(mapping_list)}件")
+            analysis_logger.logger.info(f"   - matches: {len(matches)}件")
+
+            mapping_summary = engine.create_mapping_summary(mapping_list, matches, analysis_a, analysis_b)
+            validation_result = engine.validate_mapping_results(mapping_list, matches)
+
+            analysis_logger.logger.info("✅ マッピングサマリー作成完了")
+        except Exception as e:
+            analysis_logger.logger.error(f"❌ マッピングサマリー作成エラー: {e}")
+            analysis_logger.logger.error(f"   - エラー詳細: {traceback.format_exc()}")
+    else:
+        analysis_logger.logger.info("   - マッピングなし: サマリー作成スキップ")
+
+    summary_time = time.time() - start_time
+    analysis_logger.logger.info(f"✅ マッピングサマリー完了 ({summary_time:.2f}秒)")
+
+    return {
+        'analysis_type': 'flexible',
+        'parameters': {
+            'similarity_mode': similarity_mode,
+            'max_sample_size': max_sample_size,
+            'full_analysis': full_analysis,
+            'ai_model': ai_model
+        },
+        'analysis_a': analysis_a,
+        'analysis_b': analysis_b,
+        'enhanced_mappings': enhanced_mappings,
+        'matches': matches,
+        'card_analysis_success': card_analysis_success,
+        'card_analysis_error': card_analysis_error,
+        'mapping_summary': mapping_summary,
+        'validation': validation_result,
+        'export': export_summary(export),
+        'result_store': store_summary(stored),
+        'counts': _match_counts(analysis_a, analysis_b, matches)
+    }
+
+
+def normalize_field_mappings(field_mappings: List[Any]) -> List[Dict[str, Any]]:
+    """柔軟マッチング/Claudeのマッピングをマッピングエンジン形式に変換"""
+    mapping_list = []
+    for mapping in field_mappings:
+        # タプル形式と辞書形式の両方に対応
+        if isinstance(mapping, (list, tuple)) and len(mapping) >= 3:
+            # タプル形式: (field_a, field_b, score)
+            mapping_list.append({
+                'field_a': mapping[0],
+                'field_b': mapping[1],
+                'confidence': mapping[2],
+                'field_type': 'flexible',
+                'sample_count': 'auto'
+            })
+        elif isinstance(mapping, dict):
+            # 辞書形式（Claude APIから）
+            mapping_list.append({
+                'field_a': mapping.get('field_a', ''),
+                'field_b': mapping.get('field_b', ''),
+                'confidence': mapping.get('confidence', 0),
+                'field_type': mapping.get('field_type', 'claude_api_analysis'),
+                'sample_count': mapping.get('sample_count', 'auto')
+            })
+    return mapping_list
+
+
+def run_apply_mapping(file_a_path: str, file_b_path: str, options: Optional[Dict[str, Any]] = None,
+                      progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """保存済みマッピングルールで変換元ファイル全体を変換するパイプライン
+
+    options: source ('b' / 'a'、変換元の会社。既定 'b'), target ('common' / 'a' / 'b'、出力レイアウト),
+             category2_id, company_a_id, company_b_id（ルールセットの指定）,
+             rules（指定時は保存済みルールの代わりに使用）, chunk_bytes, workers,
+             export_path（出力先。必須）
+    """
+    options = options or {}
+    source = options.get('source', 'b')
+    target = options.get('target', 'common')
+    output_path = options.get('export_path')
+    if not output_path:
+        raise PipelineError("export_path is required for apply_mapping")
+
+    rules = options.get('rules')
+    if rules is None:
+        from repositories.mapping_rule_repository import MappingRuleRepository
+        try:
+            key = tuple(int(options[field]) for field in ('category2_id', 'company_a_id', 'company_b_id'))
+        except (KeyError, TypeError, ValueError):
+            raise PipelineError("category2_id, company_a_id and company_b_id are required for apply_mapping")
+        # 保存直後のルールで実行できるよう、プロセス内キャッシュは使わない
+        rules = MappingRuleRepository().get_rules(*key, use_cache=False)
+
+    try:
+        spec = build_plan_spec(rules, source, target)
+    except MappingPlanError as e:
+        raise PipelineError(str(e))
+    if not spec['columns']:
+        raise PipelineError("No active mapping rules to apply")
+
+    source_path = file_a_path if source == 'a' else file_b_path
+    _report(progress, 5, 'マッピング適用開始', stage='apply_mapping', rules=spec['rule_count'])
+
+    def on_progress(percent: int, rows: int):
+        _report(progress, 5 + int(percent * 0.9), f"apply_mapping: {rows}行", stage='apply_mapping',
+                rows_processed=rows)
+
+    try:
+        summary = apply_mapping_file(
+            source_path, output_path, spec,
+            chunk_bytes=options.get('chunk_bytes'), workers=options.get('workers'),
+            progress=on_progress
+        )
+    except MappingPlanError as e:
+        raise PipelineError(str(e))
+
+    rows = summary['rows']
+    return {
+        'analysis_type': 'apply_mapping',
+        'parameters': {'source': source, 'target': target, 'rule_count': spec['rule_count']},
+        'mapping': {
+            'columns': summary['columns'],
+            'missing_fields': summary['missing_fields']
+        },
+        'export': export_summary(summary),
+        'counts': {
+            'total_records_a': rows if source == 'a' else 0,
+            'total_records_b': rows if source == 'b' else 0,
+            'matched_records': rows,
+            'unmatched_records_a': 0,
+            'unmatched_records_b': 0
+        }
+    }
+
+
+# ジョブ種別 → パイプライン
+PIPELINES = {
+    'enhanced': run_enhanced_analysis,
+    'flexible': run_flexible_analysis,
+    'apply_mapping': run_apply_mapping
+}
+
+# 変換元ファイル1つで実行するパイプライン（ジョブ記録には同じファイルを両側に記録）
+SINGLE_FILE_PIPELINES = ('apply_mapping',)
+
+
+def _file_info(path: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'path': path,
+        'headers': analysis['headers'],
+        'total_rows': analysis['total_rows'],
+        'processed_rows': len(analysis.get('full_data', [])),
+        'truncated': analysis.get('truncated', False)
+    }
+
+
+def _apply_normalization(options: Dict[str, Any], analysis_a: Dict, analysis_b: Dict):
+    """options['category2_id'] のカテゴリの正規化ルールを両社のデータに適用"""
+    category2_id = options.get('category2_id')
+    if not category2_id:
+        return
+    try:
+        normalizer = get_normalizer(int(category2_id))
+    except Exception as e:
+        # ルールを読めなくても分析は続行（正規化なし）
+        analysis_logger.log_error('normalization_rule_load', str(e))
+        return
+    if not normalizer.has_rules:
+        return
+
+    start_time = time.time()
+    for analysis in (analysis_a, analysis_b):
+        for key in ('full_data', 'sample_data'):
+            if analysis.get(key):
+                analysis[key] = normalizer.apply(analysis[key])
+    analysis_logger.logger.info(
+        f"🧹 正規化ルール適用: category2_id={category2_id}, rules={normalizer.rule_count} "
+        f"({time.time() - start_time:.2f}秒)"
+    )
+
+
+def _export_matches(options: Dict[str, Any], analysis_a: Dict, analysis_b: Dict,
+                    matches: List[Dict]) -> Optional[Dict[str, Any]]:
+    """options['export_path'] が指定されていればマッチング結果をCSV出力"""
+    export_path = options.get('export_path')
+    if not export_path:
+        return None
+    try:
+        return export_matches_to_file(
+            export_path,
+            analysis_a['headers'], analysis_b['headers'],
+            analysis_a.get('full_data', analysis_a['sample_data']),
+            analysis_b.get('full_data', analysis_b['sample_data']),
+            matches
+        )
+    except Exception as e:
+        analysis_logger.logger.error(f"❌ CSV出力エラー: {e}")
+        return None
+
+
+def _store_results(options: Dict[str, Any], analysis_a: Dict, analysis_b: Dict,
+                   matches: List[Dict], mappings: List[Dict]) -> Optional[Dict[str, Any]]:
+    """options['result_store_path'] が指定されていれば結果ストアに保存"""
+    store_path = options.get('result_store_path')
+    if not store_path:
+        return None
+    try:
+        return ResultStore(store_path).write(
+            analysis_a.get('full_data', analysis_a['sample_data']),
+            analysis_b.get('full_data', analysis_b['sample_data']),
+            matches, mappings
+        )
+    except Exception as e:
+        analysis_logger.logger.error(f"❌ 結果ストア保存エラー: {e}")
+        return None
+
+
+def strip_stored_rows(result: Dict[str, Any]) -> Dict[str, Any]:
+    """結果ストアに保存済みの全件データ（マッチ・パース済み行）を結果から除外"""
+    if not result.get('result_store'):
+        return result
+    result.pop('card_matches', None)
+    result.pop('matches', None)
+    for key in ('analysis_a', 'analysis_b'):
+        if isinstance(result.get(key), dict):
+            result[key] = {k: v for k, v in result[key].items() if k != 'full_data'}
+    return result
+
+
+def _match_counts(analysis_a: Dict, analysis_b: Dict, matches: List[Dict]) -> Dict[str, int]:
+    """mercury_mapping_job の件数カラム用の集計"""
+    total_a = len(analysis_a.get('full_data', analysis_a.get('sample_data', [])))
+    total_b = len(analysis_b.get('full_data', analysis_b.get('sample_data', [])))
+
+    matched_a = {m['row_a_index'] for m in matches if 'row_a_index' in m}
+    matched_b = {m['row_b_index'] for m in matches if 'row_b_index' in m}
+    # 行番号を持たないマッチは1件=1行として数える
+    matched_a_count = len(matched_a) + sum(1 for m in matches if 'row_a_index' not in m)
+    matched_b_count = len(matched_b) + sum(1 for m in matches if 'row_b_index' not in m)
+
+    return {
+        'total_records_a': total_a,
+        'total_records_b': total_b,
+        'matched_records': len(matches),
+        'unmatched_records_a': max(0, total_a - matched_a_count),
+        'unmatched_records_b': max(0, total_b - matched_b_count)
+    }
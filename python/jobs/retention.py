@@ -0,0 +1,103 @@
+"""
+Mercury Mapping Engine - Result Retention
+ジョブ・同期分析の結果ディレクトリ（RESULTS_FOLDER/jobs/<uuid>/）の保持期限管理
+
+ディレクトリ内の最終更新から RESULT_RETENTION_SECONDS を過ぎたものを削除する。
+ジョブテーブルで pending / running のジョブは期限を過ぎていても残す。
+"""
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Set
+from config.settings import Config
+from utils.logger import analysis_logger
+from .executor import _standalone_job_repository
+
+
+def get_jobs_root() -> str:
+    return os.path.join(Config.get_config('default').RESULTS_FOLDER, 'jobs')
+
+
+def _last_modified(path: str) -> float:
+    """ディレクトリ配下で最も新しい更新時刻"""
+    latest = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                latest = max(latest, os.path.getmtime(os.path.join(root, name)))
+            except OSError:
+                continue
+    return latest
+
+
+def _unfinished_job_uuids(db_config_name: Optional[str]) -> Set[str]:
+    """未終了ジョブの job_uuid（DBに接続できなければ空。保持期限はジョブの実行時間より十分長い前提）"""
+    try:
+        with _standalone_job_repository(db_config_name) as repository:
+            return {job['job_uuid'] for job in repository.list_unfinished_jobs()}
+    except Exception as e:
+        analysis_logger.log_error('result_sweep', f"unfinished job lookup failed: {e}")
+        return set()
+
+
+def sweep_expired_results(retention_seconds: Optional[int] = None, db_config_name: Optional[str] = None,
+                          now: Optional[float] = None) -> Dict[str, int]:
+    """保持期限を過ぎた結果ディレクトリを削除し、件数を返す"""
+    config = Config.get_config('default')
+    retention_seconds = config.RESULT_RETENTION_SECONDS if retention_seconds is None else retention_seconds
+    stats = {'removed': 0, 'kept': 0, 'errors': 0}
+    root = get_jobs_root()
+    if retention_seconds <= 0 or not os.path.isdir(root):
+        return stats
+
+    cutoff = (now or time.time()) - retention_seconds
+    unfinished = None
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        try:
+            if _last_modified(path) >= cutoff:
+                stats['kept'] += 1
+                continue
+            if unfinished is None:
+                # 期限切れの候補がある場合のみ問い合わせる
+                unfinished = _unfinished_job_uuids(db_config_name)
+            if name in unfinished:
+                stats['kept'] += 1
+                continue
+            shutil.rmtree(path)
+            stats['removed'] += 1
+        except OSError as e:
+            stats['errors'] += 1
+            analysis_logger.log_error('result_sweep', f"{path}: {e}")
+
+    if stats['removed'] or stats['errors']:
+        analysis_logger.logger.info(
+            f"🧹 Result sweep: removed={stats['removed']}, kept={stats['kept']}, errors={stats['errors']}"
+        )
+    return stats
+
+
+def start_result_sweeper(db_config_name: Optional[str] = None,
+                         interval: Optional[int] = None) -> Optional[threading.Thread]:
+    """起動時に1回、以降 RESULT_SWEEP_INTERVAL 秒ごとに削除するデーモンスレッドを開始（無効時は None）"""
+    config = Config.get_config('default')
+    interval = config.RESULT_SWEEP_INTERVAL if interval is None else interval
+    if config.RESULT_RETENTION_SECONDS <= 0:
+        return None
+
+    def run():
+        while True:
+            try:
+                sweep_expired_results(db_config_name=db_config_name)
+            except Exception as e:
+                analysis_logger.log_error('result_sweep', str(e))
+            if interval <= 0:
+                return
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='result-sweeper', daemon=True)
+    thread.start()
+    return thread
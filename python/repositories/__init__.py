@@ -0,0 +1,16 @@
+"""
+Mercury Mapping Engine - Repositories
+データベースアクセス層
+"""
+from .job_repository import JobRepository, JOB_STATUSES
+from .mapping_rule_repository import MappingRuleRepository
+from .match_result_repository import MatchResultRepository
+
+__version__ = '1.0.0'
+
+__all__ = [
+    'JobRepository',
+    'JOB_STATUSES',
+    'MappingRuleRepository',
+    'MatchResultRepository'
+]
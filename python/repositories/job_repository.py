@@ -0,0 +1,190 @@
+"""
+Mercury Mapping Engine - Job Repository
+mercury_mapping_job テーブルへのアクセス
+"""
+import json
+from typing import Any, Dict, List, Optional
+from config.database import get_db_manager
+from utils.reference_cache import get_reference_cache
+
+
+JOB_STATUSES = ('pending', 'running', 'completed', 'failed', 'cancelled')
+
+# 終了状態（これ以降は状態を変更しない）
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+_JOB_COLUMNS = """
+    job_uuid, category2_id, company_a_id, company_b_id, file_a_path, file_b_path,
+    result_url, local_result_path, mapping_options, status, progress,
+    total_records_a, total_records_b, matched_records, unmatched_records_a, unmatched_records_b,
+    log_message, error_message, created_by, started_at, completed_at, created_at, updated_at
+"""
+
+
+class JobRepository:
+    """マッピングジョブの永続化"""
+
+    def __init__(self, db_manager=None):
+        self._db_manager = db_manager
+
+    @property
+    def db(self):
+        # ワーカープロセス等で後から初期化される場合に備えて遅延取得
+        return self._db_manager or get_db_manager()
+
+    def create_job(self, job_uuid: str, category2_id: int, company_a_id: int, company_b_id: int,
+                   file_a_path: str, file_b_path: str, mapping_options: Optional[Dict] = None,
+                   created_by: Optional[str] = None, worker_id: Optional[str] = None) -> str:
+        """ジョブを pending 状態で登録（worker_id は受け付けたWebワーカー）"""
+        query = """
+            INSERT INTO mercury_mapping_job
+                (job_uuid, category2_id, company_a_id, company_b_id, file_a_path, file_b_path,
+                 mapping_options, status, progress, created_by, worker_id, active, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, 'pending', 0, %s, %s, 1, NOW(), NOW())
+        """
+        self.db.execute_query(query, (
+            job_uuid, category2_id, company_a_id, company_b_id, file_a_path, file_b_path,
+            json.dumps(mapping_options or {}, ensure_ascii=False), created_by, worker_id
+        ))
+        return job_uuid
+
+    def get_job(self, job_uuid: str) -> Optional[Dict[str, Any]]:
+        """ジョブを取得"""
+        query = f"SELECT {_JOB_COLUMNS} FROM mercury_mapping_job WHERE job_uuid = %s AND active = 1"
+        rows = self.db.execute_query(query, (job_uuid,), fetch=True, dictionary=True)
+        return self._deserialize(rows[0]) if rows else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """ジョブ一覧（新しい順）"""
+        if status:
+            query = f"""
+                SELECT {_JOB_COLUMNS} FROM mercury_mapping_job
+                WHERE active = 1 AND status = %s ORDER BY id DESC LIMIT %s
+            """
+            params = (status, limit)
+        else:
+            query = f"SELECT {_JOB_COLUMNS} FROM mercury_mapping_job WHERE active = 1 ORDER BY id DESC LIMIT %s"
+            params = (limit,)
+        rows = self.db.execute_query(query, params, fetch=True, dictionary=True)
+        return [self._deserialize(row) for row in rows]
+
+    def mark_running(self, job_uuid: str) -> bool:
+        """pending → running（既に取り消し済みなら False）"""
+        query = """
+            UPDATE mercury_mapping_job
+            SET status = 'running', progress = 0, started_at = NOW(), updated_at = NOW()
+            WHERE job_uuid = %s AND status = 'pending'
+        """
+        return self.db.execute_query(query, (job_uuid,)) > 0
+
+    def update_progress(self, job_uuid: str, progress: int, log_message: Optional[str] = None):
+        """進捗率（0-100）とログメッセージを更新"""
+        query = """
+            UPDATE mercury_mapping_job
+            SET progress = %s, log_message = COALESCE(%s, log_message), updated_at = NOW()
+            WHERE job_uuid = %s AND status = 'running'
+        """
+        self.db.execute_query(query, (max(0, min(100, int(progress))), log_message, job_uuid))
+
+    def mark_completed(self, job_uuid: str, counts: Dict[str, int], local_result_path: str,
+                       result_url: Optional[str] = None, log_message: Optional[str] = None):
+        """running → completed（件数と結果パスを記録）"""
+        query = """
+            UPDATE mercury_mapping_job
+            SET status = 'completed', progress = 100,
+                total_records_a = %s, total_records_b = %s, matched_records = %s,
+                unmatched_records_a = %s, unmatched_records_b = %s,
+                local_result_path = %s, result_url = %s, log_message = %s,
+                completed_at = NOW(), updated_at = NOW()
+            WHERE job_uuid = %s AND status = 'running'
+        """
+        self.db.execute_query(query, (
+            counts.get('total_records_a', 0), counts.get('total_records_b', 0),
+            counts.get('matched_records', 0), counts.get('unmatched_records_a', 0),
+            counts.get('unmatched_records_b', 0), local_result_path, result_url,
+            log_message, job_uuid
+        ))
+
+    def mark_failed(self, job_uuid: str, error_message: str):
+        """失敗として終了"""
+        query = """
+            UPDATE mercury_mapping_job
+            SET status = 'failed', error_message = %s, completed_at = NOW(), updated_at = NOW()
+            WHERE job_uuid = %s AND status IN ('pending', 'running')
+        """
+        self.db.execute_query(query, (error_message[:65535], job_uuid))
+
+    def mark_cancelled(self, job_uuid: str) -> bool:
+        """取り消し（未終了のジョブのみ）"""
+        query = """
+            UPDATE mercury_mapping_job
+            SET status = 'cancelled', completed_at = NOW(), updated_at = NOW()
+            WHERE job_uuid = %s AND status IN ('pending', 'running')
+        """
+        return self.db.execute_query(query, (job_uuid,)) > 0
+
+    def list_unfinished_jobs(self) -> List[Dict[str, Any]]:
+        """pending / running のジョブ（job_uuid, status, worker_id）"""
+        query = """
+            SELECT job_uuid, status, worker_id FROM mercury_mapping_job
+            WHERE active = 1 AND status IN ('pending', 'running')
+        """
+        return self.db.execute_query(query, fetch=True, dictionary=True)
+
+    def fail_worker_jobs(self, worker_id: str, error_message: str) -> int:
+        """指定ワーカーが受け付けた未終了のジョブを失敗として終了し、件数を返す"""
+        query = """
+            UPDATE mercury_mapping_job
+            SET status = 'failed', error_message = %s, completed_at = NOW(), updated_at = NOW()
+            WHERE worker_id = %s AND status IN ('pending', 'running')
+        """
+        return self.db.execute_query(query, (error_message[:65535], worker_id))
+
+    def get_status(self, job_uuid: str) -> Optional[str]:
+        """状態のみ取得（取り消し確認用の軽量クエリ）"""
+        rows = self.db.execute_query(
+            "SELECT status FROM mercury_mapping_job WHERE job_uuid = %s", (job_uuid,), fetch=True
+        )
+        return rows[0][0] if rows else None
+
+    def get_progress_state(self, job_uuid: str) -> Optional[Dict[str, Any]]:
+        """SSE用の軽量な状態取得（idle_seconds は最終更新からの経過秒数）"""
+        query = """
+            SELECT status, progress, error_message, result_url,
+                   TIMESTAMPDIFF(SECOND, COALESCE(updated_at, created_at), NOW()) AS idle_seconds
+            FROM mercury_mapping_job WHERE job_uuid = %s AND active = 1
+        """
+        rows = self.db.execute_query(query, (job_uuid,), fetch=True, dictionary=True)
+        return rows[0] if rows else None
+
+    def get_job_id(self, job_uuid: str) -> Optional[int]:
+        """job_uuid から mercury_mapping_job.id を取得（結果テーブルの外部キー用）"""
+        rows = self.db.execute_query(
+            "SELECT id FROM mercury_mapping_job WHERE job_uuid = %s", (job_uuid,), fetch=True
+        )
+        return rows[0][0] if rows else None
+
+    def resolve_company_id(self, company_code: str) -> Optional[int]:
+        """会社コードから mercury_company.id を取得（参照データキャッシュ経由）"""
+        def load():
+            rows = self.db.execute_query(
+                "SELECT id FROM mercury_company WHERE company_code = %s AND active = 1",
+                (company_code,), fetch=True
+            )
+            return rows[0][0] if rows else None
+        return get_reference_cache().get_or_load('companies', company_code, load)
+
+    @staticmethod
+    def _deserialize(row: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON列・日時列をAPI向けに変換"""
+        job = dict(row)
+        options = job.get('mapping_options')
+        if isinstance(options, (str, bytes, bytearray)):
+            try:
+                job['mapping_options'] = json.loads(options)
+            except ValueError:
+                job['mapping_options'] = {}
+        for key in ('started_at', 'completed_at', 'created_at', 'updated_at'):
+            if job.get(key) is not None and hasattr(job[key], 'isoformat'):
+                job[key] = job[key].isoformat()
+        return job
@@ -0,0 +1,209 @@
+"""
+Mercury Mapping Engine - Mapping Rule Repository
+mercury_common_mapping_rule / mercury_mapping_rule_set テーブルへのアクセス
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from config.database import get_db_manager
+from utils.logger import analysis_logger
+from utils.reference_cache import get_reference_cache
+
+
+MAPPING_TYPES = ('direct', 'transform', 'extract')
+
+# 1文あたりの行数（max_allowed_packet を超えないよう分割、同一トランザクション内で実行）
+RULE_UPSERT_BATCH_SIZE = 500
+
+_RULE_COLUMNS = """
+    id, category2_id, company_a_id, company_b_id, company_a_field, company_b_field,
+    common_field_name, mapping_type, transform_rule, confidence, priority, rule_version,
+    active, created_at, updated_at
+"""
+
+_UPSERT_PREFIX = """
+    INSERT INTO mercury_common_mapping_rule
+        (category2_id, company_a_id, company_b_id, company_a_field, company_b_field,
+         common_field_name, mapping_type, transform_rule, confidence, priority, rule_version,
+         active, created_at, updated_at)
+    VALUES
+"""
+_UPSERT_ROW = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 1, NOW(), NOW())"
+_UPSERT_SUFFIX = """
+    ON DUPLICATE KEY UPDATE
+        common_field_name = VALUES(common_field_name),
+        mapping_type = VALUES(mapping_type),
+        transform_rule = VALUES(transform_rule),
+        confidence = VALUES(confidence),
+        priority = VALUES(priority),
+        rule_version = VALUES(rule_version),
+        active = 1,
+        updated_at = NOW()
+"""
+
+
+class MappingRuleRepository:
+    """マッピングルールの永続化
+
+    ルールは (category2_id, company_a_id, company_b_id) 単位のルールセットとして保存する。
+    保存のたびにバージョンを上げ、今回のセットに含まれないルールは無効化する。
+    ルールセット情報と有効なルール一覧は参照データキャッシュ経由で読み、保存時に破棄する。
+    """
+
+    def __init__(self, db_manager=None):
+        self._db_manager = db_manager
+
+    @property
+    def db(self):
+        # ワーカープロセス等で後から初期化される場合に備えて遅延取得
+        return self._db_manager or get_db_manager()
+
+    def save_rule_set(self, category2_id: int, company_a_id: int, company_b_id: int,
+                      rules: List[Dict[str, Any]], source_job_uuid: Optional[str] = None) -> Dict[str, Any]:
+        """ルールセットを1トランザクションで保存（複数行 INSERT ... ON DUPLICATE KEY UPDATE）
+
+        rules は FieldMapper.create_mapping_rules の形式（source_field / target_field / field_type / confidence）。
+        """
+        key = (category2_id, company_a_id, company_b_id)
+        rows = self._build_rows(rules)
+
+        with self.db.transaction() as cursor:
+            # 同じ会社ペアへの同時保存はルールセット行のロックで直列化
+            cursor.execute("""
+                SELECT version FROM mercury_mapping_rule_set
+                WHERE category2_id = %s AND company_a_id = %s AND company_b_id = %s
+                FOR UPDATE
+            """, key)
+            current = cursor.fetchone()
+            version = (current[0] if current else 0) + 1
+
+            cursor.execute("""
+                INSERT INTO mercury_mapping_rule_set
+                    (category2_id, company_a_id, company_b_id, version, rule_count, source_job_uuid,
+                     created_at, updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW())
+                ON DUPLICATE KEY UPDATE
+                    version = VALUES(version),
+                    rule_count = VALUES(rule_count),
+                    source_job_uuid = VALUES(source_job_uuid),
+                    updated_at = NOW()
+            """, (*key, version, len(rows), source_job_uuid))
+
+            for start in range(0, len(rows), RULE_UPSERT_BATCH_SIZE):
+                batch = rows[start:start + RULE_UPSERT_BATCH_SIZE]
+                params = []
+                for row in batch:
+                    params.extend((*key, *row, version))
+                cursor.execute(
+                    _UPSERT_PREFIX + ', '.join([_UPSERT_ROW] * len(batch)) + _UPSERT_SUFFIX,
+                    params
+                )
+
+            # 今回のセットに含まれないルールは無効化
+            cursor.execute("""
+                UPDATE mercury_common_mapping_rule
+                SET active = 0, updated_at = NOW()
+                WHERE category2_id = %s AND company_a_id = %s AND company_b_id = %s
+                  AND rule_version < %s AND active = 1
+            """, (*key, version))
+            deactivated = cursor.rowcount
+
+        cache = get_reference_cache()
+        cache.invalidate('mapping_rule_sets', key)
+        cache.invalidate('mapping_rules', key)
+        analysis_logger.logger.info(
+            f"💾 Mapping rules saved: category2_id={category2_id}, "
+            f"companies={company_a_id}/{company_b_id}, version={version}, "
+            f"rules={len(rows)}, deactivated={deactivated}"
+        )
+        return {
+            'category2_id': category2_id,
+            'company_a_id': company_a_id,
+            'company_b_id': company_b_id,
+            'version': version,
+            'rule_count': len(rows),
+            'deactivated': deactivated
+        }
+
+    def get_rule_set(self, category2_id: int, company_a_id: int, company_b_id: int,
+                     use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """ルールセットのバージョン情報"""
+        key = (category2_id, company_a_id, company_b_id)
+
+        def load():
+            rows = self.db.execute_query("""
+                SELECT category2_id, company_a_id, company_b_id, version, rule_count, source_job_uuid,
+                       created_at, updated_at
+                FROM mercury_mapping_rule_set
+                WHERE category2_id = %s AND company_a_id = %s AND company_b_id = %s
+            """, key, fetch=True, dictionary=True)
+            return self._deserialize(rows[0]) if rows else None
+
+        return get_reference_cache().get_or_load('mapping_rule_sets', key, load) if use_cache else load()
+
+    def get_rules(self, category2_id: int, company_a_id: int, company_b_id: int,
+                  include_inactive: bool = False, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """ルール一覧（優先度順）。キャッシュするのは有効なルールのみ"""
+        key = (category2_id, company_a_id, company_b_id)
+
+        def load():
+            query = f"""
+                SELECT {_RULE_COLUMNS} FROM mercury_common_mapping_rule
+                WHERE category2_id = %s AND company_a_id = %s AND company_b_id = %s
+            """
+            if not include_inactive:
+                query += " AND active = 1"
+            query += " ORDER BY priority, id"
+            rows = self.db.execute_query(query, key, fetch=True, dictionary=True)
+            return [self._deserialize(row) for row in rows]
+
+        if include_inactive or not use_cache:
+            return load()
+        return get_reference_cache().get_or_load('mapping_rules', key, load)
+
+    @staticmethod
+    def _build_rows(rules: List[Dict[str, Any]]) -> List[Tuple]:
+        """ルール dict → INSERT 用の値（同じフィールド対応は信頼度の高い方のみ、優先度は信頼度順）"""
+        best: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for rule in rules:
+            source = str(rule.get('source_field') or rule.get('company_a_field') or '')[:100]
+            target = str(rule.get('target_field') or rule.get('company_b_field') or '')[:100]
+            if not source or not target:
+                continue
+            confidence = float(rule.get('confidence') or 0.0)
+            existing = best.get((source, target))
+            if existing is None or confidence > existing['confidence']:
+                best[(source, target)] = {**rule, 'source_field': source, 'target_field': target,
+                                          'confidence': confidence}
+
+        ordered = sorted(best.values(), key=lambda r: r['confidence'], reverse=True)
+        rows = []
+        for priority, rule in enumerate(ordered, 1):
+            mapping_type = rule.get('mapping_type', 'direct')
+            transform_rule = rule.get('transform_rule')
+            rows.append((
+                rule['source_field'],
+                rule['target_field'],
+                str(rule.get('field_type') or rule.get('common_field_name') or rule['source_field'])[:50],
+                mapping_type if mapping_type in MAPPING_TYPES else 'direct',
+                json.dumps(transform_rule, ensure_ascii=False) if transform_rule is not None else None,
+                round(rule['confidence'], 3),
+                priority
+            ))
+        return rows
+
+    @staticmethod
+    def _deserialize(row: Dict[str, Any]) -> Dict[str, Any]:
+        """JSON列・数値列・日時列をAPI向けに変換"""
+        rule = dict(row)
+        transform_rule = rule.get('transform_rule')
+        if isinstance(transform_rule, (str, bytes, bytearray)):
+            try:
+                rule['transform_rule'] = json.loads(transform_rule)
+            except ValueError:
+                rule['transform_rule'] = None
+        if rule.get('confidence') is not None:
+            rule['confidence'] = float(rule['confidence'])
+        for key in ('created_at', 'updated_at'):
+            if rule.get(key) is not None and hasattr(rule[key], 'isoformat'):
+                rule[key] = rule[key].isoformat()
+        return rule
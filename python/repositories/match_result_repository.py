@@ -0,0 +1,160 @@
+"""
+Mercury Mapping Engine - Match Result Repository
+mercury_match_result テーブルへのアクセス（ジョブのマッチ結果を一括保存）
+"""
+import os
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from config.database import get_db_manager
+from config.settings import Config
+from core.result_export import match_score
+from utils.logger import analysis_logger
+from utils.metrics import MATCH_PERSIST_SECONDS, MATCH_ROWS_PERSISTED
+
+
+_INSERT_PREFIX = """
+    INSERT INTO mercury_match_result (job_id, row_a_index, row_b_index, score, method, created_at)
+    VALUES
+"""
+_INSERT_ROW = "(%s, %s, %s, %s, %s, NOW())"
+
+_LOAD_DATA_QUERY = """
+    LOAD DATA LOCAL INFILE %s INTO TABLE mercury_match_result
+    CHARACTER SET utf8mb4
+    FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'
+    (job_id, row_a_index, row_b_index, score, method)
+    SET created_at = NOW()
+"""
+
+_TSV_UNSAFE = str.maketrans({'\t': ' ', '\n': ' ', '\r': ' ', '\\': None})
+
+
+def _match_rows(job_id: int, matches: Iterable[Dict[str, Any]],
+                default_method: Optional[str]) -> Iterator[Tuple]:
+    """マッチ dict → (job_id, row_a_index, row_b_index, score, method)"""
+    for match in matches:
+        row_a = match.get('row_a_index')
+        row_b = match.get('row_b_index')
+        if row_a is None or row_b is None:
+            continue
+        method = match.get('match_type') or match.get('similarity_mode') or default_method
+        yield (
+            job_id, int(row_a), int(row_b), round(match_score(match), 4),
+            str(method)[:50] if method else None
+        )
+
+
+class MatchResultRepository:
+    """マッチ結果の永続化
+
+    ジョブ単位で既存行を削除してから、同一トランザクション内でバッチごとに書き込む。
+    MATCH_RESULT_LOAD_DATA 有効時は一時TSVから LOAD DATA LOCAL INFILE で取り込み、
+    失敗した場合は複数行 INSERT に切り替える。
+    """
+
+    def __init__(self, db_manager=None, batch_size: Optional[int] = None,
+                 use_load_data: Optional[bool] = None):
+        self._db_manager = db_manager
+        config = Config.get_config('default')
+        self.batch_size = max(1, batch_size or config.MATCH_RESULT_BATCH_SIZE)
+        self.use_load_data = config.MATCH_RESULT_LOAD_DATA if use_load_data is None else use_load_data
+
+    @property
+    def db(self):
+        # ワーカープロセス等で後から初期化される場合に備えて遅延取得
+        return self._db_manager or get_db_manager()
+
+    def write_matches(self, job_id: int, matches: Iterable[Dict[str, Any]],
+                      default_method: Optional[str] = None) -> Dict[str, Any]:
+        """ジョブのマッチ結果を保存（matches はジェネレータでもよい）し、件数・行/秒を返す"""
+        start_time = time.time()
+        rows = _match_rows(job_id, matches, default_method)
+
+        if self.use_load_data:
+            written, batches, method = self._write_with_load_data(job_id, rows)
+        else:
+            written, batches = self._write_with_inserts(job_id, rows)
+            method = 'multi_row_insert'
+
+        elapsed = time.time() - start_time
+        MATCH_ROWS_PERSISTED.inc(written, method=method)
+        MATCH_PERSIST_SECONDS.observe(elapsed, method=method)
+        summary = {
+            'job_id': job_id,
+            'rows': written,
+            'batches': batches,
+            'method': method,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'rows_per_second': round(written / elapsed, 1) if elapsed > 0 else None
+        }
+        analysis_logger.logger.info(
+            f"💾 Match results saved: job_id={job_id}, rows={written}, method={method} "
+            f"({elapsed:.2f}秒, {summary['rows_per_second']}行/秒)"
+        )
+        return summary
+
+    def _write_with_inserts(self, job_id: int, rows: Iterable[Tuple]) -> Tuple[int, int]:
+        """複数行 INSERT（batch_size 行ずつ、1トランザクション）"""
+        written = 0
+        batches = 0
+        with self.db.transaction() as cursor:
+            cursor.execute("DELETE FROM mercury_match_result WHERE job_id = %s", (job_id,))
+            batch: List[Tuple] = []
+            full_query = None
+            for row in rows:
+                batch.append(row)
+                if len(batch) < self.batch_size:
+                    continue
+                # 同じ行数の文は使い回す
+                if full_query is None:
+                    full_query = _INSERT_PREFIX + ', '.join([_INSERT_ROW] * self.batch_size)
+                cursor.execute(full_query, [value for row in batch for value in row])
+                written += len(batch)
+                batches += 1
+                batch = []
+            if batch:
+                cursor.execute(_INSERT_PREFIX + ', '.join([_INSERT_ROW] * len(batch)),
+                               [value for row in batch for value in row])
+                written += len(batch)
+                batches += 1
+        return written, batches
+
+    def _write_with_load_data(self, job_id: int, rows: Iterable[Tuple]) -> Tuple[int, int, str]:
+        """一時TSVに書き出して LOAD DATA LOCAL INFILE（失敗時はTSVを読み直して INSERT）"""
+        fd, tsv_path = tempfile.mkstemp(prefix=f"match_result_{job_id}_", suffix='.tsv')
+        try:
+            written = 0
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                for job, row_a, row_b, score, method in rows:
+                    # NULL は \N、区切り・エスケープ文字は method から除去
+                    method = r'\N' if method is None else method.translate(_TSV_UNSAFE)
+                    f.write(f"{job}\t{row_a}\t{row_b}\t{score}\t{method}\n")
+                    written += 1
+
+            try:
+                with self.db.transaction() as cursor:
+                    cursor.execute("DELETE FROM mercury_match_result WHERE job_id = %s", (job_id,))
+                    cursor.execute(_LOAD_DATA_QUERY, (tsv_path,))
+                return written, 1, 'load_data'
+            except Exception as e:
+                analysis_logger.logger.warning(f"⚠️ LOAD DATA failed, falling back to INSERT: {e}")
+
+            written, batches = self._write_with_inserts(job_id, self._read_tsv(tsv_path))
+            return written, batches, 'multi_row_insert'
+        finally:
+            if os.path.exists(tsv_path):
+                os.remove(tsv_path)
+
+    @staticmethod
+    def _read_tsv(path: str) -> Iterator[Tuple]:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for line in f:
+                job_id, row_a, row_b, score, method = line.rstrip('\n').split('\t')
+                yield int(job_id), int(row_a), int(row_b), float(score), None if method == r'\N' else method
+
+    def count_matches(self, job_id: int) -> int:
+        rows = self.db.execute_query(
+            "SELECT COUNT(*) FROM mercury_match_result WHERE job_id = %s", (job_id,), fetch=True
+        )
+        return int(rows[0][0]) if rows else 0
@@ -0,0 +1,61 @@
+"""
+Mercury Mapping Engine - Normalization Rule Repository
+mercury_normalization_rule テーブルへのアクセス
+"""
+import json
+from typing import Any, Dict, List, Tuple
+from config.database import get_db_manager
+from utils.reference_cache import get_reference_cache
+
+
+NORMALIZATION_RULE_TYPES = ('text_clean', 'split', 'value_map', 'regex')
+
+
+class NormalizationRuleRepository:
+    """正規化ルールの読み込み"""
+
+    def __init__(self, db_manager=None):
+        self._db_manager = db_manager
+
+    @property
+    def db(self):
+        # ワーカープロセス等で後から初期化される場合に備えて遅延取得
+        return self._db_manager or get_db_manager()
+
+    def get_active_rules(self, category2_id: int, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """カテゴリの有効なルール（フィールドごとに execution_order 順）"""
+        if use_cache:
+            return get_reference_cache().get_or_load(
+                'normalization_rules', category2_id, lambda: self.get_active_rules(category2_id, use_cache=False)
+            )
+
+        rows = self.db.execute_query("""
+            SELECT id, field_name, rule_type, rule_config, execution_order
+            FROM mercury_normalization_rule
+            WHERE category2_id = %s AND active = 1
+            ORDER BY field_name, execution_order, id
+        """, (category2_id,), fetch=True, dictionary=True)
+
+        rules = []
+        for row in rows:
+            rule = dict(row)
+            config = rule.get('rule_config')
+            if isinstance(config, (str, bytes, bytearray)):
+                try:
+                    rule['rule_config'] = json.loads(config)
+                except ValueError:
+                    rule['rule_config'] = {}
+            rules.append(rule)
+        return rules
+
+    def get_rules_stamp(self, category2_id: int) -> Tuple[Any, int, int]:
+        """キャッシュ無効化の判定用（最終更新日時・件数・有効件数。削除や無効化も件数の変化で検知）"""
+        rows = self.db.execute_query("""
+            SELECT MAX(updated_at), COUNT(*), SUM(active)
+            FROM mercury_normalization_rule
+            WHERE category2_id = %s
+        """, (category2_id,), fetch=True)
+        if not rows:
+            return (None, 0, 0)
+        updated_at, count, active = rows[0]
+        return (str(updated_at) if updated_at is not None else None, int(count or 0), int(active or 0))
@@ -0,0 +1,80 @@
+"""
+Mercury Mapping Engine - Response Compression
+Accept-Encoding に応じたレスポンス圧縮（gzip / brotli）
+"""
+import gzip
+import os
+import zlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli は任意依存
+    brotli = None
+
+
+# これより小さいレスポンスは圧縮しない（圧縮コストの方が大きい）
+COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', '1024'))
+GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', '5'))
+
+
+def available_encodings():
+    """サーバー側の優先順（brotli は利用可能な場合のみ）"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encoding から使用する圧縮方式を選ぶ（q=0 は拒否として扱う）"""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """チャンク列を逐次圧縮（全体をメモリに載せない）"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    if encoding == 'gzip':
+        # wbits=31 で gzip ヘッダー付き
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+        return
+
+    raise ValueError(f"Unsupported encoding: {encoding}")
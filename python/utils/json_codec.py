@@ -0,0 +1,48 @@
+"""
+Mercury Mapping Engine - JSON Codec
+JSONシリアライズ（orjson があれば使用、なければ標準ライブラリ）
+"""
+import json
+import os
+from typing import Any, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson は任意依存
+    orjson = None
+
+
+# JSON_BACKEND=json で orjson を無効化できる（比較・切り分け用）
+JSON_BACKEND = 'orjson' if orjson is not None and os.getenv('JSON_BACKEND', 'auto') != 'json' else 'json'
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def dumps(obj: Any) -> bytes:
+    """UTF-8 のJSONバイト列に変換（日本語はエスケープしない）"""
+    if JSON_BACKEND == 'orjson':
+        try:
+            return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # 64bitを超える整数など orjson が扱えない値は標準ライブラリで処理
+            pass
+    return json.dumps(obj, ensure_ascii=False, default=str, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    if JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def iter_ndjson(items: Iterable[Any]) -> Iterator[bytes]:
+    """1件1行の NDJSON（改行区切りJSON）を生成"""
+    for item in items:
+        yield dumps(item) + b'\n'
+
+
+def _default(value: Any) -> Any:
+    # set/tuple 由来の値などは標準の str 変換に揃える（jsonify の default=str と同じ挙動）
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
@@ -2,10 +2,17 @@
 Mercury Mapping Engine - Logging Utilities
 ログ設定管理
 """
+import functools
 import logging
 import logging.handlers
 import os
-from datetime import datetime
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+from utils.metrics import get_metrics_registry
 
 
 def setup_logging(app):
@@ -78,29 +85,196 @@ class AnalysisLogger:
         self.logger.error(f"Error in {operation}: {error_message}")
 
 
+# ステージごとのレイテンシヒストグラムの境界（ミリ秒、最後はそれ以上）
+SPAN_HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('mercury_current_span', default=None)
+
+
+class Span:
+    """計測区間（親子関係と属性を持つ）"""
+
+    __slots__ = ('name', 'parent', 'attributes', 'start_time', 'duration_ms', 'error')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.start_time = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def path(self) -> str:
+        """ルートからの区間名（例: enhanced_analysis_api/csv_full_analysis）"""
+        names = []
+        span = self
+        while span is not None:
+            names.append(span.name)
+            span = span.parent
+        return '/'.join(reversed(names))
+
+    @property
+    def depth(self) -> int:
+        return 0 if self.parent is None else self.parent.depth + 1
+
+    def set(self, **attributes):
+        """属性（rows, comparisons, tokens など）を追加"""
+        self.attributes.update(attributes)
+        return self
+
+    def increment(self, **amounts):
+        """数値属性に加算（区間内で何度も発生する API 呼び出しのトークン数など）"""
+        for key, amount in amounts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+        return self
+
+    def elapsed_ms(self) -> float:
+        if self.duration_ms is not None:
+            return self.duration_ms
+        return (time.perf_counter() - self.start_time) * 1000
+
+
+class _StageHistogram:
+    """区間名ごとの件数・合計・最小・最大とバケット別件数"""
+
+    __slots__ = ('count', 'errors', 'total_ms', 'min_ms', 'max_ms', 'buckets', 'attribute_totals')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(SPAN_HISTOGRAM_BUCKETS_MS) + 1)
+        self.attribute_totals: Dict[str, float] = {}
+
+    def observe(self, duration_ms: float, error: bool, attributes: Dict[str, Any]):
+        self.count += 1
+        self.errors += int(error)
+        self.total_ms += duration_ms
+        self.min_ms = duration_ms if self.min_ms is None else min(self.min_ms, duration_ms)
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.buckets[bisect_left(SPAN_HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+        # 数値属性（rows, comparisons, tokens など）はステージごとに合計
+        for key, value in attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.attribute_totals[key] = self.attribute_totals.get(key, 0) + value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """バケット上限による近似値"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative >= rank:
+                return float(SPAN_HISTOGRAM_BUCKETS_MS[index]) if index < len(SPAN_HISTOGRAM_BUCKETS_MS) \
+                    else round(self.max_ms, 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'min_ms': round(self.min_ms or 0.0, 3),
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'buckets': {
+                **{str(bound): count for bound, count in zip(SPAN_HISTOGRAM_BUCKETS_MS, self.buckets)},
+                '+Inf': self.buckets[-1]
+            },
+            'attribute_totals': dict(self.attribute_totals)
+        }
+
+
 class PerformanceLogger:
-    """パフォーマンス測定用のロガー"""
+    """パフォーマンス測定用のロガー
+
+    計測区間は contextvars で管理するため、スレッド・リクエストをまたいで混ざらない。
+    区間の中で開始した区間は子になり、終了時に区間名ごとのヒストグラムへ集計する。
+
+        with performance_logger.span('csv_full_analysis', file=path) as span:
+            ...
+            span.set(rows=len(rows))
+
+        @performance_logger.timed('field_mapping_analysis')
+        def analyze(...): ...
+    """
     
     def __init__(self):
         self.logger = logging.getLogger("performance")
-        self.start_times = {}
-    
-    def start_timer(self, operation_name):
-        """タイマー開始"""
-        self.start_times[operation_name] = datetime.now()
-        self.logger.debug(f"Started: {operation_name}")
-    
-    def end_timer(self, operation_name):
-        """タイマー終了とログ出力"""
-        if operation_name in self.start_times:
-            duration = datetime.now() - self.start_times[operation_name]
-            duration_ms = duration.total_seconds() * 1000
-            self.logger.info(f"Completed: {operation_name} in {duration_ms:.2f}ms")
-            del self.start_times[operation_name]
-            return duration_ms
-        else:
-            self.logger.warning(f"Timer not found for operation: {operation_name}")
-            return None
+        self._stages: Dict[str, _StageHistogram] = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """計測区間（現在の区間の子として開始）"""
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        self.logger.debug(f"Started: {span.path}")
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span)
+    
+    def timed(self, name: Optional[str] = None, **attributes) -> Callable:
+        """関数全体を計測区間にするデコレーター（区間名の既定は関数名）"""
+        def decorator(func):
+            span_name = name or func.__name__
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, **attributes):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+    
+    def set_attributes(self, **attributes):
+        """現在の区間に属性を追加（区間外では何もしない）"""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+    
+    def increment(self, **amounts):
+        """現在の区間の数値属性に加算（区間外では何もしない）"""
+        span = _current_span.get()
+        if span is not None:
+            span.increment(**amounts)
+    
+    def _finish(self, span: Span):
+        span.duration_ms = (time.perf_counter() - span.start_time) * 1000
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = _StageHistogram()
+            stage.observe(span.duration_ms, span.error is not None, span.attributes)
+        
+        attributes = ''.join(f", {key}={value}" for key, value in span.attributes.items())
+        status = f" ({span.error})" if span.error else ''
+        self.logger.info(f"Completed: {span.path} in {span.duration_ms:.2f}ms{attributes}{status}")
+        get_metrics_registry().maybe_flush()
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """区間名ごとのレイテンシ集計（プロセス単位）"""
+        with self._lock:
+            return {name: stage.to_dict() for name, stage in sorted(self._stages.items())}
+    
+    def reset_stats(self):
+        with self._lock:
+            self._stages.clear()
 
 
 # グローバルなロガーインスタンス
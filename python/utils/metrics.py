@@ -0,0 +1,553 @@
+"""
+Mercury Mapping Engine - Metrics
+Prometheus テキスト形式で出力するメトリクス（プリフォーク・ジョブワーカーの複数プロセス対応）
+
+各プロセスは自分のカウンタ・ヒストグラムと、既存の統計（計測区間・キャッシュ・Claude API・
+ジョブキュー・DBプール）から作ったスナップショットを METRICS_DIR/<pid>-<起動時刻>.json に書き出す
+（METRICS_FLUSH_INTERVAL 秒ごと、およびジョブ完了時・プロセス終了時）。
+/api/metrics はディレクトリ内の全プロセス分を合算して返す。
+
+- counter / histogram: 全プロセスの合計。終了したプロセスの分は archive.json に合算してファイルを削除する
+  （PID が再利用されても別ファイルになるため、合計が減ることはない）
+- gauge: 稼働中のプロセスのみ、pid ラベル付きで出力
+"""
+import atexit
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows（開発時）はアーカイブへの合算を行わない
+    fcntl = None
+
+
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'mercury_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# 秒単位のレイテンシヒストグラムの境界
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# スナップショット形式: {name: {'type', 'help', 'samples': [[suffix, {labels}, value], ...]}}
+Families = Dict[str, Dict[str, Any]]
+
+# 終了したプロセスの counter / histogram の合計
+ARCHIVE_FILENAME = 'archive.json'
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """単調増加のカウンタ"""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.maybe_flush()
+
+    def samples(self) -> List[list]:
+        return [['', dict(zip(self.labelnames, key)), value] for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """累積バケットのヒストグラム（値は秒などの単位のまま記録）"""
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._registry.lock:
+            state = self._values.get(key)
+            if state is None:
+                # [バケット別件数..., +Inf, 合計, 件数]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-2] += value
+            state[-1] += 1
+        self._registry.maybe_flush()
+
+    def samples(self) -> List[list]:
+        samples = []
+        for key, state in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            samples.extend(histogram_samples(labels, self.buckets, state[:-2], state[-2], state[-1]))
+        return samples
+
+
+def histogram_samples(labels: Dict[str, Any], bounds: Sequence[float], bucket_counts: Sequence[int],
+                      total: float, count: int) -> List[list]:
+    """バケット別件数（最後は +Inf）から累積の _bucket / _sum / _count サンプルを作成"""
+    samples = []
+    cumulative = 0
+    for bound, bucket_count in zip(list(bounds) + ['+Inf'], bucket_counts):
+        cumulative += bucket_count
+        samples.append(['_bucket', {**labels, 'le': _format_bound(bound)}, cumulative])
+    samples.append(['_sum', dict(labels), total])
+    samples.append(['_count', dict(labels), count])
+    return samples
+
+
+def _format_bound(bound) -> str:
+    if isinstance(bound, str):
+        return bound
+    return repr(float(bound))
+
+
+class MetricsRegistry:
+    """プロセス内のメトリクスと収集関数、スナップショットのファイル出力"""
+
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Families]] = []
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+        self._file_pid: Optional[int] = None
+        self._file_key = ''
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Families]):
+        """スナップショット作成時に呼ぶ関数（既存の統計をメトリクスに変換）を登録"""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Families:
+        """このプロセスのメトリクス"""
+        families: Families = {}
+        with self.lock:
+            for metric in self._metrics.values():
+                families[metric.name] = {'type': metric.type, 'help': metric.documentation,
+                                         'samples': metric.samples()}
+        for collector in self._collectors:
+            try:
+                families.update(collector())
+            except Exception:
+                # 統計の取得失敗でメトリクス全体を止めない
+                continue
+        return families
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def file_key(self) -> str:
+        """このプロセスのスナップショット名（<pid>-<起動時刻>。fork 後は子プロセス側で作り直す）"""
+        pid = os.getpid()
+        if self._file_pid != pid:
+            self._file_pid = pid
+            self._file_key = f"{pid}-{time.time_ns()}"
+        return self._file_key
+
+    def flush(self):
+        """スナップショットを METRICS_DIR/<pid>-<起動時刻>.json に書き出し（一時ファイル経由で置き換え）"""
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{self.file_key()}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'pid': os.getpid(), 'time': time.time(), 'families': self.snapshot()}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+        finally:
+            self._flush_lock.release()
+
+    def _snapshot_files(self) -> Dict[str, Tuple[Any, Families]]:
+        """プロセス別スナップショット {ファイル名: (pid, families)}（アーカイブを除く）"""
+        snapshots = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            name = os.path.basename(path)
+            if name == ARCHIVE_FILENAME:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots[name] = (data.get('pid'), data.get('families', {}))
+        return snapshots
+
+    def _load_archive(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.directory, ARCHIVE_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'archived': [], 'families': {}}
+
+    def archive_dead_processes(self) -> int:
+        """終了したプロセスのスナップショットを archive.json に合算して削除し、件数を返す
+
+        PID が生存していないか、同じ PID でより新しいスナップショットがある（PID 再利用）ものが対象。
+        """
+        if fcntl is None or not os.path.isdir(self.directory):
+            return 0
+        with open(os.path.join(self.directory, f"{ARCHIVE_FILENAME}.lock"), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            snapshots = self._snapshot_files()
+            newest: Dict[Any, str] = {}
+            for name, (pid, _) in snapshots.items():
+                if pid not in newest or _start_of(name) > _start_of(newest[pid]):
+                    newest[pid] = name
+            own_name = f"{self.file_key()}.json"
+            dead = [
+                name for name, (pid, _) in snapshots.items()
+                if name != own_name and (newest[pid] != name or not _pid_alive(pid))
+            ]
+            if not dead:
+                return 0
+
+            archive = self._load_archive()
+            # archived は合算済みで削除できなかったファイル（二重に数えない。削除済みのものは外す）
+            archived = set(archive.get('archived', [])) & set(snapshots)
+            families = merge_snapshots([(None, archive.get('families', {}))] +
+                                       [(None, snapshots[name][1]) for name in dead if name not in archived])
+            archive_path = os.path.join(self.directory, ARCHIVE_FILENAME)
+            tmp_path = f"{archive_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'archived': sorted(archived | set(dead)), 'families': families}, f)
+            os.replace(tmp_path, archive_path)
+
+            for name in dead:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+            return len(dead)
+
+    def collect(self) -> Families:
+        """全プロセス分を合算（このプロセスは最新のスナップショットを使う）"""
+        try:
+            self.archive_dead_processes()
+        except OSError:
+            pass
+        own_name = f"{self.file_key()}.json"
+        archive = self._load_archive()
+        archived = set(archive.get('archived', []))
+        snapshots = [(os.getpid(), self.snapshot()), (None, archive.get('families', {}))]
+        for name, snapshot in self._snapshot_files().items():
+            if name != own_name and name not in archived:
+                snapshots.append(snapshot)
+        return merge_snapshots(snapshots)
+
+    def reset(self):
+        """このプロセスのカウンタ・ヒストグラムを破棄（fork 直後に親プロセスの値を引き継がないため）"""
+        with self.lock:
+            for metric in self._metrics.values():
+                metric._values.clear()
+        self._last_flush = 0.0
+
+    def reset_directory(self):
+        """前回起動時のスナップショットを削除（マスタープロセスの起動時に1回だけ呼ぶ）"""
+        for path in glob.glob(os.path.join(self.directory, '*.json*')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _start_of(filename: str) -> int:
+    """<pid>-<起動時刻>.json の起動時刻（旧形式の <pid>.json は 0）"""
+    try:
+        return int(filename[:-len('.json')].split('-', 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def _pid_alive(pid) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+def merge_snapshots(snapshots: Iterable[Tuple[Any, Families]]) -> Families:
+    """プロセス別スナップショットを合算（gauge は稼働中のプロセスのみ pid ラベル付き）"""
+    merged: Families = {}
+    values: Dict[str, Dict[Tuple, float]] = {}
+    for pid, families in snapshots:
+        alive = pid == os.getpid() or _pid_alive(pid)
+        for name, family in families.items():
+            is_gauge = family['type'] == 'gauge'
+            if is_gauge and not alive:
+                continue
+            if name not in merged:
+                merged[name] = {'type': family['type'], 'help': family['help'], 'samples': []}
+                values[name] = {}
+            for suffix, labels, value in family['samples']:
+                if is_gauge:
+                    labels = {**labels, 'pid': str(pid)}
+                key = (suffix, tuple(sorted(labels.items())))
+                values[name][key] = values[name].get(key, 0) + value
+
+    for name, family in merged.items():
+        family['samples'] = [[suffix, dict(labels), value] for (suffix, labels), value in values[name].items()]
+    return merged
+
+
+def add_cache_hit_ratios(families: Families) -> Families:
+    """合算後の mercury_cache_hits_total / mercury_cache_misses_total からキャッシュ別のヒット率を追加"""
+    totals: Dict[str, List[float]] = {}
+    for index, name in enumerate(('mercury_cache_hits_total', 'mercury_cache_misses_total')):
+        for _, labels, value in families.get(name, {}).get('samples', []):
+            totals.setdefault(labels['cache'], [0.0, 0.0])[index] += value
+    families['mercury_cache_hit_ratio'] = {
+        'type': 'gauge',
+        'help': 'Cache hit ratio across all processes (hits / lookups)',
+        'samples': [['', {'cache': cache}, round(hits / (hits + misses), 6)]
+                    for cache, (hits, misses) in sorted(totals.items()) if hits + misses]
+    }
+    return families
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def render_prometheus(families: Families) -> str:
+    """Prometheus テキスト形式（0.0.4）"""
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {_escape(family['help'])}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for suffix, labels, value in family['samples']:
+            label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                         else f"{name}{suffix} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# ===============================================
+# 既存の統計からの収集（モジュールが読み込み済みのプロセスでのみ収集）
+# ===============================================
+
+def _family(families: Families, name: str, metric_type: str, documentation: str) -> List[list]:
+    family = families.setdefault(name, {'type': metric_type, 'help': documentation, 'samples': []})
+    return family['samples']
+
+
+def _collect_spans() -> Families:
+    """計測区間（utils.logger.performance_logger）のステージ別レイテンシと属性の合計"""
+    logger_module = sys.modules.get('utils.logger')
+    if logger_module is None:
+        return {}
+    bounds = [bound / 1000 for bound in logger_module.SPAN_HISTOGRAM_BUCKETS_MS]
+    families: Families = {}
+    durations = _family(families, 'mercury_stage_duration_seconds', 'histogram', 'Stage latency by span name')
+    errors = _family(families, 'mercury_stage_errors_total', 'counter', 'Spans that ended with an exception')
+    items = _family(families, 'mercury_stage_items_total', 'counter',
+                    'Numeric span attributes summed per stage (rows, comparisons, matches, tokens, ...)')
+    for stage, stats in logger_module.performance_logger.get_stats().items():
+        bucket_counts = list(stats['buckets'].values())
+        durations.extend(histogram_samples({'stage': stage}, bounds, bucket_counts,
+                                           stats['total_ms'] / 1000, stats['count']))
+        errors.append(['', {'stage': stage}, stats['errors']])
+        for attribute, total in stats.get('attribute_totals', {}).items():
+            items.append(['', {'stage': stage, 'item': attribute}, total])
+    return families
+
+
+def _collect_caches() -> Families:
+    """キャッシュのヒット・ミス件数"""
+    families: Families = {}
+    hits = _family(families, 'mercury_cache_hits_total', 'counter', 'Cache hits by cache')
+    misses = _family(families, 'mercury_cache_misses_total', 'counter', 'Cache misses by cache')
+
+    def add(cache: str, hit_count, miss_count):
+        hits.append(['', {'cache': cache}, hit_count])
+        misses.append(['', {'cache': cache}, miss_count])
+
+    registry_module = sys.modules.get('core.engine_registry')
+    if registry_module is not None:
+        totals: Dict[str, List[int]] = {}
+        for engine in registry_module.get_engine_registry().get_stats()['engines']:
+            for cache, info in engine['caches'].get('text_similarity', {}).items():
+                total = totals.setdefault(f"text_similarity_{cache}", [0, 0])
+                total[0] += info['hits']
+                total[1] += info['misses']
+        for cache, (hit_count, miss_count) in totals.items():
+            add(cache, hit_count, miss_count)
+
+    csv_module = sys.modules.get('core.csv_analyzer')
+    if csv_module is not None:
+        stats = csv_module.get_parsed_csv_cache().get_stats()
+        add('parsed_csv', stats['hits'], stats['misses'])
+
+    normalization_module = sys.modules.get('core.normalization')
+    if normalization_module is not None:
+        stats = normalization_module.get_normalizer_cache().get_stats()
+        add('normalizer', stats['hits'], stats['checks'])
+
+    reference_module = sys.modules.get('utils.reference_cache')
+    if reference_module is not None:
+        for namespace, stats in reference_module.get_reference_cache().get_stats()['namespaces'].items():
+            add(f"reference_{namespace}", stats['hits'], stats['misses'])
+
+    database_module = sys.modules.get('config.database')
+    manager = getattr(database_module, '_db_manager', None) if database_module is not None else None
+    if manager is not None:
+        stats = manager.get_pool_stats()
+        if 'statement_cache_hits' in stats:
+            add('db_statement', stats['statement_cache_hits'], stats['statement_cache_misses'])
+    return families
+
+
+def _collect_similarity_calls() -> Families:
+    similarity_module = sys.modules.get('utils.text_similarity')
+    if similarity_module is None:
+        return {}
+    families: Families = {}
+    samples = _family(families, 'mercury_similarity_calls_total', 'counter', 'Similarity computations by metric')
+    for metric, count in similarity_module.get_similarity_call_counts().items():
+        samples.append(['', {'metric': metric}, count])
+    return families
+
+
+def _collect_claude() -> Families:
+    """Claude API のリクエスト数・トークン・コスト・レイテンシ"""
+    stats_module = sys.modules.get('ai.api_stats')
+    if stats_module is None:
+        return {}
+    snapshot = stats_module.get_api_stats().snapshot()
+    bounds = [bound / 1000 for bound in snapshot['latency_buckets_ms']]
+    families: Families = {}
+    requests = _family(families, 'mercury_claude_requests_total', 'counter', 'Claude API requests by outcome')
+    tokens = _family(families, 'mercury_claude_tokens_total', 'counter', 'Claude API tokens by direction')
+    cost = _family(families, 'mercury_claude_cost_usd_total', 'counter', 'Estimated Claude API cost in USD')
+    latency = _family(families, 'mercury_claude_request_duration_seconds', 'histogram', 'Claude API request latency')
+    for model, stats in snapshot['by_model'].items():
+        requests.append(['', {'model': model, 'outcome': 'success'}, stats['successes']])
+        requests.append(['', {'model': model, 'outcome': 'failure'}, stats['failures']])
+        requests.append(['', {'model': model, 'outcome': 'retry'}, stats['retries']])
+        tokens.append(['', {'model': model, 'direction': 'input'}, stats['input_tokens']])
+        tokens.append(['', {'model': model, 'direction': 'output'}, stats['output_tokens']])
+        cost.append(['', {'model': model}, stats['cost_usd']])
+        count = sum(stats['latency_histogram'])  # レイテンシを計測できたリクエスト数
+        latency.extend(histogram_samples({'model': model}, bounds, stats['latency_histogram'],
+                                         stats['latency_sum_ms'] / 1000, count))
+    return families
+
+
+def _collect_jobs() -> Families:
+    """このプロセスのジョブキュー（JobExecutor を作成済みの場合のみ）"""
+    executor_module = sys.modules.get('jobs.executor')
+    executor = getattr(executor_module, '_job_executor', None) if executor_module is not None else None
+    if executor is None:
+        return {}
+    stats = executor.get_stats()
+    families: Families = {}
+    _family(families, 'mercury_job_queue_depth', 'gauge', 'Jobs waiting for a worker').append(
+        ['', {}, stats['queued']])
+    _family(families, 'mercury_jobs_running', 'gauge', 'Jobs currently running').append(
+        ['', {}, stats['running']])
+    events = _family(families, 'mercury_jobs_total', 'counter', 'Jobs by outcome')
+    for outcome in ('submitted', 'rejected', 'completed', 'failed', 'cancelled'):
+        events.append(['', {'outcome': outcome}, stats.get(outcome, 0)])
+    return families
+
+
+def _collect_db_pool() -> Families:
+    """このプロセスのDBコネクションプール"""
+    database_module = sys.modules.get('config.database')
+    manager = getattr(database_module, '_db_manager', None) if database_module is not None else None
+    if manager is None:
+        return {}
+    stats = manager.get_pool_stats()
+    families: Families = {}
+    for key, documentation in (('in_use', 'Connections checked out'),
+                               ('overflow_in_use', 'Overflow connections checked out'),
+                               ('pool_size', 'Configured pool size')):
+        _family(families, f"mercury_db_pool_{key}", 'gauge', documentation).append(['', {}, stats.get(key, 0)])
+    for key, documentation in (('checkouts', 'Connection checkouts'),
+                               ('overflow_checkouts', 'Checkouts served by overflow connections'),
+                               ('timeouts', 'Checkouts that timed out')):
+        _family(families, f"mercury_db_pool_{key}_total", 'counter', documentation).append(
+            ['', {}, stats.get(key, 0)])
+    _family(families, 'mercury_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection').append(
+        ['', {}, stats.get('wait_ms_total', 0.0) / 1000])
+    return families
+
+
+# プロセスごとのレジストリ
+_registry = MetricsRegistry()
+for _collector in (_collect_spans, _collect_caches, _collect_similarity_calls, _collect_claude,
+                   _collect_jobs, _collect_db_pool):
+    _registry.register_collector(_collector)
+atexit.register(_registry.flush)
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+def flush_metrics():
+    _registry.flush()
+
+
+# 処理件数のカウンタ（計測区間の属性では表せないもの）
+ROWS_PROCESSED = _registry.counter('mercury_rows_processed_total', 'Rows processed by stage', ('stage',))
+CANDIDATE_PAIRS = _registry.counter('mercury_candidate_pairs_total',
+                                    'Candidate record pairs generated vs. actually scored', ('matcher', 'phase'))
+MATCH_ROWS_PERSISTED = _registry.counter('mercury_match_rows_persisted_total',
+                                         'Match result rows written to the database', ('method',))
+MATCH_PERSIST_SECONDS = _registry.histogram('mercury_match_persist_duration_seconds',
+                                            'Time to persist one job\'s match results', ('method',))
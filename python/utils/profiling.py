@@ -0,0 +1,242 @@
+"""
+Mercury Mapping Engine - Pipeline Profiling
+リクエスト・ジョブ単位で有効にする分析パイプラインのプロファイル取得
+
+- deterministic: cProfile（pstats）+ スタックのサンプリング（フレームグラフ用の collapsed 形式）
+- sampling:      スタックのサンプリングのみ（オーバーヘッドが小さく、本番の入力でも使いやすい）
+
+結果は <ジョブディレクトリ>/profile/ に保存し、/api/jobs/<uuid>/profile から取得する。
+プロファイル対象はパイプラインを実行するスレッドのみ（マッピング適用の子プロセスは含まない）。
+既定では無効（PROFILING_ENABLED=true で有効化）。有効時もプロセスあたり PROFILING_MAX_PER_WORKER 回まで。
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from utils.logger import analysis_logger
+
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'   # true でプロファイル指定を受け付ける
+PROFILING_MAX_PER_WORKER = int(os.getenv('PROFILING_MAX_PER_WORKER', '10'))      # プロセスあたりのプロファイル回数上限
+PROFILING_SAMPLE_INTERVAL = float(os.getenv('PROFILING_SAMPLE_INTERVAL', '0.005'))  # サンプリング間隔（秒）
+PROFILING_TOP_N = int(os.getenv('PROFILING_TOP_N', '30'))                         # サマリーに載せる関数の数
+
+PROFILE_MODES = ('deterministic', 'sampling')
+PROFILE_HEADER = 'X-Mercury-Profile'
+
+# format → (ファイル名, Content-Type)
+PROFILE_ARTIFACTS = {
+    'summary': ('summary.json', 'application/json'),
+    'collapsed': ('profile.collapsed', 'text/plain; charset=utf-8'),
+    'pstats': ('profile.pstats', 'application/octet-stream'),
+    'text': ('profile.txt', 'text/plain; charset=utf-8')
+}
+
+_TRUE_VALUES = ('1', 'true', 'on', 'yes')
+_FALSE_VALUES = ('', '0', 'false', 'off', 'no')
+
+_profiles_started = 0
+_profiles_lock = threading.Lock()
+
+
+def parse_profile_mode(value: Any) -> Optional[str]:
+    """ヘッダー・パラメータの値をモードに変換（未指定・無効化時は None、不正な値は ValueError）"""
+    if value is None or value is False:
+        return None
+    if value is True:
+        mode = 'deterministic'
+    else:
+        mode = str(value).strip().lower()
+        if mode in _FALSE_VALUES:
+            return None
+        if mode in _TRUE_VALUES:
+            mode = 'deterministic'
+        elif mode not in PROFILE_MODES:
+            raise ValueError(f"Invalid profile mode: {value} (available: {', '.join(PROFILE_MODES)})")
+
+    if not PROFILING_ENABLED:
+        analysis_logger.logger.warning("⚠️ Profiling requested but PROFILING_ENABLED=false")
+        return None
+    return mode
+
+
+def reserve_profile_slot() -> bool:
+    """このプロセスでのプロファイル回数を1つ消費（PROFILING_MAX_PER_WORKER 到達後は False）"""
+    global _profiles_started
+    with _profiles_lock:
+        if _profiles_started >= PROFILING_MAX_PER_WORKER:
+            analysis_logger.logger.warning(
+                f"⚠️ Profiling skipped: PROFILING_MAX_PER_WORKER={PROFILING_MAX_PER_WORKER} reached"
+            )
+            return False
+        _profiles_started += 1
+        return True
+
+
+def get_profile_dir(job_dir: str) -> str:
+    return os.path.join(job_dir, 'profile')
+
+
+def get_profile_urls(job_uuid: str) -> Dict[str, str]:
+    return {f"{name}_url": f"/api/jobs/{job_uuid}/profile?format={name}" for name in PROFILE_ARTIFACTS}
+
+
+def load_profile_summary(profile_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(profile_dir, PROFILE_ARTIFACTS['summary'][0])
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """対象スレッドのスタックを一定間隔で記録（root;...;leaf → 回数）"""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            del frame
+            labels.reverse()
+            self.stacks[';'.join(labels)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def top_frames(self, limit: int) -> List[Dict[str, Any]]:
+        """サンプル中に実行中（スタック末尾）だった回数の多い関数"""
+        self_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack.rsplit(';', 1)[-1]] += count
+        total = self.samples or 1
+        return [
+            {'function': label, 'samples': count, 'ratio': round(count / total, 4)}
+            for label, count in self_counts.most_common(limit)
+        ]
+
+
+class PipelineProfiler:
+    """with ブロック内の処理をプロファイルし、終了時（例外時も）に結果ファイルを書き出す
+
+    with PipelineProfiler(get_profile_dir(job_dir), 'sampling') as profiler:
+        result = pipeline(...)
+    result['profile'] = profiler.summary
+    """
+
+    def __init__(self, output_dir: str, mode: str = 'deterministic',
+                 interval: float = PROFILING_SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Invalid profile mode: {mode}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.interval = interval
+        self.summary: Optional[Dict[str, Any]] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._start_time = 0.0
+
+    def __enter__(self) -> 'PipelineProfiler':
+        self._sampler = _StackSampler(threading.get_ident(), self.interval)
+        self._sampler.start()
+        if self.mode == 'deterministic':
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError as e:
+                # 他のプロファイラが有効な場合はサンプリングのみ
+                analysis_logger.logger.warning(f"⚠️ cProfile unavailable, sampling only: {e}")
+                self._profile = None
+        self._start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        elapsed = time.perf_counter() - self._start_time
+        if self._profile is not None:
+            self._profile.disable()
+        self._sampler.stop()
+        try:
+            self.summary = self._write(elapsed, failed=exc_type is not None)
+        except OSError as e:
+            analysis_logger.log_error('profile_write', str(e))
+        return False
+
+    def _write(self, elapsed: float, failed: bool) -> Dict[str, Any]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        artifacts = []
+
+        with open(self._path('collapsed'), 'w', encoding='utf-8') as f:
+            for stack, count in self._sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        artifacts.append('collapsed')
+
+        summary = {
+            'mode': self.mode,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'failed': failed,
+            'sample_interval_ms': round(self.interval * 1000, 3),
+            'samples': self._sampler.samples,
+            'top_frames': self._sampler.top_frames(PROFILING_TOP_N)
+        }
+
+        if self._profile is not None:
+            self._profile.dump_stats(self._path('pstats'))
+            buffer = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=buffer)
+            stats.sort_stats('cumulative').print_stats(PROFILING_TOP_N)
+            stats.sort_stats('tottime').print_stats(PROFILING_TOP_N)
+            with open(self._path('text'), 'w', encoding='utf-8') as f:
+                f.write(buffer.getvalue())
+            artifacts.extend(['pstats', 'text'])
+            summary['top_functions'] = self._top_functions(stats)
+
+        summary['artifacts'] = artifacts
+        with open(self._path('summary'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False)
+
+        analysis_logger.logger.info(
+            f"🔬 Profile saved: {self.output_dir} (mode={self.mode}, samples={summary['samples']}, "
+            f"{elapsed:.2f}秒)"
+        )
+        return summary
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.output_dir, PROFILE_ARTIFACTS[name][0])
+
+    @staticmethod
+    def _top_functions(stats: pstats.Stats) -> List[Dict[str, Any]]:
+        """累積時間の長い関数"""
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILING_TOP_N]
+        return [
+            {
+                'function': f"{func} ({os.path.basename(filename)}:{line})",
+                'calls': calls,
+                'tottime_ms': round(tottime * 1000, 2),
+                'cumtime_ms': round(cumtime * 1000, 2)
+            }
+            for (filename, line, func), (_, calls, tottime, cumtime, _) in rows
+        ]
@@ -0,0 +1,170 @@
+"""
+Mercury Mapping Engine - Progress Events
+分析進捗イベント（マッチャーからの構造化イベント・ジョブ単位のJSONLログ・SSE整形）
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# progress(percent, message, **details) 形式の進捗通知
+ProgressCallback = Callable[..., None]
+
+# マッチャーが呼び出す progress_callback(rows_processed, rows_total, candidates_scored)
+MatcherProgressCallback = Callable[[int, int, int], None]
+
+
+class StageProgress:
+    """マッチャーの行単位の進捗を、段階内の進捗率と残り時間推定に変換する
+
+    マッチャーは毎行呼び出してよい（min_interval 秒ごとにのみ progress へ通知）。
+    """
+
+    def __init__(self, progress: Optional[ProgressCallback], stage: str,
+                 start_percent: int, end_percent: int, min_interval: float = 0.5):
+        self.progress = progress
+        self.stage = stage
+        self.start_percent = start_percent
+        self.end_percent = end_percent
+        self.min_interval = min_interval
+        self.started_at = time.time()
+        self._last_emit = 0.0
+
+    def __call__(self, rows_processed: int, rows_total: int, candidates_scored: int = 0):
+        if self.progress is None:
+            return
+        now = time.time()
+        finished = rows_total > 0 and rows_processed >= rows_total
+        if not finished and now - self._last_emit < self.min_interval:
+            return
+        self._last_emit = now
+
+        fraction = min(1.0, rows_processed / rows_total) if rows_total else 0.0
+        elapsed = now - self.started_at
+        eta_seconds = round(elapsed * (1 - fraction) / fraction, 1) if fraction > 0 else None
+        percent = self.start_percent + int((self.end_percent - self.start_percent) * fraction)
+
+        self.progress(
+            percent,
+            f"{self.stage}: {rows_processed}/{rows_total}行",
+            stage=self.stage,
+            rows_processed=rows_processed,
+            rows_total=rows_total,
+            candidates_scored=candidates_scored,
+            elapsed_seconds=round(elapsed, 1),
+            eta_seconds=eta_seconds,
+            rows_per_second=round(rows_processed / elapsed, 2) if elapsed > 0 else None
+        )
+
+
+class ProgressEventLog:
+    """ジョブ単位の進捗イベントログ（JSON Lines）
+
+    書き込みはワーカープロセス、読み出しはWebプロセス（SSE）から行う。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, percent: int, message: str, **details) -> Dict[str, Any]:
+        """イベントを1行追記"""
+        with self._lock:
+            self._seq += 1
+            event = {
+                'seq': self._seq,
+                'time': round(time.time(), 3),
+                'percent': percent,
+                'message': message,
+                **{key: value for key, value in details.items() if value is not None}
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        return event
+
+    def read_from(self, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """offset バイト目以降の完結した行を読み込み、(イベント, 次のoffset) を返す"""
+        if not os.path.exists(self.path):
+            return [], offset
+
+        events = []
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                # 書き込み途中の行は次回に読む
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events, offset
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        return self.read_from(0)[0]
+
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Server-Sent Events 形式のメッセージを作成"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, default=str)
+    lines.extend(f"data: {line}" for line in payload.split('\n'))
+    return '\n'.join(lines) + '\n\n'
+
+
+def tail_progress_events(log: ProgressEventLog, is_finished: Callable[[], Optional[Dict[str, Any]]],
+                         last_seq: int = 0, poll_interval: float = 0.5, status_interval: float = 2.0,
+                         heartbeat_interval: float = 15.0, max_duration: Optional[float] = None,
+                         retry_ms: int = 3000) -> Iterator[str]:
+    """進捗ログを追跡してSSEメッセージを生成
+
+    is_finished() は終了時に最終状態の辞書、実行中は None を返す。
+    max_duration 秒を過ぎたら retry を通知して終了する（クライアントは Last-Event-ID 付きで再接続する）。
+    """
+    offset = 0
+    started = last_sent = last_status_check = time.time()
+    status_check_due = True
+
+    while True:
+        events, offset = log.read_from(offset)
+        for event in events:
+            if event.get('seq', 0) <= last_seq:
+                continue
+            last_seq = event['seq']
+            last_sent = time.time()
+            yield format_sse(event, 'progress', last_seq)
+
+        now = time.time()
+        if status_check_due or now - last_status_check >= status_interval:
+            status_check_due = False
+            last_status_check = now
+            final_state = is_finished()
+            if final_state is not None:
+                # 終了直前に書かれたイベントを送ってから完了を通知
+                events, offset = log.read_from(offset)
+                for event in events:
+                    if event.get('seq', 0) > last_seq:
+                        last_seq = event['seq']
+                        yield format_sse(event, 'progress', last_seq)
+                yield format_sse(final_state, 'done')
+                return
+
+        if max_duration is not None and now - started >= max_duration:
+            # Webワーカーのスレッドを占有し続けない
+            yield f"retry: {retry_ms}\n\n"
+            return
+
+        if now - last_sent >= heartbeat_interval:
+            last_sent = now
+            yield ": heartbeat\n\n"
+
+        time.sleep(poll_interval)
@@ -0,0 +1,119 @@
+"""
+Mercury Mapping Engine - Reference Data Cache
+参照データ（カテゴリ・会社・有効なマッピング／正規化ルール）のプロセス内リードスルーキャッシュ
+
+値は (名前空間, キー) 単位で REFERENCE_CACHE_TTL 秒保持する。書き込み側は invalidate() で
+該当エントリを即時破棄する（他プロセスのキャッシュは TTL 経過で入れ替わる）。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+REFERENCE_CACHE_TTL = float(os.getenv('REFERENCE_CACHE_TTL', '60'))              # 0 で無効
+REFERENCE_CACHE_MAX_ENTRIES = int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', '1024'))
+
+
+def _copy(value: Any) -> Any:
+    """呼び出し側の変更がキャッシュに残らないよう、list / dict は1段下まで複製"""
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class ReferenceCache:
+    """名前空間つきの TTL キャッシュ（LRU で上限件数を超えた分を破棄）"""
+
+    def __init__(self, ttl: float = REFERENCE_CACHE_TTL, max_entries: int = REFERENCE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, Hashable], Tuple[Any, float]]' = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _namespace_stats(self, namespace: str) -> Dict[str, int]:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = self._stats[namespace] = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidations': 0}
+        return stats
+
+    def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """キャッシュにあれば返し、なければ loader() の結果を保存して返す（None は保存しない）"""
+        if self.ttl <= 0:
+            return loader()
+
+        cache_key = (namespace, key)
+        now = time.monotonic()
+        with self._lock:
+            stats = self._namespace_stats(namespace)
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(cache_key)
+                    stats['hits'] += 1
+                    return _copy(entry[0])
+                del self._entries[cache_key]
+                stats['expired'] += 1
+            stats['misses'] += 1
+            generation = self._generations.get(namespace, 0)
+
+        value = loader()
+        if value is None:
+            return None
+
+        with self._lock:
+            # 読み込み中に invalidate された場合は古い値を保存しない
+            if self._generations.get(namespace, 0) == generation:
+                self._entries[cache_key] = (_copy(value), now + self.ttl)
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, namespace: Optional[str] = None, key: Optional[Hashable] = None):
+        """名前空間（key 指定時はその1件）を破棄。namespace 省略時はすべて破棄"""
+        with self._lock:
+            if namespace is None:
+                targets = list(self._entries)
+                for name in list(self._generations):
+                    self._generations[name] += 1
+            elif key is None:
+                targets = [cache_key for cache_key in self._entries if cache_key[0] == namespace]
+            else:
+                targets = [(namespace, key)]
+            if namespace is not None:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+                self._namespace_stats(namespace)['invalidations'] += 1
+
+            for cache_key in targets:
+                self._entries.pop(cache_key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = {}
+            for namespace, stats in self._stats.items():
+                lookups = stats['hits'] + stats['misses']
+                namespaces[namespace] = {
+                    **stats,
+                    'entries': sum(1 for cache_key in self._entries if cache_key[0] == namespace),
+                    'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0
+                }
+            return {
+                'ttl': self.ttl,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'namespaces': namespaces
+            }
+
+
+# プロセスごとに共有するキャッシュ
+_reference_cache = ReferenceCache()
+
+
+def get_reference_cache() -> ReferenceCache:
+    return _reference_cache
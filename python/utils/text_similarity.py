@@ -3,17 +3,47 @@ Mercury Mapping Engine - Text Similarity Utilities
 テキスト類似度計算ユーティリティ
 """
 import re
-from typing import List, Set
+from functools import lru_cache
+from typing import Any, Dict, List, Set
+
+
+# 正規表現はモジュール読み込み時に1回だけコンパイル
+_PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_WORD_PATTERN = re.compile(r'[ぁ-ゟ]+|[ァ-ヿ]+|[一-龯]+|[a-zA-Z0-9]+')
+
+# クリーニング結果・編集距離のメモ化件数（インスタンスごと）
+DEFAULT_CACHE_SIZE = 65536
+
+# 手法別の類似度計算回数（プロセス単位。ロックなしで加算するため複数スレッドでは近似値）
+_similarity_calls: Dict[str, int] = {
+    'exact': 0, 'fuzzy': 0, 'partial': 0, 'jaccard': 0, 'comprehensive': 0, 'sequence': 0
+}
+
+
+def count_similarity_call(metric: str):
+    _similarity_calls[metric] = _similarity_calls.get(metric, 0) + 1
+
+
+def get_similarity_call_counts() -> Dict[str, int]:
+    return dict(_similarity_calls)
 
 
 class TextSimilarity:
-    """テキスト類似度計算クラス"""
+    """テキスト類似度計算クラス
+
+    クリーニング結果とレーベンシュタイン距離はインスタンス単位でメモ化する
+    （エンジンを使い回すとリクエストをまたいでキャッシュが効く）。
+    lru_cache はスレッドセーフなので複数スレッドから共有してよい。
+    """
     
-    def __init__(self):
-        pass
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE):
+        self._clean_cached = lru_cache(maxsize=cache_size)(self._clean_text)
+        self._levenshtein_cached = lru_cache(maxsize=cache_size)(self._levenshtein_distance)
     
     def calculate_exact_similarity(self, str1: str, str2: str) -> float:
         """完全一致・部分一致の類似度"""
+        _similarity_calls['exact'] += 1
         str1_clean = self.clean_text(str1)
         str2_clean = self.clean_text(str2)
         
@@ -29,6 +59,7 @@ class TextSimilarity:
     
     def calculate_fuzzy_similarity(self, str1: str, str2: str) -> float:
         """あいまい一致の類似度（レーベンシュタイン距離ベース）"""
+        _similarity_calls['fuzzy'] += 1
         str1_clean = self.clean_text(str1)
         str2_clean = self.clean_text(str2)
         
@@ -50,6 +81,7 @@ class TextSimilarity:
     
     def calculate_partial_similarity(self, str1: str, str2: str) -> float:
         """部分的な類似度（単語レベル）"""
+        _similarity_calls['partial'] += 1
         words1 = self.extract_words(str1)
         words2 = self.extract_words(str2)
         
@@ -66,6 +98,7 @@ class TextSimilarity:
     
     def calculate_jaccard_similarity(self, str1: str, str2: str) -> float:
         """Jaccard類似度（文字n-gramベース）"""
+        _similarity_calls['jaccard'] += 1
         ngrams1 = self.get_character_ngrams(str1, n=2)
         ngrams2 = self.get_character_ngrams(str2, n=2)
         
@@ -81,11 +114,14 @@ class TextSimilarity:
         """テキストをクリーニング"""
         if not text:
             return ""
-        
+        return self._clean_cached(str(text))
+    
+    @staticmethod
+    def _clean_text(text: str) -> str:
         # 不要な文字を除去
-        cleaned = re.sub(r'[^\w\s]', '', str(text).lower())
+        cleaned = _PUNCTUATION_PATTERN.sub('', text.lower())
         # 余分な空白を除去
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+        cleaned = _WHITESPACE_PATTERN.sub(' ', cleaned).strip()
         return cleaned
     
     def extract_words(self, text: str) -> List[str]:
@@ -94,7 +130,7 @@ class TextSimilarity:
             return []
         
         # 日本語と英数字の単語を抽出
-        words = re.findall(r'[ぁ-ゟ]+|[ァ-ヿ]+|[一-龯]+|[a-zA-Z0-9]+', str(text))
+        words = _WORD_PATTERN.findall(str(text))
         # 2文字以上の単語のみ
         return [w for w in words if len(w) >= 2]
     
@@ -116,8 +152,11 @@ class TextSimilarity:
     def levenshtein_distance(self, s1: str, s2: str) -> int:
         """レーベンシュタイン距離を計算"""
         if len(s1) < len(s2):
-            return self.levenshtein_distance(s2, s1)
-        
+            s1, s2 = s2, s1
+        return self._levenshtein_cached(s1, s2)
+    
+    @staticmethod
+    def _levenshtein_distance(s1: str, s2: str) -> int:
         if len(s2) == 0:
             return len(s1)
         
@@ -135,6 +174,7 @@ class TextSimilarity:
     
     def calculate_comprehensive_similarity(self, str1: str, str2: str) -> dict:
         """包括的な類似度計算（複数手法の結果を返す）"""
+        _similarity_calls['comprehensive'] += 1
         results = {
             'exact_similarity': self.calculate_exact_similarity(str1, str2),
             'fuzzy_similarity': self.calculate_fuzzy_similarity(str1, str2),
@@ -183,4 +223,15 @@ class TextSimilarity:
             'match': best_match,
             'score': best_score,
             'index': best_index
-        }
\ No newline at end of file
+        }
+    
+    def cache_info(self) -> Dict[str, Any]:
+        """メモ化の統計"""
+        return {
+            'clean_text': self._clean_cached.cache_info()._asdict(),
+            'levenshtein': self._levenshtein_cached.cache_info()._asdict()
+        }
+    
+    def clear_cache(self):
+        self._clean_cached.cache_clear()
+        self._levenshtein_cached.cache_clear()
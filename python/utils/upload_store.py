@@ -0,0 +1,143 @@
+"""
+Mercury Mapping Engine - Upload Store
+内容ハッシュ（SHA-256）でアップロードファイルを保存・重複排除
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Any, BinaryIO, Dict, Optional
+from utils.logger import analysis_logger
+
+
+# ジョブ記録などで使う参照形式: "sha256:<64桁の16進数>"
+HASH_REF_PREFIX = 'sha256:'
+_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadStore:
+    """コンテンツアドレス型のアップロード保存領域
+
+    ファイルは <root>/<hash[:2]>/<hash>.csv に保存する。
+    同一内容のファイルが既にあれば一時ファイルを破棄して既存ファイルを返す。
+    """
+
+    def __init__(self, root: Optional[str] = None, extension: str = '.csv'):
+        if root is None:
+            from config.settings import Config
+            root = Config.get_config('default').UPLOAD_FOLDER
+        self.root = root
+        self.extension = extension
+        self._tmp_dir = os.path.join(self.root, 'tmp')
+        self._lock = threading.Lock()
+        self._stats = {'stored': 0, 'deduplicated': 0, 'bytes_stored': 0, 'bytes_deduplicated': 0}
+
+    def save_stream(self, stream: BinaryIO, original_filename: Optional[str] = None) -> Dict[str, Any]:
+        """ストリームを書き出しながら SHA-256 を計算して保存"""
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                while True:
+                    chunk = stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256)
+            deduplicated = os.path.exists(path)
+
+            if deduplicated:
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # 同時アップロードでも rename は原子的なので内容は壊れない
+                os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            if deduplicated:
+                self._stats['deduplicated'] += 1
+                self._stats['bytes_deduplicated'] += size
+            else:
+                self._stats['stored'] += 1
+                self._stats['bytes_stored'] += size
+
+        analysis_logger.logger.info(
+            f"{'♻️ Upload deduplicated' if deduplicated else '💾 Upload stored'}: "
+            f"{original_filename or '-'} → {sha256[:12]} ({size} bytes)"
+        )
+
+        return {
+            'sha256': sha256,
+            'ref': HASH_REF_PREFIX + sha256,
+            'path': path,
+            'size': size,
+            'original_filename': original_filename,
+            'deduplicated': deduplicated
+        }
+
+    def save_file(self, file_storage) -> Dict[str, Any]:
+        """werkzeug FileStorage を保存"""
+        return self.save_stream(file_storage.stream, file_storage.filename)
+
+    def path_for(self, sha256: str) -> str:
+        """ハッシュから保存先パスを取得"""
+        sha256 = sha256.lower()
+        if not _HASH_PATTERN.match(sha256):
+            raise ValueError(f"Invalid SHA-256: {sha256}")
+        return os.path.join(self.root, sha256[:2], sha256 + self.extension)
+
+    def exists(self, sha256: str) -> bool:
+        try:
+            return os.path.exists(self.path_for(sha256))
+        except ValueError:
+            return False
+
+    def resolve(self, file_ref: str) -> str:
+        """sha256:<hash> 参照を実パスに変換（通常のパスはそのまま返す）"""
+        if is_hash_ref(file_ref):
+            return self.path_for(file_ref[len(HASH_REF_PREFIX):])
+        return file_ref
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'root': self.root}
+
+
+def is_hash_ref(file_ref: Optional[str]) -> bool:
+    """sha256:<hash> 形式の参照か"""
+    return bool(file_ref) and file_ref.startswith(HASH_REF_PREFIX) \
+        and bool(_HASH_PATTERN.match(file_ref[len(HASH_REF_PREFIX):].lower()))
+
+
+def hash_from_path(path: str) -> Optional[str]:
+    """保存領域内のパスならファイル名からハッシュを取得"""
+    name = os.path.splitext(os.path.basename(path))[0].lower()
+    return name if _HASH_PATTERN.match(name) else None
+
+
+_upload_store: Optional[UploadStore] = None
+_upload_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """共有 UploadStore を取得（初回呼び出し時に作成）"""
+    global _upload_store
+    if _upload_store is None:
+        with _upload_store_lock:
+            if _upload_store is None:
+                _upload_store = UploadStore()
+    return _upload_store
@@ -0,0 +1,74 @@
+"""
+Mercury Mapping Engine - WSGI Entry Point
+本番サーバー（gunicorn 等のプリフォーク型）用のエントリーポイント
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+preload_app 有効時はマスタープロセスで import・共有データの読み込みまで済ませてから fork するため、
+読み取り専用のデータはワーカー間でコピーオンライトで共有される。
+"""
+import gc
+import os
+import sys
+
+# プロジェクトルートをPythonパスに追加
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from utils.logger import analysis_logger
+
+
+def preload_shared_data(app):
+    """fork 前に読み込んでおく読み取り専用データ（失敗しても起動は続行）"""
+    from core import get_mapping_engine
+    from web.routes.enhanced import _get_available_claude_models
+
+    steps = [
+        ('mapping_engine', lambda: get_mapping_engine()),
+        ('claude_models', _get_available_claude_models),
+    ]
+
+    with app.app_context():
+        for name, step in steps:
+            try:
+                step()
+                app.logger.info(f"📦 Preloaded: {name}")
+            except Exception as e:
+                analysis_logger.log_error('preload', f"{name}: {e}")
+
+    # 以降に作られるオブジェクトと分けておき、ワーカー側の GC でページが書き換わるのを防ぐ
+    gc.collect()
+    gc.freeze()
+
+
+def reinit_worker(app):
+    """fork 直後のワーカー初期化（マスターのコネクションプール・メトリクスはワーカー間で共有しない）"""
+    from config.database import get_db_config_name, init_worker_db
+    from utils.logger import performance_logger
+    from utils.metrics import get_metrics_registry
+
+    # プリロード中の計測値を各ワーカーで重複して集計しない
+    get_metrics_registry().reset()
+    performance_logger.reset_stats()
+
+    try:
+        app.db_manager = init_worker_db(get_db_config_name())
+    except Exception as e:
+        analysis_logger.log_error('worker_db_init', str(e))
+
+
+def shutdown_worker():
+    """ワーカー終了時の後始末（ジョブ用のプロセスプールを停止し、メトリクスを書き出す）
+
+    待機中のジョブは取り消し、JOB_SHUTDOWN_GRACE 秒で終わらない実行中のジョブとともに failed にする。
+    """
+    from jobs import shutdown_job_executor
+    from utils.metrics import flush_metrics
+    shutdown_job_executor(wait=False)
+    flush_metrics()
+
+
+app = create_app(os.getenv('MERCURY_CONFIG', 'production'))
+
+if os.getenv('MERCURY_PRELOAD', 'true').lower() == 'true':
+    preload_shared_data(app)